@@ -1,3 +1,31 @@
 from .event import Event
+from .loader import RawLoader
+from .planes import build_planes
+from .labels import PlaneLabels
+from .sparse import SparsePlane, SparseLabels
+from .conditioning import Baselines, BaselineCache
+from .pyramid import PlanePyramid
+from .batch import EventBatch, iterate_events, read_targets
+from .index import EventIndex, pack_ids, unpack_ids
+from .manifest import FileManifest
+from .search import match_file, search_files
+from .histogram import Histogram2D
+from .calorimetry import select_calorimetry, iterate_calorimetry, dedx_vs_residual_range
+from .pid import score_tracks, score_files
+from .dataset import ClusterDataset
+from .tensors import TensorCache
+from .tiles import PackedTiles
+from .cutflow import CutFlow
+from .features import cluster_features, cluster_cuts, cluster_cut_flow, cut_flow, select_clusters
+from .matching import match_planes, match_clusters
 
-__all__ = ['Event']
\ No newline at end of file
+__all__ = ['Event', 'RawLoader', 'build_planes',
+           'PlaneLabels', 'SparsePlane', 'SparseLabels',
+           'Baselines', 'BaselineCache', 'PlanePyramid',
+           'EventBatch', 'iterate_events', 'read_targets',
+           'EventIndex', 'pack_ids', 'unpack_ids', 'FileManifest',
+           'match_file', 'search_files',
+           'Histogram2D', 'select_calorimetry', 'iterate_calorimetry', 'dedx_vs_residual_range',
+           'score_tracks', 'score_files', 'ClusterDataset', 'TensorCache', 'PackedTiles',
+           'CutFlow', 'cluster_features', 'cluster_cuts', 'cluster_cut_flow', 'cut_flow', 'select_clusters',
+           'match_planes', 'match_clusters']
\ No newline at end of file
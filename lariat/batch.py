@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+
+from .loader import RawLoader
+from .planes import build_planes, NUM_WIRES, PLANE_DTYPE
+
+
+class EventBatch():
+    """
+    A chunk of events stacked into dense arrays.
+
+    Attributes:
+        collection: (batch, 240, ticks) array of collection plane ADCs
+        induction: (batch, 240, ticks) array of induction plane ADCs
+        ids: DataFrame with run, subrun, event, file_path, event_index (one row per event,
+             same order as the first axis of the plane arrays)
+    """
+
+    def __init__(self, collection, induction, ids):
+        self.collection = collection
+        self.induction = induction
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __repr__(self):
+        return f"EventBatch({len(self)} events, planes {self.collection.shape[1:]})"
+
+
+def read_targets(source):
+    """
+    Turn a list of files, a candidate CSV or a DataFrame into (file_path, event_index) rows.
+
+    Args:
+        source: one of
+            - a CSV path or DataFrame with 'file_path' and 'event_index' columns
+              ('event_index_in_file', as written by the search scripts, is accepted too)
+            - a list of ROOT file paths (every entry of every file is used)
+
+    Returns:
+        DataFrame with file_path and event_index columns, grouped by file and sorted by entry
+    """
+    if isinstance(source, (str, Path)) and str(source).endswith(".csv"):
+        source = pd.read_csv(source)
+
+    if isinstance(source, pd.DataFrame):
+        targets = source.rename(columns={"event_index_in_file": "event_index"})
+        if not {"file_path", "event_index"}.issubset(targets.columns):
+            raise ValueError("Candidate table must contain columns: ['file_path', 'event_index']")
+        targets = targets[["file_path", "event_index"]].astype({"file_path": str, "event_index": np.int64})
+    else:
+        if isinstance(source, (str, Path)):
+            source = [source]
+
+        loader = RawLoader(max_open_files=1)
+        frames = []
+        for path in source:
+            num_entries = loader.num_entries(str(path))
+            frames.append(pd.DataFrame({"file_path": str(path), "event_index": np.arange(num_entries, dtype=np.int64)}))
+        loader.close()
+
+        targets = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+            {"file_path": pd.Series(dtype=str), "event_index": pd.Series(dtype=np.int64)})
+
+    # Keep files in first-seen order but read each file's entries front to back,
+    # so every basket is decompressed once.
+    file_order = {path: i for i, path in enumerate(pd.unique(targets["file_path"]))}
+    targets = targets.assign(_file_order=targets["file_path"].map(file_order))
+    targets = targets.sort_values(["_file_order", "event_index"], kind="stable").drop(columns="_file_order")
+
+    return targets.reset_index(drop=True)
+
+
+def _stack(planes):
+    """Stack a list of (240, ticks) planes, zero-padding shorter readouts to the longest."""
+    num_ticks = max(plane.shape[1] for plane in planes)
+    stacked = np.zeros((len(planes), NUM_WIRES, num_ticks), dtype=planes[0].dtype)
+    for i, plane in enumerate(planes):
+        stacked[i, :, :plane.shape[1]] = plane
+    return stacked
+
+
+def iterate_events(source, batch_size=64, dtype=PLANE_DTYPE, loader=None):
+    """
+    Stream events from many ROOT files in fixed-size batches.
+
+    Events are read through a RawLoader (basket-aligned reads, LRU cache), so memory
+    use is bounded by batch_size and the loader's byte budget, not by the dataset size.
+    Batches can span file boundaries.
+
+    Args:
+        source: list of ROOT files, a candidate CSV path or a DataFrame (see read_targets)
+        batch_size: number of events per yielded batch
+        dtype: storage type of the plane arrays
+        loader: optional shared RawLoader (a private one is used and closed otherwise)
+
+    Yields:
+        EventBatch objects
+
+    Example:
+        for batch in iterate_events("deuteron_candidates_bbox_t100.csv", batch_size=128):
+            maxima = batch.collection.max(axis=2)
+    """
+    targets = read_targets(source)
+
+    own_loader = loader is None
+    if own_loader:
+        loader = RawLoader()
+
+    try:
+        for start in range(0, len(targets), batch_size):
+            chunk = targets.iloc[start:start + batch_size]
+
+            collection, induction, ids = [], [], []
+            for file_path, event_index in zip(chunk["file_path"], chunk["event_index"]):
+                data = loader.read(int(event_index), file_path)
+                c, i = build_planes(data["raw_rawadc"], data["raw_channel"], dtype=dtype)
+                collection.append(c)
+                induction.append(i)
+                ids.append((data["run"], data["subrun"], data["event"], file_path, int(event_index)))
+
+            ids = pd.DataFrame(ids, columns=["run", "subrun", "event", "file_path", "event_index"])
+            yield EventBatch(_stack(collection), _stack(induction), ids)
+    finally:
+        if own_loader:
+            loader.close()
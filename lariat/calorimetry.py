@@ -0,0 +1,113 @@
+import uproot
+
+import numpy as np
+import awkward as ak
+
+from .histogram import Histogram2D
+
+
+ANATREE = "anatree/anatree"
+CALO_BRANCHES = ["trkdedx", "trkrr"]
+
+# anatree plane numbering of trkdedx / trkrr
+INDUCTION_PLANE, COLLECTION_PLANE = 0, 1
+
+# Value written for calorimetry points that could not be computed.
+SENTINEL = -99999
+
+
+def select_calorimetry(trkdedx, trkrr, plane=COLLECTION_PLANE, single_track=True, max_dedx=None, by_track=False):
+    """
+    dE/dx and residual range of the tracks of many events on one plane.
+
+    trkdedx and trkrr are anatree arrays of type events * tracks * planes * points.
+    Everything is done with awkward array operations, without a loop over events.
+
+    Args:
+        plane: 0 induction, 1 collection
+        single_track: keep only events with exactly one track (as the analysis
+                      notebooks do); otherwise every track of every event is used
+        max_dedx: drop points with dE/dx above this value (the notebooks use 70)
+        by_track: keep the track axis instead of concatenating the tracks of an event
+
+    Returns:
+        (dedx, rr, selected): dedx and rr of type events * points (tracks of an event
+        concatenated), or events * tracks * points with by_track (a track without the
+        plane has no points), for the selected events, and the boolean event selection
+    """
+    num_tracks = ak.num(trkdedx, axis=1)
+    selected = (num_tracks == 1) if single_track else (num_tracks > 0)
+    dedx, rr = trkdedx[selected], trkrr[selected]
+
+    # Pick the plane (tracks without it get no points), keeping the track axis
+    dedx = ak.fill_none(ak.pad_none(dedx, plane + 1, axis=2)[:, :, plane], [], axis=1)
+    rr = ak.fill_none(ak.pad_none(rr, plane + 1, axis=2)[:, :, plane], [], axis=1)
+
+    valid = (dedx != SENTINEL) & (rr != SENTINEL)
+    if max_dedx is not None:
+        valid = valid & (dedx <= max_dedx)
+    dedx, rr = dedx[valid], rr[valid]
+
+    if not by_track:
+        dedx, rr = ak.flatten(dedx, axis=2), ak.flatten(rr, axis=2)
+
+    return dedx, rr, ak.to_numpy(selected)
+
+
+def iterate_calorimetry(files, plane=COLLECTION_PLANE, single_track=True, max_dedx=None,
+                        tree_name=ANATREE, step_size="100 MB", id_branches=("run", "subrun", "event"), by_track=False):
+    """
+    Stream dE/dx and residual range out of anatree files, chunk by chunk (uproot.iterate).
+
+    Yields:
+        dict per chunk with the id branches of the selected events (numpy), and dedx /
+        rr (awkward, events * points, or events * tracks * points with by_track) as
+        returned by select_calorimetry
+    """
+    if isinstance(files, (str, bytes)) or not hasattr(files, '__iter__'):
+        files = [files]
+    files = {str(f): tree_name for f in files}
+
+    for chunk in uproot.iterate(files, list(id_branches) + CALO_BRANCHES, step_size=step_size, library="ak"):
+        dedx, rr, selected = select_calorimetry(chunk["trkdedx"], chunk["trkrr"], plane, single_track, max_dedx, by_track)
+        result = {name: ak.to_numpy(chunk[name][selected]) for name in id_branches}
+        result['dedx'], result['rr'] = dedx, rr
+        yield result
+
+
+def dedx_vs_residual_range(files, plane=COLLECTION_PLANE, single_track=True, max_dedx=None,
+                           tree_name=ANATREE, step_size="100 MB", histogram=None, keep_points=True):
+    """
+    All (residual range, dE/dx) points of a sample as flat NumPy arrays.
+
+    Replaces the per-event ak.to_numpy / extend loop of the analysis notebooks; full
+    samples can be processed without subsampling.
+
+    Args:
+        files: anatree file path(s)
+        histogram: optional lariat.histogram.Histogram2D (residual range on x, dE/dx
+                   on y), or a (rr_edges, dedx_edges) pair to create one; it is then
+                   filled chunk by chunk
+        keep_points: set False with a histogram to avoid holding all points in memory
+
+    Returns:
+        (rr, dedx) arrays, or (rr, dedx, histogram) when a histogram is requested (rr
+        and dedx are empty if keep_points is False)
+    """
+    rr_points, dedx_points = [], []
+    if histogram is not None and not isinstance(histogram, Histogram2D):
+        histogram = Histogram2D(*histogram)
+
+    for chunk in iterate_calorimetry(files, plane, single_track, max_dedx, tree_name, step_size):
+        rr = ak.to_numpy(ak.flatten(chunk['rr'])).astype(np.float64)
+        dedx = ak.to_numpy(ak.flatten(chunk['dedx'])).astype(np.float64)
+
+        if histogram is not None:
+            histogram.fill(rr, dedx)
+        if keep_points:
+            rr_points.append(rr)
+            dedx_points.append(dedx)
+
+    rr = np.concatenate(rr_points) if rr_points else np.zeros(0)
+    dedx = np.concatenate(dedx_points) if dedx_points else np.zeros(0)
+    return (rr, dedx) if histogram is None else (rr, dedx, histogram)
@@ -0,0 +1,261 @@
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+
+from .event import Event
+from .loader import RawLoader
+from .batch import read_targets
+
+
+# Parquet key-value metadata entry listing the event indices a part file covers.
+EVENTS_METADATA_KEY = b"lariat.events"
+
+CLUSTER_SCHEMA = pa.schema([
+    ('run', pa.int32()),
+    ('subrun', pa.int32()),
+    ('event', pa.int32()),
+    ('file_path', pa.string()),
+    ('event_index', pa.int64()),
+    ('plane', pa.string()),
+    ('cluster_idx', pa.int32()),
+    ('area', pa.int32()),
+    ('max_intensity', pa.float32()),
+    ('min_intensity', pa.float32()),
+    ('mean_intensity', pa.float32()),
+    ('total_intensity', pa.float32()),
+    ('centroid_x', pa.float32()),
+    ('centroid_y', pa.float32()),
+    ('bbox_min_row', pa.int32()),
+    ('bbox_min_col', pa.int32()),
+    ('bbox_max_row', pa.int32()),
+    ('bbox_max_col', pa.int32()),
+    ('width', pa.int32()),
+    ('height', pa.int32()),
+    ('aspect_ratio', pa.float32()),
+    ('compactness', pa.float32()),
+    # Cluster image (height x width, ADC outside the cluster set to 0) as a flat row-major
+    # buffer; Parquet stores list columns as values + offsets.
+    ('image_intensity', pa.list_(pa.float32())),
+    # Max ADC of the cluster on each wire it spans (length height).
+    ('column_maxes', pa.list_(pa.float32())),
+])
+
+
+def plane_clusters(labelled, plane):
+    """
+    Per-cluster rows for one labelled plane (a lariat.labels.PlaneLabels).
+
+    Returns:
+        dict of columns (see CLUSTER_SCHEMA, without the event identifiers)
+    """
+    num = labelled.num
+    bbox = labelled.bbox
+    height = bbox[:, 2] - bbox[:, 0]
+    width = bbox[:, 3] - bbox[:, 1]
+
+    # Centroids from the labelled pixels in one bincount pass.
+    wires, ticks = np.nonzero(labelled.labels)
+    pixel_labels = labelled.labels[wires, ticks]
+    area = np.maximum(labelled.area, 1)
+    centroid_x = np.bincount(pixel_labels, weights=wires, minlength=num + 1)[1:] / area
+    centroid_y = np.bincount(pixel_labels, weights=ticks, minlength=num + 1)[1:] / area
+
+    images, column_maxes = [], []
+    for k in range(num):
+        min_row, min_col, max_row, max_col = bbox[k]
+        inside = labelled.labels[min_row:max_row, min_col:max_col] == k + 1
+        images.append(np.where(inside, labelled.matrix[min_row:max_row, min_col:max_col], 0).astype(np.float32).ravel())
+        column_maxes.append(labelled.column_maxes[k, min_row:max_row].astype(np.float32))
+
+    return {
+        'plane': [plane] * num,
+        'cluster_idx': np.arange(num, dtype=np.int32),
+        'area': labelled.area.astype(np.int32),
+        'max_intensity': labelled.adc_max.astype(np.float32),
+        'min_intensity': labelled.adc_min.astype(np.float32),
+        'mean_intensity': (labelled.adc_sum / area).astype(np.float32),
+        'total_intensity': labelled.adc_sum.astype(np.float32),
+        'centroid_x': centroid_x.astype(np.float32),
+        'centroid_y': centroid_y.astype(np.float32),
+        'bbox_min_row': bbox[:, 0].astype(np.int32),
+        'bbox_min_col': bbox[:, 1].astype(np.int32),
+        'bbox_max_row': bbox[:, 2].astype(np.int32),
+        'bbox_max_col': bbox[:, 3].astype(np.int32),
+        'width': width.astype(np.int32),
+        'height': height.astype(np.int32),
+        'aspect_ratio': (width / np.maximum(height, 1)).astype(np.float32),
+        'compactness': (labelled.area / np.maximum(width * height, 1)).astype(np.float32),
+        'image_intensity': images,
+        'column_maxes': column_maxes,
+    }
+
+
+def event_clusters(event, threshold=15, induction_threshold=None):
+    """
+    Cluster both planes of an Event and return one Arrow table row per cluster.
+
+    Args:
+        event: lariat.Event
+        threshold: collection plane ADC threshold
+        induction_threshold: induction plane threshold (default threshold // 2, as in Event)
+    """
+    if induction_threshold is None:
+        induction_threshold = threshold // 2
+
+    tables = []
+    for plane, matrix, plane_threshold in (('collection', event.collection, threshold),
+                                           ('induction', event.induction, induction_threshold)):
+        columns = plane_clusters(event.labelling(matrix, plane_threshold), plane)
+        num = len(columns['cluster_idx'])
+        columns = {
+            'run': np.full(num, event.run, dtype=np.int32),
+            'subrun': np.full(num, event.subrun, dtype=np.int32),
+            'event': np.full(num, event.event, dtype=np.int32),
+            'file_path': [str(event.filepath)] * num,
+            'event_index': np.full(num, event.index, dtype=np.int64),
+            **columns,
+        }
+        tables.append(pa.table(columns, schema=CLUSTER_SCHEMA))
+
+    return pa.concat_tables(tables)
+
+
+def part_path(output_dir, particle_type, file_path):
+    """Output file for the clusters of one ROOT file (hive-partitioned by particle_type)."""
+    digest = hashlib.sha1(str(file_path).encode()).hexdigest()[:8]
+    return Path(output_dir) / f"particle_type={particle_type}" / f"{Path(file_path).stem}-{digest}.parquet"
+
+
+def processed_events(path):
+    """Event indices already covered by a part file (empty set if it does not exist)."""
+    if not Path(path).exists():
+        return set()
+    metadata = pq.read_schema(path).metadata or {}
+    return set(json.loads(metadata.get(EVENTS_METADATA_KEY, b"[]")))
+
+
+def cluster_file(file_path, event_indices, output_path, threshold=15, induction_threshold=None, row_group_size=4096):
+    """
+    Cluster the given events of one ROOT file into a Parquet part file.
+    This function is designed to be run in a separate process.
+
+    Events already listed in the part file's metadata are skipped; new clusters are
+    appended to the existing ones and the file is replaced atomically.
+
+    Returns:
+        (output_path, number of newly processed events, error or None)
+    """
+    output_path = Path(output_path)
+    done = processed_events(output_path)
+    todo = sorted(set(int(i) for i in event_indices) - done)
+
+    if not todo:
+        return str(output_path), 0, None
+
+    tables = []
+    try:
+        with RawLoader(file_path) as loader:
+            for index in todo:
+                event = Event.from_loader(loader, index, threshold=threshold)
+                tables.append(event_clusters(event, threshold, induction_threshold))
+    except Exception as e:
+        return str(output_path), 0, f"{Path(file_path).name}: {e}"
+
+    if done:
+        tables.insert(0, pq.read_table(output_path, schema=CLUSTER_SCHEMA))
+
+    table = pa.concat_tables(tables) if tables else CLUSTER_SCHEMA.empty_table()
+    table = table.replace_schema_metadata({EVENTS_METADATA_KEY: json.dumps(sorted(done | set(todo))).encode()})
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_suffix(".parquet.tmp")
+    pq.write_table(table, tmp_path, row_group_size=row_group_size)
+    tmp_path.replace(output_path)
+
+    return str(output_path), len(todo), None
+
+
+def run_clustering(source, output_dir, threshold=15, induction_threshold=None, max_workers=None, particle_type=None):
+    """
+    Cluster every event of a candidate list on a process pool and write partitioned Parquet.
+
+    One task per ROOT file; each writes output_dir/particle_type=<type>/<file>.parquet.
+    Re-running skips events that are already in the output, so an interrupted run can
+    simply be started again.
+
+    Args:
+        source: candidate CSV / DataFrame (file_path, event_index[, particle_type]) or list of files
+        output_dir: root directory of the Parquet dataset
+        threshold: collection plane ADC threshold (induction uses threshold // 2 by default)
+        max_workers: number of worker processes (default: None for auto)
+        particle_type: label used when the source has no particle_type column, or for
+                       events whose particle_type is missing or empty
+
+    Returns:
+        dict with events processed, files written and errors
+    """
+    targets = read_targets(source)
+
+    if isinstance(source, (str, Path)) and str(source).endswith(".csv"):
+        source = pd.read_csv(source)
+    if isinstance(source, pd.DataFrame) and 'particle_type' in source.columns:
+        types = source.rename(columns={"event_index_in_file": "event_index"})[['file_path', 'event_index', 'particle_type']]
+        targets = targets.merge(types.astype({'file_path': str}).drop_duplicates(['file_path', 'event_index']),
+                                on=['file_path', 'event_index'], how='left')
+        # Events without a (non-empty) label would be dropped by the groupby below
+        missing = targets['particle_type'].isna() | (targets['particle_type'].astype(str).str.strip() == '')
+        targets.loc[missing, 'particle_type'] = particle_type or 'unknown'
+    else:
+        targets['particle_type'] = particle_type or 'unknown'
+
+    tasks = [(file_path, group['event_index'].to_numpy(), part_path(output_dir, ptype, file_path))
+             for (ptype, file_path), group in targets.groupby(['particle_type', 'file_path'], sort=False)]
+
+    print(f"Clustering {len(targets)} events from {len(tasks)} files into {output_dir}")
+
+    processed, errors = 0, []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(cluster_file, file_path, indices, path, threshold, induction_threshold)
+                   for file_path, indices, path in tasks]
+
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Clustering Files"):
+            _, num, error = future.result()
+            processed += num
+            if error is not None:
+                errors.append(error)
+                print(f"Warning: {error}")
+
+    return {'processed_events': processed, 'files': len(tasks), 'errors': errors}
+
+
+def read_clusters(output_dir, columns=None, filter=None):
+    """
+    Load (part of) a cluster dataset written by run_clustering.
+
+    Only the requested columns are read and filters are pushed down into the Parquet
+    scan, so selecting on height or max_intensity never touches the image buffers.
+
+    Args:
+        output_dir: root directory of the dataset
+        columns: list of columns to read (default: all)
+        filter: pyarrow.dataset expression, e.g. (ds.field('height') > 3) & (ds.field('plane') == 'collection')
+
+    Returns:
+        pyarrow.Table
+    """
+    dataset = ds.dataset(output_dir, format="parquet", partitioning="hive")
+    return dataset.to_table(columns=columns, filter=filter)
+
+
+def cluster_image(row):
+    """Reshape the flat image_intensity of one cluster row (dict or Series) to (height, width)."""
+    return np.asarray(row['image_intensity'], dtype=np.float32).reshape(row['height'], row['width'])
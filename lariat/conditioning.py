@@ -0,0 +1,186 @@
+import uproot
+
+import numpy as np
+import awkward as ak
+
+from pathlib import Path
+
+from .loader import RAW_TREE
+from .planes import NUM_WIRES, NUM_CHANNELS
+
+
+class Baselines():
+    """
+    Per-channel pedestal and noise (sigma) of one run.
+
+    Arrays are indexed by channel number (0-239 induction, 240-479 collection), so
+    baselines.plane('collection') lines up with Event.collection row by row.
+    """
+
+    def __init__(self, pedestal, sigma, run=None):
+
+        self.pedestal = np.asarray(pedestal, dtype=np.float32)
+        self.sigma = np.asarray(sigma, dtype=np.float32)
+        self.run = run
+
+    def __repr__(self):
+        return f"Baselines(run={self.run}, mean pedestal={self.pedestal.mean():.1f}, mean sigma={self.sigma.mean():.2f})"
+
+    def plane(self, plane):
+        """(pedestal, sigma) of the 240 wires of 'collection' or 'induction'."""
+        rows = slice(NUM_WIRES, NUM_CHANNELS) if plane == 'collection' else slice(0, NUM_WIRES)
+        return self.pedestal[rows], self.sigma[rows]
+
+    @classmethod
+    def from_file(cls, filepath, max_events=50, tree_name=RAW_TREE):
+        """
+        Estimate the baselines of a file from its first max_events events.
+
+        Uses the raw_pedestal / raw_sigma branches written by RawDigitExtractor (median
+        over events per channel). If they are missing or empty, the pedestal is the
+        per-channel median ADC and sigma the MAD-based width of the ADC distribution.
+        """
+        with uproot.open(filepath) as file:
+            tree = file[tree_name]
+            stop = min(max_events, tree.num_entries)
+            branches = ["run", "raw_channel"]
+            has_pedestals = "raw_pedestal" in tree and "raw_sigma" in tree
+            branches += ["raw_pedestal", "raw_sigma"] if has_pedestals else ["raw_rawadc"]
+            data = tree.arrays(branches, entry_stop=stop, library="ak")
+
+        run = int(data["run"][0]) if stop else None
+        channels = ak.to_numpy(ak.flatten(data["raw_channel"]))
+        num_channels = ak.to_numpy(ak.num(data["raw_channel"]))
+
+        if has_pedestals and np.array_equal(ak.to_numpy(ak.num(data["raw_pedestal"])), num_channels):
+            pedestal = ak.to_numpy(ak.flatten(data["raw_pedestal"])).astype(np.float64)
+            sigma = ak.to_numpy(ak.flatten(data["raw_sigma"])).astype(np.float64)
+        else:
+            if has_pedestals:
+                with uproot.open(filepath) as file:
+                    data = file[tree_name].arrays(["raw_channel", "raw_rawadc"], entry_stop=stop, library="ak")
+
+            # Per-channel median and MAD of every event's waveform.
+            pedestal, sigma = [], []
+            for adc, n in zip(data["raw_rawadc"], num_channels):
+                waveforms = ak.to_numpy(adc).reshape(n, -1).astype(np.float32)
+                median = np.median(waveforms, axis=1)
+                pedestal.append(median)
+                sigma.append(1.4826 * np.median(np.abs(waveforms - median[:, None]), axis=1))
+            pedestal, sigma = np.concatenate(pedestal), np.concatenate(sigma)
+
+        # Median over events of each channel's value.
+        return cls(_median_by_channel(channels, pedestal), _median_by_channel(channels, sigma), run)
+
+    def save(self, path):
+        np.savez(path, pedestal=self.pedestal, sigma=self.sigma, run=-1 if self.run is None else self.run)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            run = int(data['run'])
+            return cls(data['pedestal'], data['sigma'], None if run < 0 else run)
+
+
+def _median_by_channel(channels, values):
+    """Median of values for each channel number 0..479 (0 for channels never seen)."""
+    valid = (channels >= 0) & (channels < NUM_CHANNELS)
+    channels, values = channels[valid], values[valid]
+
+    order = np.lexsort((values, channels))
+    channels, values = channels[order], values[order]
+
+    result = np.zeros(NUM_CHANNELS, dtype=np.float64)
+    present, starts, counts = np.unique(channels, return_index=True, return_counts=True)
+    lower = values[starts + (counts - 1) // 2]
+    upper = values[starts + counts // 2]
+    result[present] = (lower + upper) / 2
+    return result
+
+
+class BaselineCache():
+    """
+    Baselines computed once per run and kept in memory (and on disk if a directory is given).
+
+    Example:
+        cache = BaselineCache("baselines/")
+        event = Event(path, index, baselines=cache)
+    """
+
+    def __init__(self, directory=None, max_events=50):
+
+        self.directory = Path(directory) if directory is not None else None
+        self.max_events = max_events
+        self._runs = {}
+
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def get(self, run, filepath):
+        """Baselines of a run, estimated from filepath the first time the run is seen."""
+        if run in self._runs:
+            return self._runs[run]
+
+        path = self.directory / f"baselines_run{run}.npz" if self.directory is not None else None
+        if path is not None and path.exists():
+            baselines = Baselines.load(path)
+        else:
+            baselines = Baselines.from_file(filepath, max_events=self.max_events)
+            if path is not None:
+                baselines.save(path)
+
+        self._runs[run] = baselines
+        return baselines
+
+
+def remove_coherent_noise(plane, group_size=None):
+    """
+    Subtract the per-tick median across wires (common-mode noise).
+
+    Args:
+        plane: (wires, ticks) pedestal-subtracted plane
+        group_size: wires sharing the same noise pickup (e.g. one readout board);
+                    None treats the whole plane as one group
+
+    Returns:
+        new float32 plane
+    """
+    plane = np.asarray(plane, dtype=np.float32)
+    num_wires, num_ticks = plane.shape
+    group_size = num_wires if group_size is None else group_size
+
+    if num_wires % group_size:
+        raise ValueError(f"group_size {group_size} does not divide {num_wires} wires")
+
+    grouped = plane.reshape(num_wires // group_size, group_size, num_ticks)
+    return (grouped - np.median(grouped, axis=1, keepdims=True)).reshape(num_wires, num_ticks)
+
+
+def condition_plane(plane, pedestal, sigma=None, coherent_noise=False, group_size=None, nsigma=None):
+    """
+    Pedestal subtraction and noise filtering of one plane, vectorised over wires and ticks.
+
+    Args:
+        plane: (wires, ticks) raw ADC
+        pedestal, sigma: per-wire baselines (see Baselines.plane)
+        coherent_noise: also subtract the common-mode noise (remove_coherent_noise)
+        group_size: wire grouping for the common-mode subtraction
+        nsigma: if given, zero every pixel below nsigma * sigma of its wire
+
+    Returns:
+        float32 plane
+    """
+    conditioned = np.asarray(plane, dtype=np.float32) - np.asarray(pedestal, dtype=np.float32)[:, None]
+
+    if coherent_noise:
+        conditioned = remove_coherent_noise(conditioned, group_size)
+
+    if nsigma is not None:
+        conditioned[conditioned <= nsigma * np.asarray(sigma, dtype=np.float32)[:, None]] = 0
+
+    return conditioned
+
+
+def sigma_threshold(sigma, nsigma=5):
+    """Per-wire threshold column (wires, 1) that can be passed wherever a scalar ADC threshold is used."""
+    return (nsigma * np.asarray(sigma, dtype=np.float32))[:, None]
@@ -0,0 +1,267 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import xxhash
+
+from pathlib import Path
+
+from .dataset import ClusterDataset
+
+
+def between(table, column, low=None, high=None, inclusive=False):
+    """low < column < high (<= with inclusive); None leaves a side open."""
+    values = np.asarray(table[column])
+    mask = np.ones(len(values), dtype=bool)
+    if low is not None:
+        mask &= (values >= low) if inclusive else (values > low)
+    if high is not None:
+        mask &= (values <= high) if inclusive else (values < high)
+    return mask
+
+
+def equals(table, column, value):
+    return np.asarray(table[column]) == value
+
+
+def isin(table, on, keys):
+    """Rows whose (on) columns appear in keys (a DataFrame with those columns), like an inner merge."""
+    left = pd.MultiIndex.from_arrays([np.asarray(table[c]) for c in on])
+    right = pd.MultiIndex.from_arrays([np.asarray(keys[c]) for c in on])
+    return np.asarray(left.isin(right))
+
+
+def _hash_value(digest, value):
+    """Add a parameter or column to a digest: arrays by content, anything else by repr."""
+    if isinstance(value, pd.DataFrame):
+        for column in value.columns:
+            digest.update(str(column).encode())
+            _hash_value(digest, value[column].to_numpy())
+    elif isinstance(value, (pd.Series, pd.Index, np.ndarray, pa.Array, pa.ChunkedArray)):
+        values = np.asarray(value)
+        if values.dtype == object:
+            values = pd.util.hash_array(values.astype(str))
+        digest.update(str(values.dtype).encode())
+        digest.update(np.ascontiguousarray(values).tobytes())
+    elif isinstance(value, dict):
+        for key in sorted(value, key=str):
+            digest.update(repr(key).encode())
+            _hash_value(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}{len(value)}".encode())
+        for item in value:
+            _hash_value(digest, item)
+    else:
+        digest.update(repr(value).encode())
+
+
+def _function_key(func):
+    """Name and code of a cut function, so editing a cut invalidates its cached masks."""
+    digest = xxhash.xxh3_64(f"{func.__module__}.{func.__qualname__}".encode())
+    code = getattr(func, "__code__", None)
+    if code is not None:
+        digest.update(code.co_code)
+        digest.update(repr(code.co_consts).encode())
+    return digest.hexdigest()
+
+
+class Cut():
+    """A named cut: func(table, **params) -> bool mask over all rows of the table."""
+
+    def __init__(self, name, func, params, columns=None, uses_selection=False):
+
+        self.name = name
+        self.func = func
+        self.params = params
+        self.columns = columns
+        self.uses_selection = uses_selection
+
+    def __repr__(self):
+        params = ", ".join(f"{k}={v!r}" for k, v in self.params.items() if not isinstance(v, (pd.DataFrame, np.ndarray)))
+        return f"{self.name}({params})"
+
+
+class CutFlow():
+    """
+    Ordered, lazily evaluated chain of named cuts over a columnar table.
+
+    Each cut is a function of the table returning a boolean mask over all rows; the
+    selection after a stage is the AND of the masks up to it. A cut's mask is cached
+    (in memory, and on disk with cache_dir) under a key of its function, parameters
+    and a hash of the columns it reads, so after changing one threshold only that
+    cut is evaluated again. A cut added with uses_selection=True also receives the
+    selection before it (e.g. "events with exactly two clusters left") and its key
+    includes the upstream keys, so it is recomputed when anything above it changes.
+
+    The table can be a DataFrame, a pyarrow Table, a dict of arrays or a ClusterDataset.
+
+    Example:
+        flow = CutFlow(events, cache_dir="cache/cuts")
+        flow.add('mass', between, column='beamline_mass', low=600, high=1600, inclusive=True)
+        flow.add('one_track', equals, column='ntracks_reco', value=1)
+        flow.report()                      # rows left after each cut
+        flow.set('mass', high=1500)        # only 'mass' is evaluated again
+        protons = flow.selected()
+    """
+
+    def __init__(self, table, cache_dir=None):
+
+        self.table = table
+        self.cache_dir = None if cache_dir is None else Path(cache_dir)
+        self.cuts = []
+        self._column_hashes = {}
+        self._masks = {}
+        # Names of the cuts evaluated (not found in a cache) by the last call
+        self.computed = []
+
+    def __len__(self):
+        if isinstance(self.table, dict):
+            return len(next(iter(self.table.values()))) if self.table else 0
+        return len(self.table)
+
+    def __repr__(self):
+        return f"CutFlow({len(self)} rows, cuts: {' -> '.join(map(repr, self.cuts))})"
+
+    def _cut(self, name):
+        for cut in self.cuts:
+            if cut.name == name:
+                return cut
+        raise ValueError(f"No cut named {name!r} (cuts: {', '.join(c.name for c in self.cuts)})")
+
+    def add(self, name, func, columns=None, uses_selection=False, **params):
+        """
+        Append a cut. func is called as func(table, **params), or func(table, selection,
+        **params) with uses_selection.
+
+        Args:
+            columns: columns the cut reads, hashed for its cache key (inferred from the
+                     column / on parameters of the helpers here; all columns otherwise)
+        """
+        if any(cut.name == name for cut in self.cuts):
+            raise ValueError(f"Cut {name!r} already exists")
+        if columns is None and 'column' in params:
+            columns = [params['column']]
+        elif columns is None and 'on' in params:
+            columns = list(params['on'])
+        self.cuts.append(Cut(name, func, params, columns, uses_selection))
+        return self
+
+    def set(self, name, **params):
+        """Change parameters of a cut (the others keep their cached masks)."""
+        self._cut(name).params.update(params)
+        return self
+
+    def _column_hash(self, column):
+        if column not in self._column_hashes:
+            digest = xxhash.xxh3_128(str(column).encode())
+            _hash_value(digest, np.asarray(self.table[column]))
+            self._column_hashes[column] = digest.hexdigest()
+        return self._column_hashes[column]
+
+    def _all_columns(self):
+        if isinstance(self.table, ClusterDataset):
+            return [c for c in self.table.columns if c not in self.table.array_columns]
+        if isinstance(self.table, pa.Table):
+            return self.table.column_names
+        return list(self.table.keys()) if isinstance(self.table, dict) else list(self.table.columns)
+
+    def _key(self, cut, upstream):
+        digest = xxhash.xxh3_128(f"{cut.name}:{_function_key(cut.func)}:{len(self)}".encode())
+        _hash_value(digest, cut.params)
+        for column in (self._all_columns() if cut.columns is None else cut.columns):
+            digest.update(self._column_hash(column).encode())
+        if cut.uses_selection:
+            digest.update(upstream.encode())
+        return digest.hexdigest()
+
+    def _evaluate(self, cut, key, selection):
+        if key in self._masks:
+            return self._masks[key]
+
+        path = None if self.cache_dir is None else self.cache_dir / f"{cut.name}-{key}.npy"
+        if path is not None and path.exists():
+            mask = np.load(path)
+        else:
+            args = (self.table, selection) if cut.uses_selection else (self.table,)
+            mask = np.asarray(cut.func(*args, **cut.params), dtype=bool)
+            if mask.shape != (len(self),):
+                raise ValueError(f"Cut {cut.name!r} returned shape {mask.shape}, expected ({len(self)},)")
+            self.computed.append(cut.name)
+            if path is not None:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_name(path.stem + ".tmp.npy")
+                np.save(tmp_path, mask)
+                tmp_path.replace(path)
+
+        self._masks[key] = mask
+        return mask
+
+    def _run(self):
+        """(cut, own mask, selection after it) for every cut, evaluating what is not cached."""
+        self.computed = []
+        selection = np.ones(len(self), dtype=bool)
+        upstream = ""
+        stages = []
+        for cut in self.cuts:
+            key = self._key(cut, upstream)
+            mask = self._evaluate(cut, key, selection)
+            selection = selection & mask
+            upstream = xxhash.xxh3_128((upstream + key).encode()).hexdigest()
+            stages.append((cut, mask, selection))
+        return stages
+
+    def masks(self, cumulative=True):
+        """
+        dict cut name -> mask, in order: the selection after each cut (cumulative)
+        or each cut's own mask.
+        """
+        return {cut.name: selection if cumulative else mask for cut, mask, selection in self._run()}
+
+    def mask(self, name=None):
+        """Selection after cut name (default: after the last cut)."""
+        masks = self.masks()
+        if name is None:
+            return next(reversed(masks.values())) if masks else np.ones(len(self), dtype=bool)
+        self._cut(name)
+        return masks[name]
+
+    def selected(self, name=None):
+        """Rows of the table left after cut name (default: after the last cut)."""
+        mask = self.mask(name)
+        if isinstance(self.table, pd.DataFrame):
+            return self.table[mask]
+        if isinstance(self.table, pa.Table):
+            return self.table.filter(pa.array(mask))
+        if isinstance(self.table, ClusterDataset):
+            return self.table.subset(np.flatnonzero(mask))
+        return {name: np.asarray(values)[mask] for name, values in self.table.items()}
+
+    def report(self, groups=None):
+        """
+        Rows left after each cut, in one pass over the cuts.
+
+        Args:
+            groups: column name or labels (e.g. particle_type) to also count separately
+
+        Returns:
+            DataFrame indexed by cut ('all' first) with the cut parameters, the rows
+            passing the cut alone, the rows left, and the fraction of the previous stage kept
+        """
+        stages = self._run()
+        num = len(self)
+
+        rows = [{'cut': 'all', 'params': '', 'passed': num, 'remaining': num, 'kept': 1.0}]
+        previous = num
+        for cut, mask, selection in stages:
+            remaining = int(selection.sum())
+            rows.append({'cut': cut.name, 'params': repr(cut)[len(cut.name) + 1:-1],
+                         'passed': int(mask.sum()), 'remaining': remaining,
+                         'kept': remaining / previous if previous else np.nan})
+            previous = remaining
+        report = pd.DataFrame(rows).set_index('cut')
+
+        if groups is not None:
+            labels = np.asarray(self.table[groups]) if isinstance(groups, str) else np.asarray(groups)
+            selections = [np.ones(num, dtype=bool)] + [selection for _, _, selection in stages]
+            for label in pd.unique(labels):
+                report[label] = [int((s & (labels == label)).sum()) for s in selections]
+        return report
@@ -0,0 +1,237 @@
+import json
+import shutil
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pathlib import Path
+
+
+DATASET_VERSION = 1
+INFO_NAME = "dataset.json"
+META_NAME = "meta.parquet"
+
+
+def _is_array_column(values):
+    """True if an object column holds lists / arrays (images, column_maxes, ...)."""
+    for value in values:
+        if value is not None:
+            return isinstance(value, (list, tuple, np.ndarray))
+    return False
+
+
+class ClusterDataset():
+    """
+    Cluster table stored as flat arrays on disk, without a pickled DataFrame.
+
+    A dataset is a directory:
+
+        dataset.json                   number of rows and array columns
+        meta.parquet                   scalar columns (run, plane, bbox_*, max_intensity, ...)
+        <column>.values.f32            every row's array concatenated (row-major, float32)
+        <column>.offsets.i64           (N + 1) start of each row in the values
+        <column>.shapes.i32            (N, ndim) shape of each row's array
+
+    Array files are memory-mapped read-only on first use, so any number of DataLoader
+    workers share the same pages and a row is read by slicing, with no pandas lookup or
+    object conversion. The files only depend on the rows and their order, so converting
+    the same table twice gives identical files.
+
+    Example:
+        ClusterDataset.write(pd.read_pickle("allclusters.pkl"), "allclusters.clusters")
+        ds = ClusterDataset("allclusters.clusters")
+        image = ds.array('image_intensity', 1000)          # (height, width) view
+        part = ds.shard(worker_id, num_workers)            # contiguous slice of the rows
+    """
+
+    def __init__(self, path, rows=None):
+
+        self.path = Path(path)
+        with open(self.path / INFO_NAME) as f:
+            self.info = json.load(f)
+
+        if self.info.get('version') != DATASET_VERSION:
+            raise ValueError(f"Unsupported cluster dataset version {self.info.get('version')} in {self.path}")
+
+        # Row numbers of this view in the files (None for all rows)
+        self.rows = None if rows is None else np.asarray(rows, dtype=np.int64)
+        self._maps = {}
+        self._meta = None
+
+    def __len__(self):
+        return self.info['num'] if self.rows is None else len(self.rows)
+
+    def __repr__(self):
+        return f"ClusterDataset({self.path}, {len(self)} rows, arrays: {', '.join(self.array_columns)})"
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_maps'] = {}
+        state['_meta'] = None
+        return state
+
+    @property
+    def array_columns(self):
+        return list(self.info['arrays'])
+
+    @property
+    def columns(self):
+        return self.info['columns']
+
+    def _map(self, column, kind):
+        key = (column, kind)
+        if key not in self._maps:
+            file_path = self.path / f"{column}.{kind}"
+            if kind == "values.f32":
+                total = self.info['arrays'][column]['size']
+                # (np.memmap cannot map an empty file)
+                self._maps[key] = np.memmap(file_path, dtype=np.float32, mode="r", shape=(total,)) if total else np.zeros(0, np.float32)
+            elif kind == "offsets.i64":
+                self._maps[key] = np.memmap(file_path, dtype=np.int64, mode="r", shape=(self.info['num'] + 1,))
+            else:
+                ndim = self.info['arrays'][column]['ndim']
+                self._maps[key] = np.memmap(file_path, dtype=np.int32, mode="r", shape=(max(self.info['num'], 1), ndim))
+        return self._maps[key]
+
+    def _row(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"row {i} out of range for {len(self)} rows")
+        return int(i) if self.rows is None else int(self.rows[i])
+
+    def array(self, column, i):
+        """Array of row i in its stored shape (a read-only view of the file)."""
+        row = self._row(i)
+        offsets = self._map(column, "offsets.i64")
+        shape = self._map(column, "shapes.i32")[row]
+        return self._map(column, "values.f32")[offsets[row]:offsets[row + 1]].reshape(shape)
+
+    def arrays(self, column):
+        """Arrays of every row, as a list of views."""
+        return [self.array(column, i) for i in range(len(self))]
+
+    def images(self, column='image_intensity'):
+        return self.arrays(column)
+
+    def ragged(self, column):
+        """
+        (values, offsets) of an array column for the rows of this view.
+
+        For the full dataset these are the memmaps themselves; for a view the rows are
+        gathered (contiguous shards stay slices).
+        """
+        values, offsets = self._map(column, "values.f32"), self._map(column, "offsets.i64")
+        if self.rows is None:
+            return values, np.asarray(offsets)
+
+        rows = self.rows
+        if len(rows) and np.array_equal(rows, np.arange(rows[0], rows[0] + len(rows))):
+            start, stop = offsets[rows[0]], offsets[rows[-1] + 1]
+            return values[start:stop], np.asarray(offsets[rows[0]:rows[-1] + 2]) - start
+
+        counts = offsets[rows + 1] - offsets[rows]
+        new_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        take = np.repeat(offsets[rows] - new_offsets[:-1], counts) + np.arange(new_offsets[-1])
+        return values[take], new_offsets
+
+    def shapes(self, column):
+        shapes = np.asarray(self._map(column, "shapes.i32"))[:self.info['num']]
+        return shapes if self.rows is None else shapes[self.rows]
+
+    def table(self, columns=None):
+        """Scalar columns of this view as a DataFrame (read from meta.parquet once)."""
+        if self._meta is None:
+            self._meta = pq.read_table(self.path / META_NAME)
+        table = self._meta if columns is None else self._meta.select(columns)
+        if self.rows is not None:
+            table = table.take(pa.array(self.rows))
+        return table.to_pandas()
+
+    def __getitem__(self, column):
+        """A scalar column as a numpy array (so the dataset can stand in for a DataFrame)."""
+        if column in self.info['arrays']:
+            return self.arrays(column)
+        return self.table([column])[column].to_numpy()
+
+    def subset(self, indices):
+        """View of some rows (indices into this view)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        return ClusterDataset(self.path, indices if self.rows is None else self.rows[indices])
+
+    def shard(self, index, count):
+        """Contiguous shard index of count (the same split for the same dataset)."""
+        if not 0 <= index < count:
+            raise ValueError(f"Shard index {index} out of range for {count} shards")
+        bounds = np.linspace(0, len(self), count + 1).astype(np.int64)
+        return self.subset(np.arange(bounds[index], bounds[index + 1]))
+
+    def to_frame(self):
+        """Back to a DataFrame with the arrays as object columns (for old notebook code)."""
+        df = self.table()
+        for column in self.array_columns:
+            df[column] = [np.array(a) for a in self.arrays(column)]
+        return df[[c for c in self.columns if c in df.columns]]
+
+    @classmethod
+    def write(cls, df, path, array_columns=None, chunk_size=10_000, overwrite=False, verbose=True):
+        """
+        Convert a cluster DataFrame into a dataset directory.
+
+        Arrays are written chunk by chunk, so only chunk_size rows are converted at once
+        on top of the DataFrame itself. The directory is written to a temporary name and
+        renamed when complete.
+
+        Args:
+            array_columns: columns stored as arrays (default: object columns of lists / arrays)
+        """
+        path = Path(path)
+        if path.exists() and not overwrite:
+            raise ValueError(f"{path} already exists")
+
+        if array_columns is None:
+            array_columns = [c for c in df.columns if df[c].dtype == object and _is_array_column(df[c].values)]
+
+        tmp_path = path.with_name(path.name + ".tmp")
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+        tmp_path.mkdir(parents=True)
+
+        num = len(df)
+        arrays = {}
+        for column in array_columns:
+            values = df[column].values
+            first = next((np.asarray(v) for v in values if v is not None), np.zeros(0))
+            ndim = max(first.ndim, 1)
+            offsets = np.zeros(num + 1, dtype=np.int64)
+            shapes = np.zeros((max(num, 1), ndim), dtype=np.int32)
+
+            with open(tmp_path / f"{column}.values.f32", "wb") as f:
+                for start in range(0, num, chunk_size):
+                    chunk = [np.zeros((0,) * ndim, np.float32) if v is None else np.asarray(v, dtype=np.float32)
+                             for v in values[start:start + chunk_size]]
+                    for i, a in enumerate(chunk, start):
+                        if a.ndim != ndim:
+                            raise ValueError(f"Row {i} of {column} has {a.ndim} dimensions, expected {ndim}")
+                        shapes[i] = a.shape
+                        offsets[i + 1] = offsets[i] + a.size
+                    f.write(b"".join(np.ascontiguousarray(a).tobytes() for a in chunk))
+
+            offsets.tofile(tmp_path / f"{column}.offsets.i64")
+            shapes.tofile(tmp_path / f"{column}.shapes.i32")
+            arrays[column] = {'ndim': ndim, 'size': int(offsets[-1])}
+
+        meta = df.drop(columns=array_columns).reset_index(drop=True)
+        pq.write_table(pa.Table.from_pandas(meta, preserve_index=False), tmp_path / META_NAME)
+
+        with open(tmp_path / INFO_NAME, "w") as f:
+            json.dump({'version': DATASET_VERSION, 'num': num, 'columns': list(df.columns), 'arrays': arrays}, f, indent=2)
+
+        if path.exists():
+            shutil.rmtree(path)
+        tmp_path.rename(path)
+
+        if verbose:
+            print(f"Wrote {num} rows ({', '.join(array_columns)} as arrays) to {path}")
+        return cls(path)
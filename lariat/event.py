@@ -1,43 +1,102 @@
-import uproot
+import logging
 
 import numpy as np
 import pandas as pd
-import awkward as ak
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-from skimage.measure import label, regionprops
-from collections import deque
+from skimage.measure import regionprops
+
+from .loader import read_entry
+from .planes import build_planes, PLANE_DTYPE
+from .labels import PlaneLabels, grow_from_seeds, local_maxima
+from .sparse import SparsePlane
+from .conditioning import BaselineCache, condition_plane
+
+logger = logging.getLogger(__name__)
 
 class Event():
 
-    def __init__(self, filepath, index=0, threshold=1, plot=True):
+    def __init__(self, filepath, index=0, threshold=1, plot=True, loader=None, dtype=PLANE_DTYPE, sparse_threshold=None,
+                 baselines=None):
 
         self.filepath = filepath
         self.index = index
+        self.loader = loader
+        self.dtype = dtype
+        self.sparse_threshold = sparse_threshold
+        self.baselines = baselines
+
+        self.run = None
+        self.subrun = None
+        self.event = None
         
         self.collection = None
         self.induction = None
 
+        self.threshold = threshold
+        self._labels = {}   # (plane, threshold) -> PlaneLabels, filled on first use
+
         self.load()
 
         if plot == True:
             self.plot()
 
-        self.connectedclr, self.connectedcr = self.connectedregions(self.collection, threshold)
-        self.connectedilr, self.connectedir = self.connectedregions(self.induction, threshold // 2)
+    # Connected regions of both planes at the event's threshold, labelled on first access.
+    @property
+    def connectedclr(self):
+        return self.connectedregions(self.collection, self.threshold)[0]
+
+    @property
+    def connectedcr(self):
+        return self.connectedregions(self.collection, self.threshold)[1]
+
+    @property
+    def connectedilr(self):
+        return self.connectedregions(self.induction, self.threshold // 2)[0]
+
+    @property
+    def connectedir(self):
+        return self.connectedregions(self.induction, self.threshold // 2)[1]
+
+    @classmethod
+    def from_loader(cls, loader, index, filepath=None, threshold=1, plot=False, dtype=PLANE_DTYPE, sparse_threshold=None,
+                    baselines=None):
+        """
+        Build an Event through a shared RawLoader.
+
+        Consecutive events of the same file are served from the loader's cache, so
+        looping over a file only decompresses it once.
+
+        Args:
+            loader: lariat.RawLoader instance
+            index: entry number of the event in the file
+            filepath: file to read (defaults to loader.filepath)
+        """
+        filepath = filepath if filepath is not None else loader.filepath
+        return cls(filepath, index, threshold=threshold, plot=plot, loader=loader, dtype=dtype,
+                   sparse_threshold=sparse_threshold, baselines=baselines)
 
     def load(self):
         """
         Load raw ADC data from ROOT file and organise into collection and induction plane matrices.
         
-        Reads LArIAT raw digitized data from the specified ROOT file and event index,
-        then separates the 480 channels into collection plane (channels 240-479) and 
+        Reads LArIAT raw digitized data from the specified ROOT file and event index
+        (only the entry range holding that event is decompressed, through self.loader
+        if one was given), then separates the 480 channels into collection plane (channels 240-479) and 
         induction plane (channels 0-239) wire data.
         
         The method populates:
             - self.collection: 2D numpy array (240 wires × time_ticks) for collection plane
             - self.induction: 2D numpy array (240 wires × time_ticks) for induction plane
+        (stored as self.dtype, float32 by default; see lariat.planes.build_planes)
+
+        Baselines: if self.baselines is set (a lariat.conditioning.Baselines, or a
+        BaselineCache to look the run up in), the per-channel pedestals are subtracted
+        first (see condition()).
+
+        Sparse mode: if self.sparse_threshold is set, both planes are instead stored as
+        lariat.sparse.SparsePlane objects holding only the pixels with ADC > sparse_threshold.
         
         Channel mapping:
             - Channels 0-239: Induction plane wires
@@ -49,30 +108,41 @@ class Event():
             IndexError: If event index is out of range
         """
 
-        file = uproot.open(self.filepath)
-        tree = file["ana/raw"]
-        event_data = tree.arrays(["run", "subrun", "event"], library="ak")
+        if self.loader is not None:
+            data = self.loader.read(self.index, self.filepath)
+        else:
+            data = read_entry(self.filepath, self.index)
 
-        run = ak.to_numpy(event_data["run"])[self.index]
-        subrun = ak.to_numpy(event_data["subrun"])[self.index]
-        event = ak.to_numpy(event_data["event"])[self.index]
+        self.run, self.subrun, self.event = data["run"], data["subrun"], data["event"]
 
-        data = tree.arrays(["raw_rawadc", "raw_channel"], library="ak")[self.index]
-        adc_data = ak.to_numpy(data["raw_rawadc"])
-        channel_map = ak.to_numpy(data["raw_channel"])
+        self.collection, self.induction = build_planes(data["raw_rawadc"], data["raw_channel"], dtype=self.dtype)
 
-        num_channels_in_event = len(channel_map) # 480 - 240 in collection, 240 in induction - number of wires
-        num_ticks = len(adc_data) // num_channels_in_event
-        adc_data2d = adc_data.reshape((num_channels_in_event, num_ticks))
+        if self.baselines is not None:
+            self.condition(self.baselines)
 
-        self.collection = np.zeros((240, num_ticks))
-        self.induction = np.zeros((240, num_ticks))
+        if self.sparse_threshold is not None:
+            self.collection = SparsePlane.from_dense(self.collection, self.sparse_threshold)
+            self.induction = SparsePlane.from_dense(self.induction, self.sparse_threshold)
 
-        for i, channel_num in enumerate(channel_map):
-            if 0 <= channel_num < 240:
-                self.induction[channel_num, :] = adc_data2d[i, :]
-            if 240 <= channel_num < 480:
-                self.collection[channel_num - 240, :] = adc_data2d[i, :]          
+    def condition(self, baselines, coherent_noise=False, group_size=None, nsigma=None):
+        """
+        Subtract per-channel pedestals (and optionally coherent noise) from both planes.
+
+        Args:
+            baselines: lariat.conditioning.Baselines, or a BaselineCache (computed once per run)
+            coherent_noise: subtract the per-tick median across wires
+            group_size: wires per common-mode group (None for the whole plane)
+            nsigma: zero pixels below nsigma * sigma of their wire
+
+        Planes become float32; cached labellings of the raw planes are not reused.
+        """
+        if isinstance(baselines, BaselineCache):
+            baselines = baselines.get(self.run, self.filepath)
+        self.baselines = baselines
+
+        for plane in ('collection', 'induction'):
+            pedestal, sigma = baselines.plane(plane)
+            setattr(self, plane, condition_plane(getattr(self, plane), pedestal, sigma, coherent_noise, group_size, nsigma))
 
     def plot(self, collection=None, induction=None):
         """Plotting function, plots the collection and induction plane. 
@@ -81,6 +151,13 @@ class Event():
         c = collection if collection is not None else self.collection
         i = induction if induction is not None else self.induction
 
+        if isinstance(c, SparsePlane) and isinstance(i, SparsePlane):
+            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 4))
+            c.plot(ax1, "Collection Plane")
+            i.plot(ax2, "Induction Plane")
+            plt.show()
+            return
+
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 4))
 
         sns.heatmap(c.T, cmap="viridis", cbar_kws={'label': 'ADC Counts'}, ax=ax1)
@@ -101,199 +178,177 @@ class Event():
         """Incorporate final clustering algorithm."""
         return
 
+    def labelling(self, matrix, threshold=10):
+        """
+        Label connected regions of a plane above threshold, with per-cluster statistics.
+
+        The result (a lariat.labels.PlaneLabels) is cached per (plane, threshold), so
+        connectedregions, longestcluster and max_adc_ratio share a single labelling pass.
+        Matrices that are not one of the event's planes are labelled without caching.
+        In sparse mode the labelling runs on the pixel lists (lariat.sparse.SparseLabels).
+        """
+        if isinstance(matrix, SparsePlane):
+            compute = matrix.labelling
+        else:
+            compute = lambda threshold: PlaneLabels(matrix, threshold)
+
+        if matrix is self.collection:
+            plane = 'collection'
+        elif matrix is self.induction:
+            plane = 'induction'
+        else:
+            return compute(threshold)
+
+        key = (plane, threshold if np.ndim(threshold) == 0 else np.asarray(threshold).tobytes())
+        cached = self._labels.get(key)
+        if cached is None or cached.source is not matrix:
+            cached = self._labels[key] = compute(threshold)
+
+        return cached
+
     def connectedregions(self, matrix, threshold=10, verbose=False):
         """Find connected regions of signal above threshold"""
 
-        # Create binary mask (matrix 240 x 3072) of significant signals.
-        # (True (1) for above threshold, False (0) for below threshold.)
-        binary_mask = matrix > threshold
-        
-        # Label connected pixels
-        labeled_regions, num_regions = label(binary_mask, return_num=True)
+        # Binary mask (matrix 240 x 3072) of significant signals, labelled into connected
+        # pixel groups (cached, see labelling()).
+        labelled = self.labelling(matrix, threshold)
         
         if verbose:
-            print(f"Found {num_regions} connected regions")
+            print(f"Found {labelled.num} connected regions")
 
-        if num_regions == 0:
+        if labelled.num == 0:
             return None, None
         
-        # Properties of each region
-        regions = regionprops(labeled_regions, intensity_image=matrix) # arg "intensity_image" re-introduces the ADC values, now that clusters are identified. 
-        
-        return labeled_regions, regions
+        # Properties of each region (intensity image re-introduces the ADC values, now that clusters are identified).
+        return labelled.labels, labelled.regions
 
     def longestcluster(self, matrix, threshold=10):
         """Find only the largest connected region above threshold"""
-        binary_mask = matrix > threshold
-        labeled_regions, num_regions = label(binary_mask, return_num=True)
+        labelled = self.labelling(matrix, threshold)
         
-        print(f"Found {num_regions} connected regions")
+        logger.debug("Found %d connected regions", labelled.num)
         
-        if num_regions == 0:
+        if labelled.num == 0:
             return None, None
 
-        regions = regionprops(labeled_regions, intensity_image=matrix)
-        
         # The largest region by area
-        largest_region = max(regions, key=lambda r: r.area)
-        largest_idx = regions.index(largest_region)
-        
-        # print(f"Largest Region:")
-        # print(f"  Area: {largest_region.area} pixels")
-
-        total_intensity = matrix[largest_region.coords[:, 0], largest_region.coords[:, 1]].sum()
-        # print(f"  Total intensity: {total_intensity:.1f}")
+        largest_idx = int(np.argmax(labelled.area))
         
         # New labeled image with only the largest region
-        single_cluster_mask = labeled_regions == (largest_idx + 1)
-        
-        return single_cluster_mask.astype(int), [largest_region]
+        return labelled.mask(largest_idx), [labelled.regions[largest_idx]]
 
     def max_adc_ratio(self, matrix, threshold=10):
         """Find cluster with the largest max/min ADC ratio"""
 
-        binary_mask = matrix > threshold
+        labelled = self.labelling(matrix, threshold)
         
-        labeled_regions, num_regions = label(binary_mask, return_num=True)
+        logger.debug("Found %d connected regions", labelled.num)
         
-        print(f"Found {num_regions} connected regions")
-        
-        if num_regions == 0:
+        if labelled.num == 0:
             return None, None
         
-        regions = regionprops(labeled_regions, intensity_image=matrix)
-        
-        # Calculate ADC ratio for each region
-        adc_ratios = []
-        for region in regions:
-            region_values = matrix[region.coords[:, 0], region.coords[:, 1]] # getting ADC values of pixels in region.
-            min_adc = region_values.min() 
-            max_adc = region_values.max()
-            
-            # Avoid division by zero
-            if min_adc > 0:
-                adc_ratio = max_adc / min_adc
-            else:
-                adc_ratio = max_adc / (min_adc + 1e-6)  # Add small epsilon
-            
-            adc_ratios.append(adc_ratio)
-        
-        # Region with largest ADC ratio
-        max_ratio_idx = np.argmax(adc_ratios)
-        selected_region = regions[max_ratio_idx]
-        
-        # ADC statistics for selected region
-        region_values = matrix[selected_region.coords[:, 0], selected_region.coords[:, 1]]
-        min_adc = region_values.min()
-        max_adc = region_values.max()
-        adc_ratio = adc_ratios[max_ratio_idx]
-        
-        # print(f"Region with largest ADC ratio:")
-        # print(f"  Min ADC: {min_adc:.1f}")
-        # print(f"  Max ADC: {max_adc:.1f}")
-        # print(f"  ADC Ratio (max/min): {adc_ratio:.2f}")
+        # ADC ratio (max/min) of every region, computed in one pass by PlaneLabels
+        max_ratio_idx = int(np.argmax(labelled.adc_ratio))
         
         # Labeled image with only the selected region
-        single_cluster_mask = labeled_regions == (max_ratio_idx + 1)
-        
-        return single_cluster_mask.astype(int), [selected_region]
+        return labelled.mask(max_ratio_idx), [labelled.regions[max_ratio_idx]]
 
     def search_from_max_adc(self, matrix, threshold=None, connectivity=8, auto_threshold_ratio=6):
         """
         Find cluster starting from maximum ADC element and growing only connected pixels above threshold
         
         Args:
-            matrix: 2D array of ADC values
+            matrix: 2D array of ADC values, or a SparsePlane (grown on its pixel lists)
             threshold: minimum ADC value to include in cluster
             connectivity: 4 or 8 for neighbor connectivity
         
         Returns:
             labeled_regions: binary mask of the cluster
             region_props: list containing single region properties
+
+        Diagnostics are logged at DEBUG level (logger "lariat.event").
         """
-        
+        sparse = isinstance(matrix, SparsePlane)
+        if sparse and len(matrix) == 0:
+            return None, None
+
         # Find the global maximum ADC position
-        max_position = np.unravel_index(np.argmax(matrix), matrix.shape)
-        max_adc_value = matrix[max_position]
+        if sparse:
+            max_position = matrix.argmax()
+            max_adc_value = matrix.max()
+        else:
+            max_position = np.unravel_index(np.argmax(matrix), matrix.shape)
+            max_adc_value = matrix[max_position]
         
         # Auto-calculate threshold if not provided
         if threshold is None:
             threshold = max_adc_value / auto_threshold_ratio
-            print(f"Auto-calculated threshold: {threshold:.1f} (max_adc: {max_adc_value:.1f} / {auto_threshold_ratio})")
+            logger.debug("Auto-calculated threshold: %.1f (max_adc: %.1f / %s)", threshold, max_adc_value, auto_threshold_ratio)
         else:
-            print(f"Using provided threshold: {threshold:.1f}")
+            logger.debug("Using provided threshold: %.1f", threshold)
 
-        print(f"Max ADC value: {max_adc_value:.1f} at position {max_position}")
+        logger.debug("Max ADC value: %.1f at position %s", max_adc_value, max_position)
         
         # Check if max ADC is above threshold
         if max_adc_value <= threshold:
-            print(f"Max ADC {max_adc_value:.1f} is below threshold {threshold}")
+            logger.debug("Max ADC %.1f is below threshold %s", max_adc_value, threshold)
             return None, None
         
-        # Create binary mask for pixels above threshold
-        above_threshold = matrix > threshold
-        
-        # Create cluster mask starting from max position
-        cluster_mask = np.zeros_like(matrix, dtype=bool)
-        visited = np.zeros_like(matrix, dtype=bool)
-        
-        # BFS/flood fill from max position
-        queue = deque([max_position])
-        cluster_mask[max_position] = True
-        visited[max_position] = True
-        
-        # Define neighbors based on connectivity
-        if connectivity == 4:
-            neighbors = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-        else:  # connectivity == 8
-            neighbors = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-        
-        cluster_pixels = 1
+        # Connected above-threshold component containing the max position (same pixels as a
+        # BFS flood fill from it, but labelled in compiled code)
+        if sparse:
+            labeled_cluster, num = matrix.grow([max_position], threshold, connectivity)
+        else:
+            labeled_cluster, num = grow_from_seeds(matrix, [max_position], threshold, connectivity)
         
-        while queue:
-            current_pos = queue.popleft()
-            
-            # Check all neighbors
-            for dr, dc in neighbors:
-                new_row = current_pos[0] + dr
-                new_col = current_pos[1] + dc
-                
-                # Check bounds
-                if (0 <= new_row < matrix.shape[0] and 
-                    0 <= new_col < matrix.shape[1] and
-                    not visited[new_row, new_col]):
-                    
-                    visited[new_row, new_col] = True
-                    
-                    # If neighbor is above threshold, add to cluster
-                    if above_threshold[new_row, new_col]:
-                        cluster_mask[new_row, new_col] = True
-                        queue.append((new_row, new_col))
-                        cluster_pixels += 1
-        
-        print(f"Found cluster with {cluster_pixels} pixels starting from max ADC")
-        
-        # Create region properties manually or use skimage
-        if cluster_pixels > 0:
-            # Use skimage regionprops for consistency
-            labeled_cluster = cluster_mask.astype(int)
-            regions = regionprops(labeled_cluster, intensity_image=matrix)
-            
-            if len(regions) > 0:
-                region = regions[0]
-                # print(f"Cluster properties:")
-                # print(f"  Area: {region.area} pixels")
-                # print(f"  Centroid: ({region.centroid[0]:.1f}, {region.centroid[1]:.1f})")
-                # print(f"  Max intensity: {region.intensity_max:.1f}")
-                # print(f"  Min intensity: {region.intensity_min:.1f}")
-                
-                # Total intensity
-                total_intensity = matrix[region.coords[:, 0], region.coords[:, 1]].sum()
-                # print(f"  Total intensity: {total_intensity:.1f}")
-                
-                return labeled_cluster, [region]
+        if num == 0:
+            return None, None
+
+        regions = regionprops(labeled_cluster, intensity_image=matrix.to_dense() if sparse else matrix)
+        logger.debug("Found cluster with %d pixels starting from max ADC", regions[0].area)
         
-        return None, None
+        return labeled_cluster, regions
+
+    def search_from_local_maxima(self, matrix, num_seeds=5, threshold=None, connectivity=8, auto_threshold_ratio=6, min_distance=1):
+        """
+        Grow clusters from the num_seeds highest local ADC maxima in one call.
+
+        Same growing rule as search_from_max_adc (connected pixels above threshold, the
+        threshold defaulting to max ADC / auto_threshold_ratio); seeds that fall inside an
+        already grown cluster do not add another one.
+
+        Args:
+            matrix: 2D array of ADC values, or a SparsePlane (seeds are found on its
+                    dense form, clusters grown on its pixel lists)
+            num_seeds: number of local maxima used as seeds
+            threshold: minimum ADC value to include in a cluster
+            connectivity: 4 or 8 for neighbor connectivity
+            min_distance: minimum separation (pixels) between seeds
+
+        Returns:
+            labeled_regions: labelled image, cluster i (in seed order) has label i + 1
+            regions: list of region properties, one per grown cluster
+        """
+        sparse = isinstance(matrix, SparsePlane)
+        dense = matrix.to_dense() if sparse else matrix
+
+        if threshold is None:
+            threshold = matrix.max() / auto_threshold_ratio
+            logger.debug("Auto-calculated threshold: %.1f", threshold)
+
+        seeds = local_maxima(dense, num_peaks=num_seeds, threshold=threshold, min_distance=min_distance)
+        seeds = seeds[dense[seeds[:, 0], seeds[:, 1]] > threshold]
+        logger.debug("Growing from %d seeds", len(seeds))
+
+        if sparse:
+            labeled_regions, num = matrix.grow(seeds, threshold, connectivity)
+        else:
+            labeled_regions, num = grow_from_seeds(matrix, seeds, threshold, connectivity)
+
+        if num == 0:
+            return None, None
+
+        return labeled_regions, regionprops(labeled_regions, intensity_image=dense)
 
     def direction(self, matrix, threshold=10):
         
@@ -309,17 +364,24 @@ class Event():
         import matplotlib.patches as patches
 
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 4))
-        
-        # Original heatmap
-        sns.heatmap(matrix.T, cmap="viridis", ax=ax1, cbar_kws={'label': 'ADC Counts'})
-        ax1.set_title(f"{plane_name} - Original")
-        ax1.set_xlabel("Wire Number")
-        ax1.set_ylabel("Time Tick")
-        ax1.invert_yaxis()
-        
-        # Clusters overlay
+        sparse = isinstance(matrix, SparsePlane)
         alpha = 0.5 if mode == "basic" else 0.3
-        sns.heatmap(matrix.T, cmap="viridis", ax=ax2, alpha=alpha, cbar_kws={'label': 'ADC Counts'})
+        regions = regions or []
+
+        if sparse:
+            # Scatter of the kept pixels, already with ticks increasing upwards
+            matrix.plot(ax1, f"{plane_name} - Original")
+            matrix.plot(ax2, alpha=alpha)
+        else:
+            # Original heatmap
+            sns.heatmap(matrix.T, cmap="viridis", ax=ax1, cbar_kws={'label': 'ADC Counts'})
+            ax1.set_title(f"{plane_name} - Original")
+            ax1.set_xlabel("Wire Number")
+            ax1.set_ylabel("Time Tick")
+            ax1.invert_yaxis()
+
+            # Clusters overlay
+            sns.heatmap(matrix.T, cmap="viridis", ax=ax2, alpha=alpha, cbar_kws={'label': 'ADC Counts'})
         
         colors = plt.cm.tab10(np.linspace(0, 1, len(regions)))
         
@@ -348,7 +410,8 @@ class Event():
         ax2.set_title(f"{plane_name} - {suffix}")
         ax2.set_xlabel("Wire Number")
         ax2.set_ylabel("Time Tick")
-        ax2.invert_yaxis()
+        if not sparse:
+            ax2.invert_yaxis()
 
         plt.tight_layout()
         plt.show()
@@ -399,6 +462,8 @@ class Event():
             labeled_regions, regions = self.longestcluster(matrix, threshold)
         elif algo == 'max':
             labeled_regions, regions = self.search_from_max_adc(matrix)
+        elif algo == 'maxima':
+            labeled_regions, regions = self.search_from_local_maxima(matrix)
 
         self.visualiseclusters(matrix, regions, plane.title(), plot_mode)
 
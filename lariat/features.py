@@ -0,0 +1,226 @@
+import numpy as np
+import pandas as pd
+
+from .dataset import ClusterDataset
+from .cutflow import CutFlow, between
+
+
+# Cluster cuts of notebooks/matching.ipynb.
+MIN_HEIGHT = 3          # height > MIN_HEIGHT (wires): noise
+MAX_HEIGHT = 180        # height < MAX_HEIGHT: muons, noise
+MIN_MAX_INTENSITY = {   # max_intensity >= threshold (ADC), per plane
+    'collection': 100,
+    'induction': 50,
+}
+BBOX_WINDOWS = {        # column -> exclusive (low, high), per plane
+    'collection': {'bbox_min_row': (12, 37), 'bbox_max_col': (789, 1927)},
+    'induction': {'bbox_min_row': (11, 35), 'bbox_max_col': (786, 1794)},
+}
+
+FEATURE_COLUMNS = ['num_wires', 'profile_max', 'profile_min', 'maxdiff', 'maxdiff_wire']
+CUT_NAMES = ['height', 'not_constant', 'maxdiff', 'max_height', 'max_intensity', 'bbox']
+
+
+def _segment_reduce(ufunc, values, offsets, empty=np.nan):
+    """ufunc.reduceat over each [offsets[i], offsets[i + 1]) segment, empty segments set to empty."""
+    counts = np.diff(offsets)
+    out = np.full(len(counts), empty, dtype=np.float64)
+    nonempty = counts > 0
+    if nonempty.any():
+        out[nonempty] = ufunc.reduceat(values, offsets[:-1][nonempty])
+    return out
+
+
+def ragged_column(clusters, column='column_maxes'):
+    """
+    (values, offsets) of a list column of a cluster DataFrame or ClusterDataset.
+
+    A ClusterDataset already stores the column this way (the fast path); a DataFrame
+    is concatenated once, which dominates the run time for pickles of Python lists.
+    """
+    if isinstance(clusters, ClusterDataset):
+        values, offsets = clusters.ragged(column)
+        return np.asarray(values, dtype=np.float64), np.asarray(offsets, dtype=np.int64)
+
+    arrays = [np.asarray(a, dtype=np.float64).ravel() for a in clusters[column].values]
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum([len(a) for a in arrays], out=offsets[1:])
+    values = np.concatenate(arrays) if arrays else np.zeros(0, dtype=np.float64)
+    return values, offsets
+
+
+def normalised_profiles(values, offsets):
+    """
+    Each profile divided by its maximum (minimum taken as 0), all-zero if the maximum is <= 0.
+
+    Returns flat values with the same offsets.
+    """
+    counts = np.diff(offsets)
+    peak = np.repeat(_segment_reduce(np.maximum, values, offsets), counts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(peak > 0, values / peak, 0.0)
+
+
+def profile_diffs(values, offsets):
+    """np.diff of every profile, as (flat values, offsets) with one fewer entry per profile."""
+    counts = np.diff(offsets)
+    row = np.repeat(np.arange(len(counts)), counts)
+    same = row[1:] == row[:-1]
+    diff_counts = np.maximum(counts - 1, 0)
+    diff_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(diff_counts, out=diff_offsets[1:])
+    return np.diff(values)[same], diff_offsets
+
+
+def cluster_features(clusters, column='column_maxes'):
+    """
+    Per-wire profile features of every cluster in one vectorised pass.
+
+    Args:
+        clusters: DataFrame with a column_maxes list column, or a ClusterDataset
+
+    Returns:
+        DataFrame with FEATURE_COLUMNS, one row per cluster in input order:
+            num_wires: length of the profile
+            profile_max, profile_min: extremes of the raw profile (equal for a constant one)
+            maxdiff: largest wire-to-wire step of the normalised profile (NaN for < 2 wires)
+            maxdiff_wire: index of the wire where that step starts (-1 for < 2 wires)
+    """
+    values, offsets = ragged_column(clusters, column)
+    counts = np.diff(offsets)
+
+    diffs, diff_offsets = profile_diffs(normalised_profiles(values, offsets), offsets)
+    maxdiff = _segment_reduce(np.maximum, diffs, diff_offsets)
+
+    # Position of the largest step: first diff equal to its segment max
+    diff_counts = np.diff(diff_offsets)
+    diff_row = np.repeat(np.arange(len(counts)), diff_counts)
+    at_max = np.flatnonzero(diffs == maxdiff[diff_row])
+    rows = diff_row[at_max]
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = rows[1:] != rows[:-1]
+    maxdiff_wire = np.full(len(counts), -1, dtype=np.int64)
+    maxdiff_wire[rows[first]] = at_max[first] - diff_offsets[rows[first]]
+
+    return pd.DataFrame({
+        'num_wires': counts,
+        'profile_max': _segment_reduce(np.maximum, values, offsets),
+        'profile_min': _segment_reduce(np.minimum, values, offsets),
+        'maxdiff': maxdiff,
+        'maxdiff_wire': maxdiff_wire,
+    }, columns=FEATURE_COLUMNS)
+
+
+def plane_thresholds(table, thresholds, column='max_intensity'):
+    """OR over planes of (plane == name) & (column >= threshold)."""
+    plane, values = np.asarray(table['plane']), np.asarray(table[column])
+    mask = np.zeros(len(plane), dtype=bool)
+    for name, threshold in thresholds.items():
+        mask |= (plane == name) & (values >= threshold)
+    return mask
+
+
+def plane_windows(table, windows):
+    """OR over planes of (plane == name) & every column inside its exclusive window."""
+    plane = np.asarray(table['plane'])
+    mask = np.zeros(len(plane), dtype=bool)
+    for name, columns in windows.items():
+        inside = plane == name
+        for column, (low, high) in columns.items():
+            values = np.asarray(table[column])
+            inside &= (values > low) & (values < high)
+        mask |= inside
+    return mask
+
+
+def _not_constant(table):
+    # len(set(column_maxes)) > 1
+    return np.asarray(table['profile_max'] > table['profile_min'])
+
+
+def cluster_cut_flow(clusters, features=None, min_height=MIN_HEIGHT, max_height=MAX_HEIGHT,
+                     min_max_intensity=MIN_MAX_INTENSITY, bbox_windows=BBOX_WINDOWS, cache_dir=None):
+    """
+    The cuts of notebooks/matching.ipynb as a lariat.cutflow.CutFlow over the cluster
+    columns they need and the cluster_features.
+
+    Args:
+        clusters: DataFrame or ClusterDataset with height, plane, max_intensity,
+                  bbox_min_row, bbox_max_col and column_maxes
+        features: cluster_features output (computed if not given)
+        bbox_windows: None to skip the bounding box cut
+        cache_dir: where the CutFlow keeps its masks between sessions
+    """
+    features = cluster_features(clusters) if features is None else features
+    columns = ['height', 'plane', 'max_intensity'] + sorted({c for w in (bbox_windows or {}).values() for c in w})
+    table = clusters.table(columns) if isinstance(clusters, ClusterDataset) else clusters[columns].reset_index(drop=True)
+    table = pd.concat([table, features], axis=1)
+
+    flow = CutFlow(table, cache_dir)
+    flow.add('height', between, column='height', low=min_height)
+    flow.add('not_constant', _not_constant, columns=['profile_max', 'profile_min'])
+    flow.add('maxdiff', between, column='maxdiff', low=0, inclusive=True)
+    flow.add('max_height', between, column='height', high=max_height)
+    flow.add('max_intensity', plane_thresholds, columns=['plane', 'max_intensity'], thresholds=min_max_intensity)
+    if bbox_windows is not None:
+        window_columns = sorted({c for w in bbox_windows.values() for c in w})
+        flow.add('bbox', plane_windows, columns=['plane'] + window_columns, windows=bbox_windows)
+    return flow
+
+
+def cluster_cuts(clusters, features=None, **kwargs):
+    """
+    Boolean mask of each cut of notebooks/matching.ipynb, every cut on all clusters.
+
+    Extra keyword arguments go to cluster_cut_flow.
+
+    Returns:
+        dict cut name -> bool array, in CUT_NAMES order
+    """
+    return cluster_cut_flow(clusters, features, **kwargs).masks(cumulative=False)
+
+
+def cut_flow(cuts, groups=None):
+    """
+    Clusters left after each cut applied in order, and the combined mask.
+
+    Args:
+        cuts: dict name -> bool array (cluster_cuts output)
+        groups: optional array of labels (e.g. particle_type) for extra count columns
+
+    Returns:
+        (counts DataFrame indexed by cut, with 'all' first, final mask)
+    """
+    num = len(next(iter(cuts.values()))) if cuts else 0
+    mask = np.ones(num, dtype=bool)
+    masks = {'all': mask}
+    for name, cut in cuts.items():
+        mask = mask & cut
+        masks[name] = mask
+
+    counts = pd.DataFrame({'clusters': [int(m.sum()) for m in masks.values()]}, index=list(masks))
+    if groups is not None:
+        groups = np.asarray(groups)
+        for label in pd.unique(groups):
+            counts[label] = [int((m & (groups == label)).sum()) for m in masks.values()]
+    counts.index.name = 'cut'
+    return counts, mask
+
+
+def select_clusters(clusters, groups=None, **kwargs):
+    """
+    Features, cut flow and passing rows of a cluster table in one call.
+
+    Extra keyword arguments go to cluster_cuts.
+
+    Args:
+        groups: column name (e.g. 'particle_type') or labels to count separately
+
+    Returns:
+        (features of all clusters, counts DataFrame, final mask)
+    """
+    if isinstance(groups, str):
+        groups = clusters[groups]
+    features = cluster_features(clusters)
+    counts, mask = cut_flow(cluster_cuts(clusters, features, **kwargs), groups)
+    return features, counts, mask
@@ -0,0 +1,169 @@
+import math
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pathlib import Path
+
+
+# Columns identifying one track in the per-hit run CSV.
+GROUP_KEYS = ["beamline_mass", "wctrkmomentum", "tof", "trklength", "trkendx", "trkendy", "trkendz", "ntrkcalopts"]
+
+# Aggregation of every other column, in output order (as in scripts/group_particles.py).
+AGGREGATIONS = {
+    "run": "first",
+    "subrun": "first",
+    "eventtype": "first",
+    "incint": "list",
+    "negativeke": "first",
+    "positionxtpc": "list",
+    "positionytpc": "list",
+    "positionztpc": "list",
+    "decayatrest": "first",
+    "residualrange": "list",
+    "trkdedx": "list",
+    "nslice": "list",
+    "cke": "list",
+}
+
+ROW_COLUMN = "__row"
+
+
+def _aggregate(frame):
+    """Group one in-memory frame (rows in input order); groups come out in first-appearance order."""
+    aggregations = {column: (list if how == "list" else how) for column, how in AGGREGATIONS.items()}
+    aggregations[ROW_COLUMN] = "min"
+    return frame.groupby(GROUP_KEYS, sort=False).agg(aggregations).reset_index()
+
+
+def _chunk_schema(chunk):
+    """Arrow schema of a chunk, with columns that are empty in it typed null (they unify with anything)."""
+    schema = pa.Schema.from_pandas(chunk, preserve_index=False).remove_metadata()
+    for i, column in enumerate(chunk.columns):
+        if chunk[column].isna().all():
+            schema = schema.set(i, pa.field(column, pa.null()))
+    return schema
+
+
+def _global_schema(schemas):
+    """
+    One schema for all chunks: each column promoted to a type that holds every chunk's
+    values (int64 and float64 give float64), as reading the whole CSV at once would.
+    """
+    schema = pa.unify_schemas(schemas, promote_options="permissive")
+    # Empty in every chunk: float64, like read_csv
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, pa.field(field.name, pa.float64()))
+    return schema
+
+
+def _parse_memory(memory_limit):
+    """Bytes from an int or a string like '4GB' / '512MB'."""
+    if isinstance(memory_limit, (int, float)):
+        return int(memory_limit)
+    units = {"KB": 1024, "MB": 1024**2, "GB": 1024**3, "TB": 1024**4, "B": 1}
+    text = memory_limit.strip().upper()
+    for unit, factor in units.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+
+def group_tracks(csv_path, output_path=None, memory_limit="4GB", chunk_size=500_000, num_partitions=None,
+                 spill_dir=None, verbose=True):
+    """
+    Group the per-hit run CSV into one row per track on the CPU, out of core.
+
+    Same result as the dask_cudf pipeline of scripts/group_particles.py: group by
+    GROUP_KEYS (rows with a missing key are dropped), 'first' (first non-null value) or
+    'list' (all values, in input order) for every column of AGGREGATIONS, keys first.
+    Groups are ordered by their first row in the CSV, which makes the output
+    deterministic.
+
+    The CSV is read in chunks of chunk_size rows. Each chunk is hash-partitioned on the
+    keys and, when more than one partition is needed, spilled to Parquet under
+    spill_dir; every partition is then grouped on its own, so at most one partition is
+    held in memory. The number of partitions is chosen from the file size and
+    memory_limit unless given. Column types can differ between chunks (an integer
+    column with a gap is float64 there), so every chunk is cast to one schema unified
+    over all chunks before grouping, and spilled and in-memory runs give the same output.
+
+    Args:
+        csv_path: input CSV
+        output_path: if given, the result is written there with DataFrame.to_parquet
+        memory_limit: approximate memory budget, bytes or a string such as '4GB'
+        chunk_size: CSV rows read at a time
+        num_partitions: number of hash partitions (default: from the file size)
+        spill_dir: directory for spilled partitions (default: a temporary directory)
+
+    Returns:
+        grouped DataFrame
+    """
+    memory_limit = _parse_memory(memory_limit)
+    if num_partitions is None:
+        # Parsed frames take a few times the CSV text size.
+        num_partitions = max(1, math.ceil(4 * Path(csv_path).stat().st_size / memory_limit))
+
+    spill = num_partitions > 1
+    if spill:
+        spill_root = Path(tempfile.mkdtemp(prefix="group_tracks_", dir=spill_dir))
+    partitions = [[] for _ in range(num_partitions)]
+    schemas = []
+
+    try:
+        offset = 0
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+            chunk.columns = chunk.columns.str.strip()
+            chunk[ROW_COLUMN] = np.arange(offset, offset + len(chunk), dtype=np.int64)
+            offset += len(chunk)
+
+            chunk = chunk[GROUP_KEYS + list(AGGREGATIONS) + [ROW_COLUMN]].dropna(subset=GROUP_KEYS)
+            schemas.append(_chunk_schema(chunk))
+
+            if not spill:
+                partitions[0].append(chunk)
+                continue
+
+            # Same keys always hash to the same partition (as float64, so that a column read
+            # as int64 in one chunk and float64 in another still hashes equal values alike)
+            keys = chunk[GROUP_KEYS].apply(lambda column: column.astype(np.float64) if column.dtype.kind in "iub" else column)
+            codes = pd.util.hash_pandas_object(keys, index=False).to_numpy() % num_partitions
+            for p in np.unique(codes):
+                path = spill_root / f"part{p}-{len(partitions[p])}.parquet"
+                chunk[codes == p].to_parquet(path, engine="pyarrow", index=False)
+                partitions[p].append(path)
+
+        if verbose:
+            print(f"Read {offset:,} rows into {num_partitions} partition(s)")
+
+        grouped = []
+        schema = _global_schema(schemas) if schemas else None
+        for parts in partitions:
+            if not parts:
+                continue
+            tables = [pq.read_table(p) if spill else pa.Table.from_pandas(p, preserve_index=False) for p in parts]
+            frame = pa.concat_tables([t.select(schema.names).cast(schema) for t in tables]).to_pandas()
+            grouped.append(_aggregate(frame))
+            del tables, frame
+
+    finally:
+        if spill:
+            shutil.rmtree(spill_root, ignore_errors=True)
+
+    if grouped:
+        result = pd.concat(grouped, ignore_index=True).sort_values(ROW_COLUMN, kind="stable")
+    else:
+        result = pd.DataFrame(columns=GROUP_KEYS + list(AGGREGATIONS) + [ROW_COLUMN])
+    result = result.drop(columns=ROW_COLUMN).reset_index(drop=True)
+
+    if output_path is not None:
+        result.to_parquet(output_path, engine="pyarrow")
+        if verbose:
+            print(f"Wrote {len(result):,} tracks to {output_path}")
+
+    return result
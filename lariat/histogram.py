@@ -0,0 +1,256 @@
+import os
+import hashlib
+import inspect
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+
+
+# Default binning of dE/dx (MeV/cm) vs residual range (cm) heatmaps.
+RR_EDGES = np.linspace(0, 100, 201)
+DEDX_EDGES = np.linspace(0, 70, 281)
+
+
+class Histogram2D():
+    """
+    Fixed-binning 2D histogram that can be filled in pieces, merged and saved.
+
+    Filling computes the bin of every point and counts them with one np.bincount, so a
+    sample can be streamed through without keeping its points. Histograms with the same
+    edges add up (h1 + h2, Histogram2D.merge), which lets each file or run be filled
+    separately, in parallel, and combined afterwards.
+
+    Binning follows np.histogram2d: bins are [low, high) except the last one, which
+    includes its upper edge; points outside the edges are not counted.
+
+    Attributes:
+        x_edges, y_edges: bin edges
+        counts: (len(x_edges) - 1, len(y_edges) - 1) int64 array
+        sources: names of what was filled in (e.g. file paths), for bookkeeping
+    """
+
+    def __init__(self, x_edges=RR_EDGES, y_edges=DEDX_EDGES, counts=None, sources=()):
+
+        self.x_edges = np.asarray(x_edges, dtype=np.float64)
+        self.y_edges = np.asarray(y_edges, dtype=np.float64)
+        shape = (len(self.x_edges) - 1, len(self.y_edges) - 1)
+        self.counts = np.zeros(shape, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64).reshape(shape)
+        self.sources = list(sources)
+
+    def __repr__(self):
+        return f"Histogram2D({self.counts.shape[0]} x {self.counts.shape[1]} bins, {self.total} entries)"
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    @property
+    def x_centers(self):
+        return (self.x_edges[:-1] + self.x_edges[1:]) / 2
+
+    @property
+    def y_centers(self):
+        return (self.y_edges[:-1] + self.y_edges[1:]) / 2
+
+    @staticmethod
+    def _bin(values, edges):
+        """Bin index of each value (-1 outside the edges), np.histogram convention."""
+        index = np.searchsorted(edges, values, side="right") - 1
+        index[values == edges[-1]] = len(edges) - 2
+        index[(values < edges[0]) | (values > edges[-1]) | np.isnan(values)] = -1
+        return index
+
+    def fill(self, x, y):
+        """Add points (x, y); returns self."""
+        x = np.asarray(x, dtype=np.float64).ravel()
+        y = np.asarray(y, dtype=np.float64).ravel()
+        if len(x) != len(y):
+            raise ValueError(f"x and y have different lengths ({len(x)} and {len(y)})")
+
+        ix, iy = self._bin(x, self.x_edges), self._bin(y, self.y_edges)
+        inside = (ix >= 0) & (iy >= 0)
+        flat = ix[inside] * self.counts.shape[1] + iy[inside]
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+        return self
+
+    def compatible(self, other):
+        return np.array_equal(self.x_edges, other.x_edges) and np.array_equal(self.y_edges, other.y_edges)
+
+    def __iadd__(self, other):
+        if not self.compatible(other):
+            raise ValueError("Cannot add histograms with different bin edges")
+        self.counts += other.counts
+        self.sources.extend(other.sources)
+        return self
+
+    def __add__(self, other):
+        result = self.copy()
+        result += other
+        return result
+
+    def copy(self):
+        return Histogram2D(self.x_edges, self.y_edges, self.counts.copy(), self.sources)
+
+    @classmethod
+    def merge(cls, histograms):
+        """Sum of several histograms with the same edges."""
+        histograms = list(histograms)
+        if not histograms:
+            raise ValueError("No histograms to merge")
+        result = histograms[0].copy()
+        for histogram in histograms[1:]:
+            result += histogram
+        return result
+
+    def save(self, path):
+        """Write the histogram to a compressed .npz file."""
+        np.savez_compressed(path, x_edges=self.x_edges, y_edges=self.y_edges, counts=self.counts,
+                            sources=np.array(self.sources, dtype=str))
+
+    @classmethod
+    def load(cls, path):
+        """Read a histogram written by save()."""
+        with np.load(path) as data:
+            return cls(data['x_edges'], data['y_edges'], data['counts'], data['sources'].tolist())
+
+    def profile(self, min_counts=1):
+        """
+        Mean and standard error of y in every x bin with at least min_counts entries.
+
+        Returns:
+            (x, mean, error, counts) arrays over the kept x bins
+        """
+        counts = self.counts.sum(axis=1)
+        weights = self.counts.astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = weights @ self.y_centers / counts
+            variance = weights @ self.y_centers**2 / counts - mean**2
+            error = np.sqrt(np.maximum(variance, 0) / counts)
+
+        keep = counts >= min_counts
+        return self.x_centers[keep], mean[keep], error[keep], counts[keep]
+
+    def fit_power_law(self, x_range=None, y_range=None, min_counts=5):
+        """
+        Fit y = A * x**b to the binned data (e.g. a Bragg curve dE/dx = A * rr**b).
+
+        Weighted least squares of log(y) on log(x) over all bins with entries, each bin
+        weighted by its count; equivalent to fitting the points themselves up to the bin
+        width, without needing them.
+
+        Args:
+            x_range, y_range: (low, high) limits of the bins used in the fit
+            min_counts: ignore x columns with fewer entries in total
+
+        Returns:
+            (A, b)
+        """
+        x, y = np.meshgrid(self.x_centers, self.y_centers, indexing="ij")
+        weights = self.counts.astype(np.float64)
+        weights[self.counts.sum(axis=1) < min_counts] = 0
+
+        use = (weights > 0) & (x > 0) & (y > 0)
+        if x_range is not None:
+            use &= (x >= x_range[0]) & (x <= x_range[1])
+        if y_range is not None:
+            use &= (y >= y_range[0]) & (y <= y_range[1])
+        if use.sum() < 2:
+            raise ValueError("Not enough filled bins to fit a power law")
+
+        b, log_a = np.polyfit(np.log(x[use]), np.log(y[use]), 1, w=np.sqrt(weights[use]))
+        return np.exp(log_a), b
+
+    def plot(self, ax=None, cmap="viridis", cmin=1, label='Counts', **kwargs):
+        """pcolormesh of the counts (bins with fewer than cmin entries left blank)."""
+        if ax is None:
+            _, ax = plt.subplots(figsize=(10, 6))
+        counts = np.ma.masked_less(self.counts, cmin).T
+        mesh = ax.pcolormesh(self.x_edges, self.y_edges, counts, cmap=cmap, **kwargs)
+        plt.colorbar(mesh, ax=ax, label=label)
+        return ax
+
+
+def _selection_key(**kwargs):
+    """Calorimetry options of a fill, with defaults filled in so omitted and explicit defaults match."""
+    from .calorimetry import dedx_vs_residual_range
+
+    bound = inspect.signature(dedx_vs_residual_range).bind_partial(**kwargs)
+    bound.apply_defaults()
+    # Options that do not change the histogram
+    options = {k: v for k, v in bound.arguments.items() if k not in ('files', 'histogram', 'keep_points', 'step_size')}
+    return repr(sorted(options.items()))
+
+
+def _cache_path(cache_dir, file_path, x_edges, y_edges, **kwargs):
+    """
+    Per-file histogram cache, keyed by path, size and mtime of the input, the
+    calorimetry options (plane, single_track, max_dedx, ...) and the bin edges.
+    """
+    stat = os.stat(file_path)
+    digest = hashlib.sha1(f"{Path(file_path).resolve()}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    digest.update(_selection_key(**kwargs).encode())
+    for edges in (x_edges, y_edges):
+        digest.update(np.ascontiguousarray(edges, dtype=np.float64).tobytes())
+    return Path(cache_dir) / f"{Path(file_path).stem}-{digest.hexdigest()[:12]}.npz"
+
+
+def fill_file(file_path, x_edges, y_edges, cache_path=None, **kwargs):
+    """
+    dE/dx vs residual range histogram of one anatree file.
+    This function is designed to be run in a separate process.
+
+    Extra keyword arguments go to lariat.calorimetry.dedx_vs_residual_range (plane,
+    single_track, max_dedx, tree_name, step_size).
+    """
+    from .calorimetry import dedx_vs_residual_range
+
+    histogram = Histogram2D(x_edges, y_edges, sources=[str(file_path)])
+    dedx_vs_residual_range(file_path, histogram=histogram, keep_points=False, **kwargs)
+
+    if cache_path is not None:
+        Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+        histogram.save(cache_path)
+    return histogram
+
+
+def fill_files(files, x_edges=RR_EDGES, y_edges=DEDX_EDGES, cache_dir=None, max_workers=None, **kwargs):
+    """
+    Fill one dE/dx vs residual range histogram per file on a process pool and merge them.
+
+    With a cache_dir, each file's histogram is stored there; files that did not change
+    since are not read again, so adding a run only fills that run's files. The cache is
+    keyed by file, calorimetry options and binning, so one cache_dir can hold several
+    selections.
+
+    Returns:
+        merged Histogram2D
+    """
+    files = [str(f) for f in ([files] if isinstance(files, (str, Path)) else files)]
+    histograms, tasks = [], []
+
+    for file_path in files:
+        cache_path = _cache_path(cache_dir, file_path, x_edges, y_edges, **kwargs) if cache_dir is not None else None
+        if cache_path is not None and cache_path.exists():
+            cached = Histogram2D.load(cache_path)
+            if cached.compatible(Histogram2D(x_edges, y_edges)):
+                histograms.append(cached)
+                continue
+        tasks.append((file_path, cache_path))
+
+    if tasks:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(fill_file, file_path, x_edges, y_edges, cache_path, **kwargs)
+                       for file_path, cache_path in tasks]
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Filling Histograms"):
+                histograms.append(future.result())
+
+    if not histograms:
+        return Histogram2D(x_edges, y_edges)
+
+    # Same order whatever finished first
+    histograms.sort(key=lambda h: h.sources)
+    return Histogram2D.merge(histograms)
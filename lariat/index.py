@@ -0,0 +1,268 @@
+import os
+import uproot
+
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .loader import RAW_TREE, ID_BRANCHES
+
+
+# Bit layout of packed event keys: run | subrun | event (21 + 17 + 25 bits).
+RUN_BITS, SUBRUN_BITS, EVENT_BITS = 21, 17, 25
+
+
+def pack_ids(run, subrun, event):
+    """
+    Pack (run, subrun, event) into a single sortable int64 key.
+
+    Works element-wise on scalars or arrays.
+
+    Raises:
+        ValueError: If a value does not fit its bit field
+    """
+    run = np.asarray(run, dtype=np.int64)
+    subrun = np.asarray(subrun, dtype=np.int64)
+    event = np.asarray(event, dtype=np.int64)
+
+    for name, values, bits in (("run", run, RUN_BITS), ("subrun", subrun, SUBRUN_BITS), ("event", event, EVENT_BITS)):
+        if values.size and (values.min() < 0 or values.max() >= 1 << bits):
+            raise ValueError(f"{name} out of range for packed event keys (0 <= {name} < {1 << bits})")
+
+    return (run << (SUBRUN_BITS + EVENT_BITS)) | (subrun << EVENT_BITS) | event
+
+
+def unpack_ids(keys):
+    """Inverse of pack_ids, returns (run, subrun, event) arrays."""
+    keys = np.asarray(keys, dtype=np.int64)
+    run = keys >> (SUBRUN_BITS + EVENT_BITS)
+    subrun = (keys >> EVENT_BITS) & ((1 << SUBRUN_BITS) - 1)
+    event = keys & ((1 << EVENT_BITS) - 1)
+    return run, subrun, event
+
+
+def scan_file(file_path, tree_name=RAW_TREE):
+    """
+    Read the (run, subrun, event) triplets of one file.
+    This function is designed to be run in a separate process.
+
+    Returns:
+        dict with file_path, file_size, file_mtime, keys (packed, in entry order) and error
+    """
+    stat = os.stat(file_path)
+    result = {
+        'file_path': str(file_path),
+        'file_size': stat.st_size,
+        'file_mtime': stat.st_mtime_ns,
+        'keys': np.zeros(0, dtype=np.int64),
+        'error': '',
+    }
+
+    try:
+        with uproot.open(file_path) as file:
+            if tree_name not in file:
+                result['error'] = f'No {tree_name} tree found'
+                return result
+
+            ids = file[tree_name].arrays(ID_BRANCHES, library="np")
+            result['keys'] = pack_ids(ids["run"], ids["subrun"], ids["event"])
+
+    except Exception as e:
+        result['error'] = str(e)
+
+    return result
+
+
+class EventIndex():
+    """
+    Persistent (run, subrun, event) -> (file, entry) index.
+
+    The index is a sorted array of packed event keys with, for each key, the file it
+    lives in and its entry number, plus a per-file table (path, size, mtime, entries,
+    error). It is stored as a single compressed .npz file, so lookups are a
+    np.searchsorted over the keys and never open ROOT files.
+
+    Build or refresh an index with EventIndex.build; only files whose size or mtime
+    changed since the last build are re-read.
+
+    Example:
+        index = EventIndex.build("/data/deuteron_extracted_root", "deuteron_index.npz")
+        matches = index.lookup(df['run'], df['subrun'], df['event'])
+    """
+
+    def __init__(self, keys, file_ids, entries, files):
+
+        self.keys = keys            # sorted packed keys
+        self.file_ids = file_ids    # row of self.files for each key
+        self.entries = entries      # entry number within that file
+        self.files = files          # DataFrame: file_path, file_size, file_mtime, num_entries, error
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __repr__(self):
+        return f"EventIndex({len(self)} events in {len(self.files)} files)"
+
+    @classmethod
+    def from_scans(cls, scans):
+        """Assemble an index from scan_file results."""
+        files = pd.DataFrame({
+            'file_path': [s['file_path'] for s in scans],
+            'file_size': np.array([s['file_size'] for s in scans], dtype=np.int64),
+            'file_mtime': np.array([s['file_mtime'] for s in scans], dtype=np.int64),
+            'num_entries': np.array([len(s['keys']) for s in scans], dtype=np.int64),
+            'error': [s['error'] for s in scans],
+        })
+
+        if scans:
+            keys = np.concatenate([s['keys'] for s in scans]).astype(np.int64)
+            file_ids = np.repeat(np.arange(len(scans), dtype=np.int32), files['num_entries'].to_numpy())
+            entries = np.concatenate([np.arange(len(s['keys']), dtype=np.int64) for s in scans])
+        else:
+            keys = np.zeros(0, dtype=np.int64)
+            file_ids = np.zeros(0, dtype=np.int32)
+            entries = np.zeros(0, dtype=np.int64)
+
+        order = np.argsort(keys, kind="stable")
+        return cls(keys[order], file_ids[order], entries[order], files)
+
+    def scans(self):
+        """Split the index back into per-file scan results (used for incremental rebuilds)."""
+        order = np.lexsort((self.entries, self.file_ids))
+        keys = self.keys[order]
+        bounds = np.concatenate([[0], np.cumsum(self.files['num_entries'].to_numpy())])
+
+        return [{
+            'file_path': row.file_path,
+            'file_size': int(row.file_size),
+            'file_mtime': int(row.file_mtime),
+            'keys': keys[bounds[i]:bounds[i + 1]],
+            'error': row.error,
+        } for i, row in enumerate(self.files.itertuples(index=False))]
+
+    def save(self, path):
+        """Write the index to a compressed .npz file."""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(
+            path,
+            keys=self.keys,
+            file_ids=self.file_ids,
+            entries=self.entries,
+            file_path=self.files['file_path'].to_numpy(dtype=str),
+            file_size=self.files['file_size'].to_numpy(),
+            file_mtime=self.files['file_mtime'].to_numpy(),
+            num_entries=self.files['num_entries'].to_numpy(),
+            error=self.files['error'].to_numpy(dtype=str),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Read an index written by save()."""
+        with np.load(path) as data:
+            files = pd.DataFrame({
+                'file_path': data['file_path'].astype(object),
+                'file_size': data['file_size'],
+                'file_mtime': data['file_mtime'],
+                'num_entries': data['num_entries'],
+                'error': data['error'].astype(object),
+            })
+            return cls(data['keys'], data['file_ids'], data['entries'], files)
+
+    @classmethod
+    def build(cls, directory_path, index_path=None, pattern="*.root", num_processes=None, verbose=True,
+              use_threads=False):
+        """
+        Scan a directory and build (or incrementally refresh) an index.
+
+        Args:
+            directory_path: directory containing ROOT files
+            index_path: where the index is stored; if it exists, files with unchanged
+                        size and mtime are taken from it instead of being re-read
+            pattern: file pattern to match (default: "*.root")
+            num_processes: number of processes (or threads) used to scan changed files
+            use_threads: scan with a thread pool instead of a process pool
+
+        Returns:
+            EventIndex
+        """
+        directory_path = Path(directory_path)
+        if not directory_path.exists():
+            raise ValueError(f"Directory does not exist: {directory_path}")
+
+        cached = {}
+        if index_path is not None and Path(index_path).exists():
+            try:
+                cached = {s['file_path']: s for s in cls.load(index_path).scans()}
+            except Exception as e:
+                print(f"Warning: ignoring unreadable index {index_path}: {e}")
+
+        scans, to_scan = [], []
+        for file_path in sorted(directory_path.glob(pattern)):
+            stat = file_path.stat()
+            previous = cached.get(str(file_path))
+            if previous is not None and previous['file_size'] == stat.st_size and previous['file_mtime'] == stat.st_mtime_ns:
+                scans.append(previous)
+            else:
+                to_scan.append(file_path)
+
+        if verbose:
+            print(f"Index: {len(scans)} unchanged files, scanning {len(to_scan)} new or modified files...")
+
+        if to_scan:
+            executor = ThreadPoolExecutor if use_threads else ProcessPoolExecutor
+            with executor(max_workers=num_processes) as pool:
+                scans.extend(pool.map(scan_file, to_scan))
+
+        scans.sort(key=lambda s: s['file_path'])
+        index = cls.from_scans(scans)
+
+        if index_path is not None and (to_scan or len(cached) != len(scans)):
+            try:
+                index.save(index_path)
+            except OSError as e:
+                print(f"Warning: could not write index {index_path}: {e}")
+
+        return index
+
+    def lookup(self, run, subrun, event):
+        """
+        Find where events live.
+
+        Args:
+            run, subrun, event: scalars or equal-length arrays of event identifiers
+
+        Returns:
+            DataFrame with run, subrun, event, file_path, filename, event_index_in_file
+            (one row per match, sorted by event ID; events found in several files give
+            several rows, events not in the index give none)
+        """
+        queries = np.unique(np.atleast_1d(pack_ids(run, subrun, event)))
+
+        left = np.searchsorted(self.keys, queries, side="left")
+        right = np.searchsorted(self.keys, queries, side="right")
+
+        # Expand each [left, right) range into the positions it covers.
+        counts = right - left
+        positions = np.repeat(left, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        runs, subruns, events = unpack_ids(self.keys[positions])
+        file_paths = self.files['file_path'].to_numpy()[self.file_ids[positions]]
+
+        return pd.DataFrame({
+            'run': runs,
+            'subrun': subruns,
+            'event': events,
+            'file_path': file_paths,
+            'filename': [Path(p).name for p in file_paths],
+            'event_index_in_file': self.entries[positions],
+        })
+
+    def contains(self, run, subrun, event):
+        """Boolean array, True where an event ID is present in the index."""
+        queries = np.atleast_1d(pack_ids(run, subrun, event))
+        positions = np.searchsorted(self.keys, queries)
+        positions = np.minimum(positions, max(len(self.keys) - 1, 0))
+        return (self.keys[positions] == queries) if len(self.keys) else np.zeros(len(queries), dtype=bool)
+
@@ -0,0 +1,181 @@
+import uproot
+
+import numpy as np
+import awkward as ak
+
+from collections import OrderedDict
+
+
+RAW_TREE = "ana/raw"
+ID_BRANCHES = ["run", "subrun", "event"]
+RAW_BRANCHES = ["raw_rawadc", "raw_channel"]
+
+
+class RawLoader():
+    """
+    Shared, cached reader for the "ana/raw" tree of RawDigitExtractor files.
+
+    Instead of reading a whole TTree to pick out one entry, the loader reads the
+    basket-aligned entry range that contains the requested entry (using
+    entry_start / entry_stop) and keeps the decoded range in an LRU cache. Asking for
+    the next entry of the same file is then served from memory, so iterating over a
+    whole file costs a single decompression pass.
+
+    Open file handles are kept in a second, smaller LRU so that jumping between a
+    handful of files does not re-open them every time.
+
+    Args:
+        filepath: optional default file, used when read() is called without a path
+        max_bytes: byte budget for decoded entry ranges held in the cache
+        max_open_files: number of ROOT file handles kept open at once
+        tree_name: name of the raw tree inside the file
+    """
+
+    def __init__(self, filepath=None, max_bytes=512 * 1024**2, max_open_files=8, tree_name=RAW_TREE):
+
+        self.filepath = filepath
+        self.max_bytes = max_bytes
+        self.max_open_files = max_open_files
+        self.tree_name = tree_name
+
+        self._files = OrderedDict()    # path -> open uproot file
+        self._chunks = OrderedDict()   # (path, entry_start, entry_stop) -> dict of numpy / awkward arrays
+        self._offsets = {}             # path -> basket entry boundaries of the raw_rawadc branch
+        self.cached_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Close all open file handles and drop the decoded cache."""
+        for file in self._files.values():
+            file.close()
+        self._files.clear()
+        self._chunks.clear()
+        self._offsets.clear()
+        self.cached_bytes = 0
+
+    def _path(self, filepath):
+        path = filepath if filepath is not None else self.filepath
+        if path is None:
+            raise ValueError("No file path given and the loader has no default filepath")
+        return str(path)
+
+    def tree(self, filepath=None):
+        """Return the raw tree of a file, re-using an open handle if there is one."""
+        path = self._path(filepath)
+
+        if path in self._files:
+            self._files.move_to_end(path)
+        else:
+            self._files[path] = uproot.open(path)
+            while len(self._files) > self.max_open_files:
+                _, oldest = self._files.popitem(last=False)
+                oldest.close()
+
+        return self._files[path][self.tree_name]
+
+    def num_entries(self, filepath=None):
+        """Number of events in the raw tree of a file."""
+        return self.tree(filepath).num_entries
+
+    def _entry_range(self, path, index):
+        """Basket-aligned [start, stop) range of entries that contains index."""
+        if path not in self._offsets:
+            tree = self.tree(path)
+            self._offsets[path] = np.asarray(tree["raw_rawadc"].entry_offsets, dtype=np.int64)
+
+        offsets = self._offsets[path]
+        num_entries = offsets[-1]
+
+        if index < 0:
+            index += num_entries
+        if not 0 <= index < num_entries:
+            raise IndexError(f"Event index {index} out of range for {path} ({num_entries} entries)")
+
+        basket = np.searchsorted(offsets, index, side="right") - 1
+        return int(index), int(offsets[basket]), int(offsets[basket + 1])
+
+    def _read_range(self, path, entry_start, entry_stop):
+        """Decode one entry range, using the cache if possible."""
+        key = (path, entry_start, entry_stop)
+
+        if key in self._chunks:
+            self._chunks.move_to_end(key)
+            return self._chunks[key]
+
+        arrays = self.tree(path).arrays(ID_BRANCHES + RAW_BRANCHES, entry_start=entry_start,
+                                        entry_stop=entry_stop, library="ak")
+        chunk = {name: ak.to_numpy(arrays[name]) for name in ID_BRANCHES}
+        chunk.update({name: arrays[name] for name in RAW_BRANCHES})
+        chunk["nbytes"] = arrays.nbytes
+
+        self._chunks[key] = chunk
+        self.cached_bytes += chunk["nbytes"]
+
+        # Evict least recently used ranges until we are back under budget (always keep the newest).
+        while self.cached_bytes > self.max_bytes and len(self._chunks) > 1:
+            _, evicted = self._chunks.popitem(last=False)
+            self.cached_bytes -= evicted["nbytes"]
+
+        return chunk
+
+    def read(self, index, filepath=None):
+        """
+        Read a single event.
+
+        Args:
+            index: entry number of the event in the file
+            filepath: file to read from (defaults to the loader's filepath)
+
+        Returns:
+            dict with run, subrun, event (ints) and raw_rawadc, raw_channel (1D numpy arrays)
+
+        Raises:
+            IndexError: If event index is out of range
+        """
+        path = self._path(filepath)
+        index, entry_start, entry_stop = self._entry_range(path, index)
+        chunk = self._read_range(path, entry_start, entry_stop)
+
+        local = index - entry_start
+        return {
+            "run": int(chunk["run"][local]),
+            "subrun": int(chunk["subrun"][local]),
+            "event": int(chunk["event"][local]),
+            "raw_rawadc": ak.to_numpy(chunk["raw_rawadc"][local]),
+            "raw_channel": ak.to_numpy(chunk["raw_channel"][local]),
+        }
+
+    def ids(self, filepath=None):
+        """(run, subrun, event) arrays for every entry of a file, without touching the ADC branches."""
+        ids = self.tree(filepath).arrays(ID_BRANCHES, library="np")
+        return ids["run"], ids["subrun"], ids["event"]
+
+
+def read_entry(filepath, index, tree_name=RAW_TREE):
+    """
+    Read one event without a shared loader (only the requested entry is decompressed).
+
+    Returns the same dict as RawLoader.read.
+    """
+    with uproot.open(filepath) as file:
+        tree = file[tree_name]
+        num_entries = tree.num_entries
+        if index < 0:
+            index += num_entries
+        if not 0 <= index < num_entries:
+            raise IndexError(f"Event index {index} out of range for {filepath} ({num_entries} entries)")
+
+        arrays = tree.arrays(ID_BRANCHES + RAW_BRANCHES, entry_start=index, entry_stop=index + 1, library="ak")[0]
+
+    return {
+        "run": int(arrays["run"]),
+        "subrun": int(arrays["subrun"]),
+        "event": int(arrays["event"]),
+        "raw_rawadc": ak.to_numpy(arrays["raw_rawadc"]),
+        "raw_channel": ak.to_numpy(arrays["raw_channel"]),
+    }
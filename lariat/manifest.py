@@ -0,0 +1,138 @@
+import os
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+
+from .index import EventIndex, unpack_ids
+
+
+# Default name of the cached scan (a lariat.index.EventIndex); it lives in the user
+# cache, not next to the (often read-only) ROOT files, unless a path is given.
+MANIFEST_NAME = "root_index.npz"
+
+MANIFEST_COLUMNS = ['file_path', 'file_size', 'file_mtime', 'num_entries', 'has_tree',
+                    'run_min', 'run_max', 'subrun_min', 'subrun_max', 'error']
+
+
+def default_manifest_path(directory_path):
+    """
+    Manifest of a directory in the user cache: $XDG_CACHE_HOME/lariat/manifests (or
+    ~/.cache/lariat/manifests), one file per resolved directory path.
+    """
+    directory_path = Path(directory_path).resolve()
+    cache_home = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    key = hashlib.sha1(str(directory_path).encode()).hexdigest()[:12]
+    return cache_home / "lariat" / "manifests" / f"{directory_path.name}-{key}-{MANIFEST_NAME}"
+
+
+class FileManifest():
+    """
+    Per-file metadata table of a directory of ROOT files.
+
+    One row per file with MANIFEST_COLUMNS, summarised from the per-file scans of a
+    lariat.index.EventIndex. The index is the cache: building a manifest re-reads only
+    files whose size or mtime changed since it was written, so re-running over an
+    unchanged directory does not open any ROOT file. save() / load() export the table
+    as CSV.
+
+    Example:
+        manifest = FileManifest.build("/data/deuteron_extracted_root")
+        manifest.total_events
+        manifest.query("run_min <= 8600 <= run_max")
+    """
+
+    def __init__(self, files):
+
+        self.files = files.reset_index(drop=True)
+
+    def __len__(self):
+        return len(self.files)
+
+    def __repr__(self):
+        return f"FileManifest({len(self)} files, {self.total_events} events, {len(self.failed)} failed)"
+
+    @property
+    def total_events(self):
+        return int(self.files['num_entries'].sum())
+
+    @property
+    def failed(self):
+        """Rows of files that could not be read or have no tree."""
+        return self.files[self.files['error'] != '']
+
+    def query(self, expr):
+        """Rows matching a DataFrame.query expression, e.g. "run_min <= 8600 <= run_max"."""
+        return self.files.query(expr)
+
+    def files_for_run(self, run, subrun=None):
+        """Paths of the files whose run (and subrun) range covers the given values."""
+        selected = (self.files['run_min'] <= run) & (self.files['run_max'] >= run)
+        if subrun is not None:
+            selected &= (self.files['subrun_min'] <= subrun) & (self.files['subrun_max'] >= subrun)
+        return self.files.loc[selected, 'file_path'].tolist()
+
+    @classmethod
+    def from_index(cls, index):
+        """Summarise the per-file scans of a lariat.index.EventIndex."""
+        rows = []
+        for scan in index.scans():
+            run, subrun, _ = unpack_ids(scan['keys'])
+            rows.append({
+                'file_path': scan['file_path'],
+                'file_size': scan['file_size'],
+                'file_mtime': scan['file_mtime'],
+                'num_entries': len(scan['keys']),
+                'has_tree': scan['error'] == '',
+                'run_min': int(run.min()) if len(run) else -1,
+                'run_max': int(run.max()) if len(run) else -1,
+                'subrun_min': int(subrun.min()) if len(subrun) else -1,
+                'subrun_max': int(subrun.max()) if len(subrun) else -1,
+                'error': scan['error'],
+            })
+        files = pd.DataFrame(rows, columns=MANIFEST_COLUMNS).astype({
+            'file_size': np.int64, 'file_mtime': np.int64, 'num_entries': np.int64, 'has_tree': bool,
+            'run_min': np.int64, 'run_max': np.int64, 'subrun_min': np.int64, 'subrun_max': np.int64,
+        })
+        return cls(files)
+
+    def save(self, path):
+        """Write the manifest to a CSV file (replaced atomically)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        self.files.to_csv(tmp_path, index=False)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a manifest written by save()."""
+        files = pd.read_csv(path, dtype={'file_path': str, 'error': str}, keep_default_na=False)
+        return cls(files[MANIFEST_COLUMNS])
+
+    @classmethod
+    def build(cls, directory_path, manifest_path=None, pattern="*.root", max_workers=None, use_threads=True, verbose=True):
+        """
+        Scan a directory and build (or incrementally refresh) its manifest.
+
+        Args:
+            directory_path: directory containing ROOT files
+            manifest_path: EventIndex cache (default: default_manifest_path(directory_path),
+                           in the user cache); if it exists, scans of unchanged files are
+                           reused; False disables it
+            pattern: file pattern to match (default: "*.root")
+            max_workers: number of threads / processes used to scan changed files
+            use_threads: scan with a thread pool (header reads are I/O bound); False
+                         uses a process pool
+
+        Returns:
+            FileManifest
+        """
+        if manifest_path is None:
+            manifest_path = default_manifest_path(directory_path)
+
+        index = EventIndex.build(directory_path, manifest_path or None, pattern=pattern, num_processes=max_workers,
+                                 verbose=verbose, use_threads=use_threads)
+        return cls.from_index(index)
@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+
+from .dataset import ClusterDataset
+
+
+# Collection minus induction time of the same vertex (ticks), slope-1 fit of
+# notebooks/time_matching.ipynb: induction_time = collection_time - 44.14.
+TIME_OFFSET = 44.14
+EVENT_COLUMNS = ['run', 'subrun', 'event']
+# Cluster tick range, [start, stop) as written by lariat.clustering
+TIME_COLUMNS = ('bbox_min_col', 'bbox_max_col')
+WIRE_COLUMNS = ('bbox_min_row', 'bbox_max_row')
+
+MATCH_COLUMNS = EVENT_COLUMNS + ['collection_row', 'induction_row', 'overlap', 'iou', 'coverage',
+                                 'start_residual', 'stop_residual', 'wire_delta', 'best']
+
+
+def percentile_bounds(wire, time, percentiles=(10, 90)):
+    """
+    Bounds of the main cluster of vertices, as find_cluster_bounds in time_matching.ipynb:
+    the extent of the points inside the per-axis percentile range.
+
+    Returns:
+        (wire_min, wire_max, time_min, time_max)
+    """
+    wire, time = np.asarray(wire), np.asarray(time)
+    wire_low, wire_high = np.percentile(wire, percentiles)
+    time_low, time_high = np.percentile(time, percentiles)
+    inside = (wire >= wire_low) & (wire <= wire_high) & (time >= time_low) & (time <= time_high)
+    return wire[inside].min(), wire[inside].max(), time[inside].min(), time[inside].max()
+
+
+def fit_time_offset(collection_time, induction_time):
+    """Least-squares collection - induction offset with the slope fixed to 1 (ticks)."""
+    return float(np.mean(np.asarray(collection_time, dtype=np.float64) - np.asarray(induction_time, dtype=np.float64)))
+
+
+def _table(clusters, columns):
+    if isinstance(clusters, ClusterDataset):
+        return clusters.table(columns)
+    return clusters[columns].reset_index(drop=True)
+
+
+def split_planes(clusters, plane_column='plane'):
+    """(collection, induction) rows of one cluster table, with their row numbers in it."""
+    plane = np.asarray(clusters[plane_column])
+    rows = {name: np.flatnonzero(plane == name) for name in ('collection', 'induction')}
+    if isinstance(clusters, ClusterDataset):
+        return clusters.subset(rows['collection']), clusters.subset(rows['induction']), rows
+    return clusters.iloc[rows['collection']], clusters.iloc[rows['induction']], rows
+
+
+def match_planes(collection, induction, offset=TIME_OFFSET, tolerance=0, min_overlap=None,
+                 time_columns=TIME_COLUMNS, wire_columns=WIRE_COLUMNS, event_columns=EVENT_COLUMNS):
+    """
+    Pair collection and induction clusters of the same event whose tick ranges overlap.
+
+    Both tables are handled at once with a sort-merge interval join: each interval is
+    placed on one axis as event * stride + tick (the stride keeps events apart), the
+    induction intervals are sorted by start, and for every collection interval the
+    candidates are the slice of induction starts that can still reach it, found with
+    two searchsorted calls. Cost is O((n + m) log m + pairs), with no loop over events.
+
+    Induction ticks are shifted by offset before comparing, and each side is widened
+    by tolerance ticks. Points (vertices) work too: pass the same column as start and stop
+    with a tolerance.
+
+    Args:
+        collection, induction: DataFrames or ClusterDatasets with the event, time and
+                               (optionally) wire columns
+        tolerance: ticks by which ranges may miss each other and still be paired
+        min_overlap: minimum overlap in ticks for a pair to be kept (None: any pair within the tolerance)
+
+    Returns:
+        DataFrame with MATCH_COLUMNS, one row per pair:
+            collection_row, induction_row: row numbers in the input tables
+            overlap: overlapping ticks of the (unwidened) shifted ranges, can be < 0 within the tolerance
+            iou: overlap / union of the two ranges
+            coverage: overlap / length of the shorter range
+            start_residual, stop_residual: collection - shifted induction start / stop
+            wire_delta: difference of the wire range centres (NaN without wire columns)
+            best: the pair is the best match of both its clusters: highest iou, then
+                  largest overlap (for points or ranges that do not overlap, the
+                  smallest gap), then smallest |start_residual| + |stop_residual|
+    """
+    wire_columns = list(wire_columns or [])
+    if not all(c in collection.columns and c in induction.columns for c in wire_columns):
+        wire_columns = []
+    columns = event_columns + list(dict.fromkeys(time_columns)) + wire_columns
+    col, ind = _table(collection, columns), _table(induction, columns)
+
+    # Dense event numbers shared by both tables
+    keys = pd.concat([col[event_columns], ind[event_columns]], ignore_index=True)
+    codes = pd.MultiIndex.from_frame(keys).factorize()[0].astype(np.int64)
+    col_event, ind_event = codes[:len(col)], codes[len(col):]
+
+    a0 = col[time_columns[0]].to_numpy(dtype=np.float64)
+    a1 = col[time_columns[1]].to_numpy(dtype=np.float64)
+    b0 = ind[time_columns[0]].to_numpy(dtype=np.float64) + offset
+    b1 = ind[time_columns[1]].to_numpy(dtype=np.float64) + offset
+
+    ticks = np.concatenate([a0, a1, b0, b1])
+    low = ticks.min() - tolerance if len(ticks) else 0
+    stride = (ticks.max() - low + 2 * tolerance + 1) if len(ticks) else 1
+
+    # Widened intervals on the global axis
+    col_start = col_event * stride + (a0 - tolerance - low)
+    col_stop = col_event * stride + (a1 + tolerance - low)
+    ind_start = ind_event * stride + (b0 - low)
+    ind_stop = ind_event * stride + (b1 - low)
+
+    order = np.argsort(ind_start, kind="stable")
+    sorted_start = ind_start[order]
+    max_length = (ind_stop - ind_start).max() if len(ind_start) else 0
+
+    # Induction starts in [col_start - max_length, col_stop] can overlap
+    lo = np.searchsorted(sorted_start, col_start - max_length, side="left")
+    hi = np.searchsorted(sorted_start, col_stop, side="right")
+    counts = hi - lo
+    pair_col = np.repeat(np.arange(len(col)), counts)
+    pair_ind = order[np.repeat(lo, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)]
+
+    keep = (col_event[pair_col] == ind_event[pair_ind]) & (ind_stop[pair_ind] >= col_start[pair_col])
+    pair_col, pair_ind = pair_col[keep], pair_ind[keep]
+
+    overlap = np.minimum(a1[pair_col], b1[pair_ind]) - np.maximum(a0[pair_col], b0[pair_ind])
+    if min_overlap is not None:
+        keep = overlap >= min_overlap
+        pair_col, pair_ind, overlap = pair_col[keep], pair_ind[keep], overlap[keep]
+
+    length_a, length_b = a1[pair_col] - a0[pair_col], b1[pair_ind] - b0[pair_ind]
+    union = np.maximum(a1[pair_col], b1[pair_ind]) - np.minimum(a0[pair_col], b0[pair_ind])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        iou = np.where(union > 0, np.maximum(overlap, 0) / union, (overlap >= 0).astype(np.float64))
+        coverage = np.where(np.minimum(length_a, length_b) > 0,
+                            np.clip(overlap / np.minimum(length_a, length_b), 0, 1), (overlap >= 0).astype(np.float64))
+
+    if wire_columns:
+        col_centre = col[wire_columns].to_numpy(dtype=np.float64).mean(axis=1)
+        ind_centre = ind[wire_columns].to_numpy(dtype=np.float64).mean(axis=1)
+        wire_delta = col_centre[pair_col] - ind_centre[pair_ind]
+    else:
+        wire_delta = np.full(len(pair_col), np.nan)
+
+    matches = col[event_columns].iloc[pair_col].reset_index(drop=True)
+    matches['collection_row'] = pair_col
+    matches['induction_row'] = pair_ind
+    matches['overlap'] = overlap
+    matches['iou'] = iou
+    matches['coverage'] = coverage
+    matches['start_residual'] = a0[pair_col] - b0[pair_ind]
+    matches['stop_residual'] = a1[pair_col] - b1[pair_ind]
+    matches['wire_delta'] = wire_delta
+    residual = np.abs(matches['start_residual'].to_numpy()) + np.abs(matches['stop_residual'].to_numpy())
+    matches['best'] = _mutual_best(pair_col, pair_ind, (iou, overlap, -residual))
+    return matches[MATCH_COLUMNS]
+
+
+def _mutual_best(pair_col, pair_ind, scores):
+    """
+    True for pairs that have the highest score of both their collection and induction cluster.
+
+    scores: tuple of arrays compared in order, later ones breaking ties of earlier ones
+    """
+    best = np.zeros(len(pair_col), dtype=bool)
+    if not len(pair_col):
+        return best
+    best_col = np.zeros(len(pair_col), dtype=bool)
+    best_ind = np.zeros(len(pair_col), dtype=bool)
+    for side, flags in ((pair_col, best_col), (pair_ind, best_ind)):
+        # Highest scores first within each cluster (remaining ties: first pair)
+        order = np.lexsort(tuple(-np.asarray(score) for score in reversed(scores)) + (side,))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = side[order][1:] != side[order][:-1]
+        flags[order[first]] = True
+    return best_col & best_ind
+
+
+def match_clusters(clusters, plane_column='plane', **kwargs):
+    """
+    match_planes on one table holding both planes (e.g. allclusters.pkl).
+
+    Extra keyword arguments go to match_planes. collection_row / induction_row are
+    row numbers in clusters.
+    """
+    collection, induction, rows = split_planes(clusters, plane_column)
+    matches = match_planes(collection, induction, **kwargs)
+    matches['collection_row'] = rows['collection'][matches['collection_row'].to_numpy()]
+    matches['induction_row'] = rows['induction'][matches['induction_row'].to_numpy()]
+    return matches
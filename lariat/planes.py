@@ -0,0 +1,56 @@
+import numpy as np
+
+
+NUM_WIRES = 240             # wires per plane
+NUM_CHANNELS = 2 * NUM_WIRES
+PLANE_DTYPE = np.float32    # default storage type for plane matrices
+
+
+def build_planes(adc_data, channel_map, dtype=PLANE_DTYPE, num_wires=NUM_WIRES):
+    """
+    Split the flat raw ADC buffer of one event into collection and induction planes.
+
+    The rows of the reshaped (num_channels x num_ticks) buffer are scattered onto a
+    fixed (2 * num_wires x num_ticks) canvas with a single fancy-indexing assignment,
+    instead of copying wire by wire.
+
+    Channel mapping:
+        - Channels 0-239: Induction plane wires
+        - Channels 240-479: Collection plane wires (mapped to indices 0-239)
+        - Anything else is dropped; wires missing from channel_map stay at zero
+
+    When the channels already arrive in order (0, 1, ..., 479) and dtype is None (or
+    equal to the raw dtype), no copy is made and both planes are views into adc_data.
+
+    Args:
+        adc_data: flat array of ADC counts, num_channels * num_ticks long
+        channel_map: channel number of each row of adc_data
+        dtype: storage type of the planes (float32 by default, int16 keeps raw counts,
+               None keeps whatever type adc_data has)
+        num_wires: wires per plane
+
+    Returns:
+        collection, induction: 2D numpy arrays (num_wires × time_ticks)
+    """
+    adc_data = np.asarray(adc_data)
+    channel_map = np.asarray(channel_map)
+
+    num_channels = len(channel_map)
+    if num_channels == 0:
+        raise ValueError("Event has no channel data")
+
+    num_ticks = len(adc_data) // num_channels
+    adc_data2d = adc_data[:num_channels * num_ticks].reshape((num_channels, num_ticks))
+
+    dtype = adc_data2d.dtype if dtype is None else np.dtype(dtype)
+
+    # Fast path: channels already sorted, planes are plain slices.
+    if num_channels == 2 * num_wires and np.array_equal(channel_map, np.arange(2 * num_wires)):
+        planes = adc_data2d if adc_data2d.dtype == dtype else adc_data2d.astype(dtype)
+        return planes[num_wires:], planes[:num_wires]
+
+    canvas = np.zeros((2 * num_wires, num_ticks), dtype=dtype)
+    valid = (channel_map >= 0) & (channel_map < 2 * num_wires)
+    canvas[channel_map[valid]] = adc_data2d[valid]
+
+    return canvas[num_wires:], canvas[:num_wires]
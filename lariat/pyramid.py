@@ -0,0 +1,72 @@
+import numpy as np
+
+
+# Tick-axis pooling factors of the cached levels: 3072 ticks -> 768, 384.
+PYRAMID_FACTORS = (4, 8)
+
+
+def max_pool(plane, factor, axis=1):
+    """
+    Max-pool a plane by factor along one axis (ticks by default).
+
+    Max rather than mean pooling keeps narrow, high-ADC hits visible at low resolution.
+    The last bin is shorter if the axis length is not a multiple of factor.
+    """
+    if factor == 1:
+        return plane
+    return np.maximum.reduceat(plane, np.arange(0, plane.shape[axis], factor), axis=axis)
+
+
+class PlanePyramid():
+    """
+    Full-resolution plane plus max-pooled copies along the tick axis.
+
+    The display draws the coarsest level that still has at least one tick bin per
+    screen pixel, so a 240 x 3072 plane is usually drawn from its 240 x 768 or
+    240 x 384 level. Levels are computed on first use and kept.
+
+    Example:
+        pyramid = PlanePyramid(event.collection)
+        image, factor = pyramid.view(num_pixels=600)
+        image, factor = pyramid.view(num_pixels=600, ticks=(1000, 1200))   # zoomed
+    """
+
+    def __init__(self, plane, factors=PYRAMID_FACTORS):
+
+        self.plane = plane
+        self.factors = tuple(sorted(factors))
+        self._levels = {1: plane}
+
+    @property
+    def shape(self):
+        return self.plane.shape
+
+    def level(self, factor):
+        """Plane pooled by factor along ticks (factor 1 is the plane itself)."""
+        if factor not in self._levels:
+            self._levels[factor] = max_pool(self.plane, factor)
+        return self._levels[factor]
+
+    def factor_for(self, num_ticks, num_pixels):
+        """Largest cached factor that keeps num_ticks at or above num_pixels bins (1 if none does)."""
+        fitting = [f for f in self.factors if num_ticks / f >= num_pixels]
+        return fitting[-1] if fitting else 1
+
+    def view(self, num_pixels, ticks=None):
+        """
+        Image to draw for a window num_pixels high showing the tick range ticks.
+
+        Args:
+            num_pixels: screen pixels available along the tick axis
+            ticks: (first, last) visible ticks, default the whole plane
+
+        Returns:
+            (image, factor): the wires x pooled-ticks crop covering ticks, and its factor;
+            tick t of the plane is bin t // factor of the image's level
+        """
+        first, last = (0, self.shape[1]) if ticks is None else ticks
+        first, last = max(int(first), 0), min(int(np.ceil(last)), self.shape[1])
+
+        factor = self.factor_for(last - first, num_pixels)
+        start, stop = first // factor, -(-last // factor)
+        return self.level(factor)[:, start:stop], factor
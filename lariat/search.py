@@ -0,0 +1,118 @@
+import uproot
+
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+
+from .index import pack_ids, unpack_ids
+from .loader import RAW_TREE, ID_BRANCHES
+
+
+MATCH_COLUMNS = ['run', 'subrun', 'event', 'file_path', 'filename', 'event_index_in_file']
+
+# Sorted, unique packed keys of the events being searched for. Set once per worker
+# process by init_worker, so the target list is not pickled with every task.
+_TARGET_KEYS = None
+
+
+def target_keys(run, subrun, event):
+    """Sorted, unique packed keys for a list of target events."""
+    return np.unique(pack_ids(run, subrun, event))
+
+
+def init_worker(keys):
+    """Pool initializer: store the target keys in the worker process."""
+    global _TARGET_KEYS
+    _TARGET_KEYS = keys
+
+
+def empty_matches():
+    """Match table with no rows."""
+    return pd.DataFrame({column: pd.Series(dtype=object if column in ('file_path', 'filename') else np.int64)
+                         for column in MATCH_COLUMNS})
+
+
+def match_file(file_path, keys=None, tree_name=RAW_TREE):
+    """
+    Find the entries of one ROOT file whose (run, subrun, event) is in the target list.
+    This function is designed to be run in a separate process.
+
+    The IDs of the file are packed into int64 keys and joined against the sorted target
+    keys with a single np.searchsorted, with no per-entry Python work.
+
+    Args:
+        file_path: ROOT file to search
+        keys: sorted unique packed target keys (defaults to the ones set by init_worker)
+
+    Returns:
+        DataFrame with run, subrun, event, file_path, filename, event_index_in_file
+    """
+    keys = _TARGET_KEYS if keys is None else keys
+    if keys is None:
+        raise ValueError("No target keys given and init_worker was not called")
+
+    file_path = Path(file_path)
+    try:
+        with uproot.open(file_path) as file:
+            if tree_name not in file:
+                return empty_matches()
+
+            ids = file[tree_name].arrays(ID_BRANCHES, library="np")
+
+        file_keys = pack_ids(ids["run"], ids["subrun"], ids["event"])
+
+    except Exception as e:
+        print(f"Warning: Could not process file {file_path.name}: {e}")
+        return empty_matches()
+
+    if len(keys) == 0:
+        return empty_matches()
+
+    positions = np.minimum(np.searchsorted(keys, file_keys), len(keys) - 1)
+    entries = np.flatnonzero(keys[positions] == file_keys)
+
+    run, subrun, event = unpack_ids(file_keys[entries])
+    return pd.DataFrame({
+        'run': run,
+        'subrun': subrun,
+        'event': event,
+        'file_path': str(file_path),
+        'filename': file_path.name,
+        'event_index_in_file': entries.astype(np.int64),
+    })
+
+
+def search_files(root_files, run, subrun, event, max_workers=None, tree_name=RAW_TREE):
+    """
+    Search ROOT files in parallel for a list of target events.
+
+    The target keys are handed to each worker once through the pool initializer.
+
+    Args:
+        root_files: iterable of ROOT file paths
+        run, subrun, event: equal-length arrays of target event IDs
+        max_workers: number of worker processes (default: None for auto)
+
+    Returns:
+        DataFrame of matches (see match_file), sorted by (run, subrun, event)
+    """
+    keys = target_keys(run, subrun, event)
+    root_files = list(root_files)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=(keys,)) as executor:
+        futures = [executor.submit(match_file, path, None, tree_name) for path in root_files]
+
+        for future in tqdm(as_completed(futures), total=len(root_files), desc="Searching Files"):
+            result = future.result()
+            if len(result):
+                results.append(result)
+
+    if not results:
+        return empty_matches()
+
+    matched = pd.concat(results, ignore_index=True)
+    return matched.sort_values(['run', 'subrun', 'event', 'file_path'], kind="stable").reset_index(drop=True)
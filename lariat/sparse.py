@@ -0,0 +1,267 @@
+import numpy as np
+import matplotlib.pyplot as plt
+
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from .labels import PlaneLabels
+
+
+class SparsePlane():
+    """
+    Zero-suppressed plane stored as coordinate + ADC arrays (COO, sorted wire-major).
+
+    Only pixels above the suppression threshold are kept, which after the usual >10 ADC
+    cut is a tiny fraction of a 240 x 3072 plane. Clustering (labelling()), bbox
+    extraction, per-wire maxima and plotting work on this form directly; to_dense()
+    (or np.asarray) rebuilds the full matrix when something needs it.
+
+    Attributes:
+        wires, ticks: coordinates of the kept pixels
+        adc: ADC value of each kept pixel
+        shape: (wires, ticks) of the dense plane
+        threshold: pixels with ADC <= threshold were dropped
+    """
+
+    def __init__(self, wires, ticks, adc, shape, threshold=0):
+
+        self.wires = np.asarray(wires, dtype=np.int64)
+        self.ticks = np.asarray(ticks, dtype=np.int64)
+        self.adc = np.asarray(adc)
+        self.shape = tuple(int(n) for n in shape)
+        self.threshold = threshold
+
+    @classmethod
+    def from_dense(cls, matrix, threshold=0):
+        """Keep the pixels of a dense plane with ADC > threshold."""
+        wires, ticks = np.nonzero(matrix > threshold)
+        return cls(wires, ticks, matrix[wires, ticks], matrix.shape, threshold)
+
+    def __len__(self):
+        return len(self.adc)
+
+    def __repr__(self):
+        return f"SparsePlane({len(self)} pixels of {self.shape}, ADC > {self.threshold})"
+
+    @property
+    def dtype(self):
+        return self.adc.dtype
+
+    @property
+    def nbytes(self):
+        return self.wires.nbytes + self.ticks.nbytes + self.adc.nbytes
+
+    def to_dense(self, dtype=None):
+        """Full (wires x ticks) matrix, dropped pixels set to 0."""
+        matrix = np.zeros(self.shape, dtype=self.adc.dtype if dtype is None else dtype)
+        matrix[self.wires, self.ticks] = self.adc
+        return matrix
+
+    def __array__(self, dtype=None, copy=None):
+        return self.to_dense(dtype)
+
+    def max(self):
+        return self.adc.max() if len(self.adc) else 0
+
+    def wire_maxes(self):
+        """Max ADC on every wire (0 for wires without kept pixels)."""
+        maxes = np.zeros(self.shape[0], dtype=self.adc.dtype)
+        np.maximum.at(maxes, self.wires, self.adc)
+        return maxes
+
+    def bbox(self):
+        """(min_wire, min_tick, max_wire + 1, max_tick + 1) of all kept pixels, None if empty."""
+        if len(self.adc) == 0:
+            return None
+        return (self.wires.min(), self.ticks.min(), self.wires.max() + 1, self.ticks.max() + 1)
+
+    def labelling(self, threshold=10, connectivity=8):
+        """Connected regions above threshold (see SparseLabels)."""
+        return SparseLabels(self, threshold, connectivity)
+
+    def argmax(self):
+        """(wire, tick) of the highest kept pixel."""
+        index = int(np.argmax(self.adc))
+        return int(self.wires[index]), int(self.ticks[index])
+
+    def grow(self, seeds, threshold, connectivity=8):
+        """
+        Seeded region growing on the pixel lists, as lariat.labels.grow_from_seeds.
+
+        The regions are labelled with sparse_components; only the returned labels image
+        is dense (regionprops needs it).
+
+        Returns:
+            grown: 2D int array, 0 for background and 1..num for the grown clusters in seed order
+            num: number of grown clusters
+        """
+        labelled = self.labelling(threshold, connectivity)
+
+        seeds = np.asarray(seeds, dtype=np.int64).reshape(-1, 2)
+        keys = labelled.wires * self.shape[1] + labelled.ticks
+        seed_keys = seeds[:, 0] * self.shape[1] + seeds[:, 1]
+        positions = np.minimum(np.searchsorted(keys, seed_keys), max(len(keys) - 1, 0))
+        hit = (keys[positions] == seed_keys) if len(keys) else np.zeros(len(seeds), dtype=bool)
+        seed_labels = labelled.pixel_labels[positions[hit]]
+
+        # Unique component labels, in the order their first seed appears.
+        _, first = np.unique(seed_labels, return_index=True)
+        kept = seed_labels[np.sort(first)]
+
+        lookup = np.zeros(labelled.num + 1, dtype=np.int64)
+        lookup[kept] = np.arange(1, len(kept) + 1)
+
+        grown = np.zeros(self.shape, dtype=np.int64)
+        grown[labelled.wires, labelled.ticks] = lookup[labelled.pixel_labels]
+        return grown, len(kept)
+
+    def plot(self, ax=None, title=None, cmap="viridis", s=1, alpha=1.0):
+        """Scatter the kept pixels (wire on x, tick on y) coloured by ADC."""
+        if ax is None:
+            _, ax = plt.subplots(figsize=(7, 4))
+
+        points = ax.scatter(self.wires, self.ticks, c=self.adc, cmap=cmap, s=s, marker="s", linewidths=0, alpha=alpha)
+        plt.colorbar(points, ax=ax, label='ADC Counts')
+        ax.set_xlim(0, self.shape[0])
+        ax.set_ylim(0, self.shape[1])
+        ax.set_xlabel("Wire Number")
+        ax.set_ylabel("Time Tick")
+        if title is not None:
+            ax.set_title(title)
+        return ax
+
+    def save(self, path):
+        """Write the plane to a compressed .npz file (see save_planes for many planes)."""
+        save_planes(path, [self])
+
+    @classmethod
+    def load(cls, path):
+        return load_planes(path)[0]
+
+
+def sparse_components(wires, ticks, shape, connectivity=8):
+    """
+    Connected components of a set of pixels, without building a dense image.
+
+    Pixels must be sorted wire-major (as np.nonzero returns them). Neighbours are found
+    by a searchsorted over the linear pixel keys and the components by
+    scipy.sparse.csgraph. Components are numbered by their first pixel in raster order,
+    which is the numbering skimage.measure.label gives the same mask.
+
+    Returns:
+        labels: label (1..num) of each pixel
+        num: number of components
+    """
+    num_pixels = len(wires)
+    if num_pixels == 0:
+        return np.zeros(0, dtype=np.int64), 0
+
+    keys = wires * shape[1] + ticks
+
+    # Forward neighbours only, the graph is undirected.
+    offsets = [(0, 1), (1, 0)]
+    if connectivity != 4:
+        offsets += [(1, -1), (1, 1)]
+
+    rows, cols = [], []
+    for dw, dt in offsets:
+        neighbour_wires, neighbour_ticks = wires + dw, ticks + dt
+        valid = (neighbour_wires < shape[0]) & (neighbour_ticks >= 0) & (neighbour_ticks < shape[1])
+        neighbour_keys = neighbour_wires * shape[1] + neighbour_ticks
+
+        positions = np.minimum(np.searchsorted(keys, neighbour_keys), num_pixels - 1)
+        hit = valid & (keys[positions] == neighbour_keys)
+        rows.append(np.flatnonzero(hit))
+        cols.append(positions[hit])
+
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(num_pixels, num_pixels))
+    num, components = connected_components(graph, directed=False)
+
+    # Renumber by first pixel in raster order.
+    _, first = np.unique(components, return_index=True)
+    rank = np.empty(num, dtype=np.int64)
+    rank[np.argsort(first)] = np.arange(1, num + 1)
+
+    return rank[components], num
+
+
+class SparseLabels(PlaneLabels):
+    """
+    PlaneLabels computed from a SparsePlane.
+
+    Same per-cluster attributes (num, area, adc_sum, adc_min, adc_max, bbox,
+    column_maxes) and the same label numbering as labelling the dense plane. The dense
+    labels image and matrix are only built if asked for (e.g. for regionprops).
+
+    Attributes:
+        pixel_labels: label of each plane pixel above threshold
+        wires, ticks, adc: those pixels
+    """
+
+    def __init__(self, plane, threshold=10, connectivity=8):
+
+        if np.min(threshold) < plane.threshold:
+            raise ValueError(f"Cannot label at threshold {np.min(threshold)}, plane was zero-suppressed at {plane.threshold}")
+
+        self.plane = plane
+        self.source = plane
+        self.threshold = threshold
+        self._regions = None
+        self._labels = None
+        self._matrix = None
+
+        # Scalar threshold, or a per-wire (wires, 1) column as for dense planes
+        keep = plane.adc > (threshold if np.ndim(threshold) == 0 else np.ravel(threshold)[plane.wires])
+        self.wires, self.ticks, self.adc = plane.wires[keep], plane.ticks[keep], plane.adc[keep]
+
+        self.pixel_labels, self.num = sparse_components(self.wires, self.ticks, plane.shape, connectivity)
+        self._reduce(self.pixel_labels, self.wires, self.ticks, self.adc, plane.shape[0])
+
+    @property
+    def matrix(self):
+        """Dense plane (built on first use)."""
+        if self._matrix is None:
+            self._matrix = self.plane.to_dense()
+        return self._matrix
+
+    @property
+    def labels(self):
+        """Dense labels image (built on first use)."""
+        if self._labels is None:
+            self._labels = np.zeros(self.plane.shape, dtype=np.int64)
+            self._labels[self.wires, self.ticks] = self.pixel_labels
+        return self._labels
+
+    def cluster(self, index):
+        """Sparse pixels (wires, ticks, adc) of one cluster, index is label - 1."""
+        selected = self.pixel_labels == index + 1
+        return self.wires[selected], self.ticks[selected], self.adc[selected]
+
+
+def save_planes(path, planes):
+    """
+    Write many sparse planes to one compressed .npz file.
+
+    Pixels of all planes are concatenated (wires as uint16, ticks as uint16, ADC in the
+    planes' dtype) with an offsets array marking where each plane starts.
+    """
+    offsets = np.concatenate([[0], np.cumsum([len(p) for p in planes])]).astype(np.int64)
+    np.savez_compressed(
+        path,
+        offsets=offsets,
+        wires=np.concatenate([p.wires for p in planes]).astype(np.uint16),
+        ticks=np.concatenate([p.ticks for p in planes]).astype(np.uint16),
+        adc=np.concatenate([p.adc for p in planes]),
+        shapes=np.array([p.shape for p in planes], dtype=np.int64).reshape(-1, 2),
+        thresholds=np.array([p.threshold for p in planes], dtype=np.float64),
+    )
+
+
+def load_planes(path):
+    """Read planes written by save_planes."""
+    with np.load(path) as data:
+        offsets = data['offsets']
+        wires, ticks, adc = data['wires'], data['ticks'], data['adc']
+        return [SparsePlane(wires[start:stop], ticks[start:stop], adc[start:stop], shape, threshold)
+                for start, stop, shape, threshold in zip(offsets[:-1], offsets[1:], data['shapes'], data['thresholds'])]
@@ -0,0 +1,202 @@
+import json
+import math
+import hashlib
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from pathlib import Path
+from torch.utils.data import Dataset, DataLoader
+
+
+FEAT_DIM = 128
+GLOBAL_MAX_ADC = 2342.0
+
+
+class DeutNet(nn.Module):
+    """Deep-SVDD feature network of the ssvd notebooks (weights in artifacts/svdd.pt)."""
+
+    def __init__(self, in_ch=1, feat_dim=FEAT_DIM):
+        super().__init__()
+        self.conv = nn.Sequential(
+            nn.Conv2d(in_ch, 16, 3, 2, 1), nn.ReLU(),
+            nn.Conv2d(16, 32, 3, 2, 1), nn.ReLU(),
+            nn.Conv2d(32, 64, 3, 2, 1), nn.ReLU()
+        )
+        self.fc = nn.Linear(64, feat_dim)
+
+    def forward(self, x):
+        x = self.conv(x)
+        x = F.adaptive_avg_pool2d(x, 1).flatten(1)
+        return self.fc(x)
+
+
+def load_artifacts(artifact_dir, device="cpu"):
+    """
+    Trained model, feature-space centre and metadata (threshold.json) from an artifacts directory.
+
+    Returns:
+        (model in eval mode, centre tensor, meta dict)
+    """
+    artifact_dir = Path(artifact_dir)
+    with open(artifact_dir / 'threshold.json') as f:
+        meta = json.load(f)
+
+    model = DeutNet(feat_dim=meta.get('feat_dim', FEAT_DIM)).to(device)
+    model.load_state_dict(torch.load(artifact_dir / 'svdd.pt', map_location=device))
+    model.eval()
+
+    centre = torch.from_numpy(np.load(artifact_dir / 'centre.npy')).float().to(device)
+    return model, centre, meta
+
+
+def artifacts_hash(artifact_dir):
+    """Hash of the weights and centre (not the threshold), used to key cached distances."""
+    digest = hashlib.sha1()
+    for name in ('svdd.pt', 'centre.npy'):
+        digest.update((Path(artifact_dir) / name).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+class TensorBatches(Dataset):
+    """
+    Contiguous batches of a lariat.tensors.TensorCache, one batch per item.
+
+    Each item is a slice of the memmap, so a worker reads one block of the file per
+    batch instead of assembling it from single samples.
+    """
+
+    def __init__(self, cache, batch_size=1024):
+        self.cache = cache
+        self.batch_size = batch_size
+
+    def __len__(self):
+        return math.ceil(len(self.cache) / self.batch_size)
+
+    def __getitem__(self, b):
+        start = b * self.batch_size
+        stop = min(start + self.batch_size, len(self.cache))
+        return torch.from_numpy(np.array(self.cache.array[start:stop])), start
+
+
+def iterate_distances(cache, model, centre, batch_size=1024, num_workers=4, device="cpu"):
+    """
+    SVDD distances of every tensor of a cache, batch by batch, in order.
+
+    Yields:
+        (start, distances): index of the first sample of the batch and a float32 array
+    """
+    loader = DataLoader(TensorBatches(cache, batch_size), batch_size=None, shuffle=False,
+                        num_workers=num_workers, persistent_workers=False)
+
+    with torch.no_grad():
+        for batch, start in loader:
+            batch = batch.to(device, non_blocking=True)
+            yield int(start), torch.norm(model(batch) - centre, dim=1).cpu().numpy().astype(np.float32)
+
+
+def extract_active_tiles(x, tile_h=15, tile_w=192, thresh=0.0):
+    """Tiles of a dense (B, C, H, W) batch whose sum of |x| is above thresh, and their frame index."""
+    B, C, H, W = x.shape
+    gy, gx = H // tile_h, W // tile_w
+    patches = F.unfold(x, kernel_size=(tile_h, tile_w), stride=(tile_h, tile_w))    # (B, C*th*tw, gy*gx)
+    tiles = patches.transpose(1, 2).contiguous().view(B, gy * gx, C, tile_h, tile_w)
+    mask = tiles.abs().sum(dim=(2, 3, 4)) > thresh
+    batch_ids, tile_ids = torch.nonzero(mask, as_tuple=True)
+    return tiles[batch_ids, tile_ids], batch_ids
+
+
+class TileSparseCNN(nn.Module):
+    """
+    Tile model of ssvd/sparse.ipynb: a small CNN per active tile, mean over each frame's tiles.
+
+    forward takes the dense (B, 2, 240, 3072) frames of the notebook; forward_packed
+    takes the non-empty tiles of lariat.tiles.PackedTiles (see collate_tiles) and
+    gives the same embedding without building the frames.
+    """
+
+    def __init__(self, in_ch=2, tile_feat=64, feat_dim=FEAT_DIM):
+        super().__init__()
+        self.tile_net = nn.Sequential(
+            nn.Conv2d(in_ch, 32, 3, stride=2, padding=1), nn.ReLU(inplace=True),
+            nn.Conv2d(32, 64, 3, stride=2, padding=1), nn.ReLU(inplace=True),
+            nn.AdaptiveAvgPool2d(1),
+        )
+        self.tile_head = nn.Linear(64, tile_feat)
+        self.frame_head = nn.Linear(tile_feat, feat_dim)
+
+    def _tile_features(self, tiles):
+        return self.tile_head(self.tile_net(tiles).flatten(1))
+
+    def forward(self, x):
+        tiles, batch_ids = extract_active_tiles(x)
+        return self.forward_packed(tiles, batch_ids, x.size(0))
+
+    def forward_packed(self, tiles, batch_ids, num_frames, background=None, num_background=None):
+        """
+        Embeddings from the active tiles of num_frames frames.
+
+        Args:
+            tiles: (N_act, C, th, tw) active tiles
+            batch_ids: (N_act) frame of each tile
+            background: (num_frames, C) constant value of each frame's remaining tiles
+                        (the z-score channel of an empty tile is -mean / std, not 0)
+            num_background: (num_frames) number of those tiles, counted in the mean
+        """
+        t = self._tile_features(tiles)
+        frame = torch.zeros(num_frames, t.size(1), device=t.device, dtype=t.dtype)
+        frame.index_add_(0, batch_ids, t)
+        counts = torch.bincount(batch_ids, minlength=num_frames).to(t.dtype)
+
+        if background is not None:
+            # One constant tile per frame stands in for all of its empty tiles
+            const = background[:, :, None, None].expand(-1, -1, *tiles.shape[2:]).contiguous()
+            num_background = num_background.to(t.dtype)
+            frame = frame + num_background[:, None] * self._tile_features(const)
+            counts = counts + num_background
+
+        return self.frame_head(frame / counts.clamp_min(1).unsqueeze(1))
+
+
+class PackedTileDataset(Dataset):
+    """
+    Clusters of a lariat.tiles.PackedTiles, one item per cluster, for collate_tiles.
+
+    Items are the cluster's raw tiles with its canvas mean / std; a DataLoader with
+    collate_fn=collate_tiles concatenates them into forward_packed inputs.
+    """
+
+    def __init__(self, packed):
+        self.packed = packed
+
+    def __len__(self):
+        return len(self.packed)
+
+    def __getitem__(self, i):
+        tiles, _, mean, std = self.packed.sample(i)
+        return np.asarray(tiles, dtype=np.float32), float(mean), float(std), self.packed.num_grid_tiles
+
+
+def collate_tiles(items, global_max_adc=GLOBAL_MAX_ADC):
+    """
+    (tiles, batch_ids, num_frames, background, num_background) for TileSparseCNN.forward_packed.
+
+    Tiles get the two channels of DeutTrain: ADC / global max and the canvas z-score.
+    """
+    counts = np.array([len(tiles) for tiles, _, _, _ in items], dtype=np.int64)
+    raw = np.concatenate([tiles for tiles, _, _, _ in items])
+    mean = np.array([mean for _, mean, _, _ in items], dtype=np.float32)
+    std = np.array([std for _, _, std, _ in items], dtype=np.float32)
+    grid = np.array([num for _, _, _, num in items], dtype=np.int64)
+
+    batch_ids = np.repeat(np.arange(len(items)), counts)
+    tiles = np.stack([raw / (global_max_adc + 1e-6),
+                      (raw - mean[batch_ids, None, None]) / std[batch_ids, None, None]], axis=1)
+    background = np.stack([np.zeros_like(mean), -mean / std], axis=1)
+    # (an all-zero canvas has no active tile at all, as in extract_active_tiles)
+    num_background = np.where(mean != 0, grid - counts, 0)
+
+    return (torch.from_numpy(tiles.astype(np.float32)), torch.from_numpy(batch_ids), len(items),
+            torch.from_numpy(background), torch.from_numpy(num_background))
@@ -0,0 +1,48 @@
+import pyarrow.dataset as ds
+
+
+# Beamline mass windows (MeV) used to preselect protons and deuterons.
+MASS_WINDOWS = {
+    'proton': (600, 1600),
+    'deuteron': (1600, 2750),
+}
+
+
+def mass_filter(window=None):
+    """
+    Dataset expression selecting events with a beamline mass.
+
+    Args:
+        window: None for beamline_mass > 0, a name from MASS_WINDOWS, or a (low, high)
+                pair; bounds are exclusive, as in the mass cut notebooks
+    """
+    mass = ds.field('beamline_mass')
+    if window is None:
+        return mass > 0
+    low, high = MASS_WINDOWS[window] if isinstance(window, str) else window
+    return (mass > low) & (mass < high)
+
+
+def read_events(path, columns=None, mass_window=None, filter=None, preselect=True):
+    """
+    Load (part of) an event table written by scripts/to_parquet.py.
+
+    Columns and filters are pushed down into the Parquet scan, and the table is sorted
+    by (run, subrun, event) with per-row-group statistics, so selecting a mass window
+    or a run range skips row groups instead of reading the whole table.
+
+    Args:
+        path: Parquet file or directory
+        columns: list of columns to read (default: all)
+        mass_window: see mass_filter ('proton', 'deuteron', or (low, high))
+        filter: extra pyarrow.dataset expression, e.g. ds.field('run') == 8557
+        preselect: apply beamline_mass > 0 (implied by any mass window)
+
+    Returns:
+        pyarrow.Table
+    """
+    expression = mass_filter(mass_window) if (preselect or mass_window is not None) else None
+    if filter is not None:
+        expression = filter if expression is None else expression & filter
+
+    return ds.dataset(path, format="parquet").to_table(columns=columns, filter=expression)
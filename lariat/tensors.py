@@ -0,0 +1,152 @@
+import json
+
+import numpy as np
+import xxhash
+
+from pathlib import Path
+
+from .dataset import ClusterDataset
+
+
+# Fixed network input size of the SVDD models (ssvd notebooks).
+IMG_H, IMG_W = 64, 96
+
+# Bump when the preprocessing changes, so cached tensors are rebuilt.
+PREPROCESS_VERSION = 1
+
+
+def to_fixed(img, height=IMG_H, width=IMG_W, out=None):
+    """
+    Top-left crop / zero pad of a cluster image to (height, width), as CandidateDS._to_fixed.
+
+    out: zero-filled (height, width) float32 array to write into (e.g. a row of a batch)
+    """
+    out = np.zeros((height, width), dtype=np.float32) if out is None else out
+    h0, w0 = min(img.shape[0], height), min(img.shape[1], width)
+    out[:h0, :w0] = img[:h0, :w0]
+    return out
+
+
+def standardize(batch):
+    """Per-image z-score of a (n, h, w) float32 batch, in place (std floored at 1e-6)."""
+    flat = batch.reshape(len(batch), -1)
+    mean = flat.mean(axis=1, keepdims=True)
+    std = np.maximum(flat.std(axis=1, keepdims=True), 1e-6)
+    flat -= mean
+    flat /= std
+    return batch
+
+
+def cluster_images(clusters):
+    """
+    Cluster images of a DataFrame as 2D float32 arrays.
+
+    image_intensity may hold 2D images (the ssvd pickles) or flat row-major buffers
+    with height / width columns (lariat.clustering output). A lariat.dataset.ClusterDataset
+    gives its memory-mapped images directly.
+    """
+    if isinstance(clusters, ClusterDataset):
+        return clusters.images()
+
+    images = clusters['image_intensity']
+    if 'height' in clusters.columns and 'width' in clusters.columns:
+        return [np.asarray(image, dtype=np.float32).reshape(h, w)
+                for image, h, w in zip(images, clusters['height'], clusters['width'])]
+    return [np.asarray(image, dtype=np.float32) for image in images]
+
+
+def content_hash(images, height=IMG_H, width=IMG_W):
+    """xxh3-128 of the images (shapes and pixels) and the preprocessing settings."""
+    digest = xxhash.xxh3_128(f"v{PREPROCESS_VERSION}:{height}x{width}:{len(images)}".encode())
+    for image in images:
+        digest.update(np.asarray(image.shape, dtype=np.int64).tobytes())
+        digest.update(np.ascontiguousarray(image, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+class TensorCache():
+    """
+    Preprocessed network inputs stored once as a memory-mapped (N, 1, IMG_H, IMG_W) float32 file.
+
+    The file is named by the content hash of the source images, so the same clusters
+    are only cropped and normalised the first time; later runs (for example after a
+    threshold change) map the existing file. Any number of DataLoader workers can open
+    the same file read-only without copying it.
+
+    Example:
+        cache = TensorCache.build(images, "cache/")
+        x = cache.array[1000:1256]      # (256, 1, 64, 96) view, read on demand
+    """
+
+    def __init__(self, path):
+
+        self.path = Path(path)
+        with open(self.path.with_suffix(".json")) as f:
+            self.meta = json.load(f)
+        self._array = None
+
+    def __len__(self):
+        return self.meta['num']
+
+    @property
+    def key(self):
+        return self.meta['key']
+
+    @property
+    def shape(self):
+        return (self.meta['num'], 1, self.meta['height'], self.meta['width'])
+
+    @property
+    def array(self):
+        """Read-only memmap of the tensors (opened lazily, so it is not pickled into workers)."""
+        if self._array is None and len(self) == 0:
+            self._array = np.zeros(self.shape, dtype=np.float32)
+        elif self._array is None:
+            self._array = np.memmap(self.path, dtype=np.float32, mode="r", shape=self.shape)
+        return self._array
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_array'] = None
+        return state
+
+    @classmethod
+    def build(cls, images, cache_dir, height=IMG_H, width=IMG_W, batch_size=4096, key=None, verbose=True):
+        """
+        Preprocess images into cache_dir/<content hash>.f32, or reuse the file if it exists.
+
+        Args:
+            images: list of 2D cluster images
+            key: precomputed content_hash (computed if not given)
+        """
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+        key = content_hash(images, height, width) if key is None else key
+        path = cache_dir / f"{key}.f32"
+        if path.exists() and path.with_suffix(".json").exists():
+            if verbose:
+                print(f"Using cached tensors {path}")
+            return cls(path)
+
+        num = len(images)
+        tmp_path = path.with_name(path.name + ".tmp")
+        # (one spare row so that an empty input still gives a valid file)
+        array = np.memmap(tmp_path, dtype=np.float32, mode="w+", shape=(max(num, 1), 1, height, width))
+
+        for start in range(0, num, batch_size):
+            stop = min(start + batch_size, num)
+            batch = np.zeros((stop - start, height, width), dtype=np.float32)
+            for i, image in enumerate(images[start:stop]):
+                to_fixed(image, height, width, out=batch[i])
+            array[start:stop, 0] = standardize(batch)
+
+        array.flush()
+        del array
+        tmp_path.replace(path)
+        with open(path.with_suffix(".json"), "w") as f:
+            json.dump({'key': key, 'num': num, 'height': height, 'width': width, 'version': PREPROCESS_VERSION}, f)
+
+        if verbose:
+            print(f"Preprocessed {num} clusters into {path}")
+        return cls(path)
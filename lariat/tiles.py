@@ -0,0 +1,135 @@
+import numpy as np
+
+from .planes import NUM_WIRES
+from .tensors import cluster_images
+
+
+# Tile grid of the sparse SVDD model (ssvd/sparse.ipynb): a 240 x 3072 plane in 16 x 16 tiles.
+NUM_TICKS = 3072
+TILE_H, TILE_W = 15, 192
+OCC_THRESH = 0.0
+
+
+class PackedTiles():
+    """
+    Non-empty tiles of many clusters placed on the full plane, without the plane.
+
+    ssvd/sparse.ipynb pads every cluster into a dense (240, 3072) canvas, z-scores it
+    and cuts it into TILE_H x TILE_W tiles on every __getitem__. Here each cluster is
+    placed on the tile grid once and only the tiles holding signal are kept:
+
+        tiles: (T, TILE_H, TILE_W) float32 raw ADC of the non-empty tiles, grouped by cluster
+        coords: (T, 2) tile (row, column) on the grid
+        offsets: (N + 1) start of each cluster's tiles
+        mean, std: (N) z-score parameters of each cluster's full canvas
+
+    Canvas statistics are computed from the cluster pixels (the rest of the canvas is
+    zero), so the normalised empty tiles are a constant -mean / std per cluster that
+    the model can account for without storing them.
+    """
+
+    def __init__(self, tiles, coords, offsets, mean, std, grid=(NUM_WIRES // TILE_H, NUM_TICKS // TILE_W)):
+
+        self.tiles = tiles
+        self.coords = coords
+        self.offsets = offsets
+        self.mean = mean
+        self.std = std
+        self.grid = tuple(int(n) for n in grid)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __repr__(self):
+        return f"PackedTiles({len(self)} clusters, {len(self.tiles)} of {len(self) * self.num_grid_tiles} tiles kept)"
+
+    @property
+    def tile_shape(self):
+        return self.tiles.shape[1:]
+
+    @property
+    def num_grid_tiles(self):
+        return self.grid[0] * self.grid[1]
+
+    def num_tiles(self):
+        """Non-empty tiles of every cluster."""
+        return np.diff(self.offsets)
+
+    def sample(self, i):
+        """(tiles, coords, mean, std) of cluster i (views into the packed arrays)."""
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        return self.tiles[start:stop], self.coords[start:stop], self.mean[i], self.std[i]
+
+    def dense(self, i):
+        """Full (grid * tile) raw canvas of cluster i, for checks and plots."""
+        tile_h, tile_w = self.tile_shape
+        canvas = np.zeros((self.grid[0] * tile_h, self.grid[1] * tile_w), dtype=np.float32)
+        tiles, coords, _, _ = self.sample(i)
+        for tile, (row, col) in zip(tiles, coords):
+            canvas[row * tile_h:(row + 1) * tile_h, col * tile_w:(col + 1) * tile_w] = tile
+        return canvas
+
+    @classmethod
+    def from_clusters(cls, clusters, tile_h=TILE_H, tile_w=TILE_W, occ_thresh=OCC_THRESH,
+                      global_max_adc=1.0, plane_shape=(NUM_WIRES, NUM_TICKS)):
+        """
+        Pack a cluster DataFrame or ClusterDataset (image_intensity and bbox_min_row / bbox_min_col).
+
+        Args:
+            occ_thresh: a tile is kept if the sum of |ADC| / global_max_adc over it is
+                        above this (the notebook's occupancy on the ADC channel)
+        """
+        images = cluster_images(clusters)
+        rows = np.asarray(clusters['bbox_min_row'], dtype=np.int64)
+        cols = np.asarray(clusters['bbox_min_col'], dtype=np.int64)
+        height, width = plane_shape
+        grid = (height // tile_h, width // tile_w)
+
+        tiles, coords, counts = [], [], []
+        mean = np.zeros(len(images), dtype=np.float32)
+        std = np.zeros(len(images), dtype=np.float32)
+
+        for i, (image, row0, col0) in enumerate(zip(images, rows, cols)):
+            # Part of the image inside the plane (pad_image crops the same way)
+            r0, c0 = max(row0, 0), max(col0, 0)
+            r1, c1 = min(row0 + image.shape[0], grid[0] * tile_h), min(col0 + image.shape[1], grid[1] * tile_w)
+            image = image[r0 - row0:r1 - row0, c0 - col0:c1 - col0] if r0 < r1 and c0 < c1 else np.zeros((0, 0), np.float32)
+
+            # Canvas z-score from the pixels alone: everything else is zero
+            size = height * width
+            total, squares = float(image.sum(dtype=np.float64)), float((image.astype(np.float64)**2).sum())
+            mean[i] = total / size
+            std[i] = max(np.sqrt(max(squares / size - (total / size)**2, 0)), 1e-6)
+
+            if image.size == 0:
+                counts.append(0)
+                continue
+
+            # Local canvas covering the tiles the image touches
+            tr0, tc0 = r0 // tile_h, c0 // tile_w
+            tr1, tc1 = -(-r1 // tile_h), -(-c1 // tile_w)
+            local = np.zeros(((tr1 - tr0) * tile_h, (tc1 - tc0) * tile_w), dtype=np.float32)
+            local[r0 - tr0 * tile_h:r1 - tr0 * tile_h, c0 - tc0 * tile_w:c1 - tc0 * tile_w] = image
+
+            blocks = local.reshape(tr1 - tr0, tile_h, tc1 - tc0, tile_w).transpose(0, 2, 1, 3)
+            occupied = np.abs(blocks).sum(axis=(2, 3)) / global_max_adc > occ_thresh
+            tile_rows, tile_cols = np.nonzero(occupied)
+
+            tiles.append(blocks[tile_rows, tile_cols])
+            coords.append(np.stack([tile_rows + tr0, tile_cols + tc0], axis=1))
+            counts.append(len(tile_rows))
+
+        tiles = np.concatenate(tiles) if tiles else np.zeros((0, tile_h, tile_w), dtype=np.float32)
+        coords = np.concatenate(coords).astype(np.int16) if coords else np.zeros((0, 2), dtype=np.int16)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(tiles, coords, offsets, mean, std, grid)
+
+    def save(self, path):
+        """Write the packed tiles to an .npz file (uncompressed, so np.load(mmap_mode='r') works)."""
+        np.savez(path, tiles=self.tiles, coords=self.coords, offsets=self.offsets,
+                 mean=self.mean, std=self.std, grid=np.array(self.grid))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['tiles'], data['coords'], data['offsets'], data['mean'], data['std'], data['grid'])
@@ -1,34 +1,26 @@
 # search_worker.py
 
-import uproot
+import sys
+import numpy as np
+from pathlib import Path
 
-def process_single_file(file_path, target_events_set):
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from lariat.search import match_file, target_keys
+
+def process_single_file(file_path, target_events=None):
     """
     Processes a single ROOT file to find matching events.
     This function is designed to be run in a separate process.
-    """
 
-    try:
-        with uproot.open(file_path) as file:
-            if "ana/raw" not in file:
-                return []
+    target_events can be a set of (run, subrun, event) tuples, an array of packed keys
+    from lariat.search.target_keys, or None if the pool was started with
+    initializer=init_worker, initargs=(keys,) so the targets are sent to each worker once.
+
+    Matching is vectorised (see lariat.search.match_file, which returns the matches as
+    a DataFrame); this wrapper returns them as a list of dicts.
+    """
+    if isinstance(target_events, (set, frozenset, list, tuple)):
+        ids = np.array(list(target_events), dtype=np.int64).reshape(-1, 3)
+        target_events = target_keys(ids[:, 0], ids[:, 1], ids[:, 2])
 
-            tree = file["ana/raw"]
-            events_in_file = tree.arrays(["run", "subrun", "event"], library="ak")
-            
-            found_matches = []
-            for idx, event_id in enumerate(zip(events_in_file.run, events_in_file.subrun, events_in_file.event)):
-                if event_id in target_events_set:
-                    found_matches.append({
-                        'run': event_id[0],
-                        'subrun': event_id[1],
-                        'event': event_id[2],
-                        'file_path': str(file_path),
-                        'filename': file_path.name,
-                        'event_index_in_file': idx,
-                    })
-            return found_matches
-        
-    except Exception as e:
-        print(f"Warning: Could not process file {file_path.name}: {e}")
-        return []
\ No newline at end of file
+    return match_file(file_path, target_events).to_dict('records')
\ No newline at end of file
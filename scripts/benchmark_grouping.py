@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark the CPU track grouping against the existing grouped_data.parquet.
+
+Times lariat.grouping.group_tracks (in memory and with spilling) and, if a reference
+file produced by the current pipeline is given, checks that the output has the same
+tracks and values and whether the files are byte-identical.
+
+Usage:
+    python benchmark_grouping.py <run.csv> [--reference grouped_data.parquet] [--memory-limit 256MB]
+"""
+
+import argparse
+import hashlib
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from lariat.grouping import GROUP_KEYS, group_tracks
+
+
+def file_digest(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def same_content(a, b):
+    """True if two grouped frames hold the same tracks, regardless of row order."""
+    if list(a.columns) != list(b.columns) or len(a) != len(b):
+        return False
+    a = pa.Table.from_pandas(a.sort_values(GROUP_KEYS, kind="stable"), preserve_index=False)
+    b = pa.Table.from_pandas(b.sort_values(GROUP_KEYS, kind="stable"), preserve_index=False)
+    return a.equals(b.cast(a.schema))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CPU track grouping")
+    parser.add_argument("csv", help="Per-hit run CSV")
+    parser.add_argument("--reference", default=None, help="grouped_data.parquet written by the current pipeline")
+    parser.add_argument("--memory-limit", default="256MB", help="Memory budget of the spilling run (default: 256MB)")
+    parser.add_argument("--chunk-size", type=int, default=500_000, help="CSV rows read at a time")
+
+    args = parser.parse_args()
+    size = Path(args.csv).stat().st_size
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for name, kwargs in (("in memory", {'num_partitions': 1}),
+                             (f"spilling ({args.memory_limit})", {'memory_limit': args.memory_limit})):
+            output = Path(tmp) / f"{len(results)}.parquet"
+            start = time.perf_counter()
+            grouped = group_tracks(args.csv, output, chunk_size=args.chunk_size, verbose=False, **kwargs)
+            elapsed = time.perf_counter() - start
+            results[name] = (grouped, output)
+            print(f"{name:>24}: {elapsed:7.2f} s, {size / elapsed / 1024**2:8.1f} MB/s, {len(grouped):,} tracks")
+
+        (memory, memory_path), (spilled, spilled_path) = results.values()
+        print(f"Spilling output identical to in-memory output: {file_digest(memory_path) == file_digest(spilled_path)}")
+
+        if args.reference is not None:
+            reference = pd.read_parquet(args.reference)
+            print(f"Same tracks and values as {args.reference}: {same_content(memory, reference)}")
+            print(f"Byte-identical to {args.reference}: {file_digest(memory_path) == file_digest(args.reference)}")
+
+
+if __name__ == "__main__":
+    main()
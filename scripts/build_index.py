@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Build or refresh a persistent (run, subrun, event) -> (file, entry) index.
+
+Only files whose size or mtime changed since the last build are re-read, so
+re-running over an unchanged directory does not open any ROOT file.
+
+Usage:
+    python build_index.py <root_files_dir> <index_file> [--pattern "*.root"] [--processes N]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from lariat.index import EventIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or refresh a (run, subrun, event) -> (file, entry) index")
+    parser.add_argument("directory", help="Directory containing ROOT files")
+    parser.add_argument("index", help="Index file to create or update (.npz)")
+    parser.add_argument("--pattern", default="*.root", help="File pattern to match (default: *.root)")
+    parser.add_argument("--processes", type=int, default=None, help="Number of processes to use")
+
+    args = parser.parse_args()
+
+    try:
+        index = EventIndex.build(args.directory, args.index, pattern=args.pattern, num_processes=args.processes)
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(index)
+    failed = index.files[index.files['error'] != '']
+    for row in failed.itertuples(index=False):
+        print(f"Warning: {Path(row.file_path).name}: {row.error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Headless clustering stage.
+
+Runs connected-region clustering over every event of a candidate list on a process
+pool and writes one row per cluster to a hive-partitioned Parquet dataset
+(output_dir/particle_type=<type>/<file>.parquet). Cluster images and per-wire maxima
+are stored as list columns (flat values + offsets). Re-running skips events that are
+already in the output.
+
+Usage:
+    python cluster_events.py <candidates.csv> <output_dir> [--threshold 15] [--workers N]
+
+The CSV needs 'file_path' and 'event_index' columns ('event_index_in_file' is accepted
+too); an optional 'particle_type' column selects the partition.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from lariat.clustering import run_clustering
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster candidate events and write the clusters to Parquet")
+    parser.add_argument("candidates", help="CSV with file_path, event_index (and optionally particle_type) columns")
+    parser.add_argument("output_dir", help="Output directory of the Parquet dataset")
+    parser.add_argument("--threshold", type=int, default=15, help="Collection plane ADC threshold (default: 15)")
+    parser.add_argument("--induction-threshold", type=int, default=None, help="Induction plane ADC threshold (default: threshold // 2)")
+    parser.add_argument("--particle-type", default=None, help="Partition label if the CSV has no particle_type column")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+
+    args = parser.parse_args()
+
+    if not Path(args.candidates).exists():
+        print(f"Error: CSV file not found: {args.candidates}")
+        sys.exit(1)
+
+    summary = run_clustering(
+        args.candidates,
+        args.output_dir,
+        threshold=args.threshold,
+        induction_threshold=args.induction_threshold,
+        max_workers=args.workers,
+        particle_type=args.particle_type,
+    )
+
+    print(f"\nProcessed {summary['processed_events']} new events from {summary['files']} files")
+    if summary['errors']:
+        print(f"{len(summary['errors'])} files failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
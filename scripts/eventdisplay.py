@@ -1,48 +1,65 @@
 import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import tkinter as tk
 from tkinter import messagebox, Button, Label, Entry, filedialog, StringVar, Radiobutton
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 from matplotlib.figure import Figure
 import uproot
-import awkward as ak
+import sys
+from collections import OrderedDict
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from lariat.loader import RawLoader
+from lariat.planes import build_planes
+from lariat.pyramid import PlanePyramid
 
 class Evd_display():
     """
     Variables available in the RAW file, created using "RawDigitExtractor" (Alek's):
     run, subrun, event, evttime, efield, lifetime, t0, 
     raw_samples, raw_pedestal, raw_sigma, raw_rawadc, and raw_channel.
+
+    Events are read lazily by entry through a RawLoader; the last few selected events
+    are kept with their plane pyramids so going back and forth does not re-read them.
     """
-    def __init__(self):
-        self.all_events_df = None
+    def __init__(self, max_cached_events=16):
+        self.loader = None
+        self.num_events = 0
         self.induction_plane = None
         self.collection_plane = None
+        self.induction_pyramid = None
+        self.collection_pyramid = None
         self.loaded_file = ""
+        self.max_cached_events = max_cached_events
+        self._events = OrderedDict()   # entry -> (event_info, collection pyramid, induction pyramid)
 
     def load_all_events_from_root(self, file_path):
         """
-        Loads data for ALL events, including the crucial 'raw_channel' branch and event identifiers.
+        Opens a file for browsing. Only the event count is read here, the events
+        themselves are read when selected.
         """
         try:
             self.loaded_file = file_path.split('/')[-1]
-            root_file = uproot.open(file_path)
             tree_name = "ana/raw"
-            if tree_name not in root_file:
-                messagebox.showerror("Error", f"TTree '{tree_name}' not found.")
-                return False
-            tree = root_file[tree_name]
-            
-            branches_to_load = ["run", "subrun", "event", "raw_rawadc", "raw_channel"]
-            self.all_events_df = tree.arrays(branches_to_load, library="pd")
-            
-            if self.all_events_df.empty:
-                 self.all_events_df = None
+            with uproot.open(file_path) as root_file:
+                if tree_name not in root_file:
+                    messagebox.showerror("Error", f"TTree '{tree_name}' not found.")
+                    return False
+
+            if self.loader is not None:
+                self.loader.close()
+            self.loader = RawLoader(file_path, tree_name=tree_name)
+            self._events.clear()
+            self.num_events = self.loader.num_entries()
+
+            if self.num_events == 0:
+                 self.loader = None
                  return False
             return True
         except Exception as e:
-            self.all_events_df = None
+            self.loader = None
             messagebox.showerror("Error", f"Failed to load .root file: {e}")
             return False
 
@@ -51,47 +68,72 @@ class Evd_display():
         Selects an event and correctly maps ADC data to the two planes
         using the 'raw_channel' branch. Returns event info for display.
         """
-        if self.all_events_df is None: return False, None
+        if self.loader is None: return False, None
         try:
-            event_data = self.all_events_df.iloc[event_index]
-            
-            # Get event identifiers
-            run = event_data["run"]
-            subrun = event_data["subrun"] 
-            event = event_data["event"]
-            event_info = {"run": run, "subrun": subrun, "event": event}
-            
-            adc_data = ak.to_numpy(event_data["raw_rawadc"])
-            channel_map = ak.to_numpy(event_data["raw_channel"])
-
-            total_wires = 480
-            num_ticks = adc_data.size // total_wires
-
-            # Reshape the ADC data assuming the order matches the channel map
-            adc_data_2d = adc_data.reshape((total_wires, num_ticks))
-
-            # Create empty arrays to hold the correctly sorted plane data
-            self.induction_plane = np.zeros((240, num_ticks))
-            self.collection_plane = np.zeros((240, num_ticks))
-
-            # Loop through the channel map to sort the data
-            for i, channel_num in enumerate(channel_map):
-                wire_data = adc_data_2d[i, :]
-                if 0 <= channel_num < 240:
-                    # It's an Induction wire
-                    wire_index = channel_num
-                    self.induction_plane[wire_index, :] = wire_data
-                elif 240 <= channel_num < 480:
-                    # It's a Collection wire
-                    wire_index = channel_num - 240
-                    self.collection_plane[wire_index, :] = wire_data
-            
+            if event_index in self._events:
+                self._events.move_to_end(event_index)
+            else:
+                if not 0 <= event_index < self.num_events:
+                    raise IndexError(f"file has {self.num_events} events")
+                event_data = self.loader.read(event_index)
+
+                # Get event identifiers
+                event_info = {"run": event_data["run"], "subrun": event_data["subrun"], "event": event_data["event"]}
+
+                # Scatter the wires onto the two planes in one pass (channels 0-239 induction, 240-479 collection)
+                collection, induction = build_planes(event_data["raw_rawadc"], event_data["raw_channel"])
+
+                self._events[event_index] = (event_info, PlanePyramid(collection), PlanePyramid(induction))
+                while len(self._events) > self.max_cached_events:
+                    self._events.popitem(last=False)
+
+            event_info, self.collection_pyramid, self.induction_pyramid = self._events[event_index]
+            self.collection_plane = self.collection_pyramid.plane
+            self.induction_plane = self.induction_pyramid.plane
+
             return True, event_info
         except Exception as e:
             messagebox.showerror("Error", f"Failed to process event {event_index}: {e}")
             return False, None
 
 
+class PyramidImage():
+    """
+    imshow of a PlanePyramid that redraws from the level matching the visible tick range.
+
+    The whole plane is drawn from a max-pooled level about as tall as the axes; zooming
+    in (toolbar) swaps in a finer level, down to full resolution, cropped to the view.
+    """
+    def __init__(self, ax, pyramid, cmap="viridis"):
+        self.ax = ax
+        self.pyramid = pyramid
+        num_wires, num_ticks = pyramid.shape
+
+        image, factor = pyramid.view(self._num_pixels())
+        self.image = ax.imshow(image.T, cmap=cmap, origin="lower", aspect="auto", interpolation="nearest",
+                               vmin=pyramid.plane.min(), vmax=pyramid.plane.max(),
+                               extent=self._extent(0, image.shape[1], factor))
+        ax.set_xlim(0, num_wires)
+        ax.set_ylim(0, num_ticks)
+        ax.set_autoscale_on(False)
+        ax.callbacks.connect("ylim_changed", self.update)
+        ax.figure.canvas.mpl_connect("resize_event", self.update)
+
+    def _num_pixels(self):
+        return max(int(self.ax.bbox.height), 1)
+
+    def _extent(self, start, stop, factor):
+        num_wires, num_ticks = self.pyramid.shape
+        return (0, num_wires, start * factor, min(stop * factor, num_ticks))
+
+    def update(self, ax=None):
+        first, last = sorted(self.ax.get_ylim())
+        image, factor = self.pyramid.view(self._num_pixels(), ticks=(first, last))
+        start = max(int(first), 0) // factor
+        self.image.set_data(image.T)
+        self.image.set_extent(self._extent(start, start + image.shape[1], factor))
+
+
 class myGUI():
     def __init__(self, root):
         self.root = root
@@ -120,12 +162,12 @@ class myGUI():
         self.status_var.set("Loading...")
         self.root.update_idletasks()
         if self.ev_dis.load_all_events_from_root(filename):
-            self.status_var.set(f"Loaded {len(self.ev_dis.all_events_df)} events from {self.ev_dis.loaded_file.split('/')[-1]}")
+            self.status_var.set(f"Loaded {self.ev_dis.num_events} events from {self.ev_dis.loaded_file.split('/')[-1]}")
         else:
             self.status_var.set("Failed to load file.")
 
     def _prepare_display(self):
-        if self.ev_dis.all_events_df is None:
+        if self.ev_dis.loader is None:
             messagebox.showerror("Error", "No file loaded.")
             return None, None
         try:
@@ -159,12 +201,16 @@ class myGUI():
         heatmap_win.title(window_title)
         fig = Figure(figsize=(12, 7))
         ax = fig.add_subplot(111)
-        sns.heatmap(plane_to_display.T, cmap="viridis", ax=ax, cbar=True)
-        ax.invert_yaxis()
+        canvas = FigureCanvasTkAgg(fig, master=heatmap_win)
+
+        # Drawn from the max-pooled level matching the window, full resolution only when zoomed in
+        pyramid = self.ev_dis.collection_pyramid if plane_name == "Collection" else self.ev_dis.induction_pyramid
+        heatmap_win.image = PyramidImage(ax, pyramid)
+        fig.colorbar(heatmap_win.image.image, ax=ax)
         ax.set_xlabel("Wire (0-239)")
         ax.set_ylabel("Tick")
         ax.set_title(title)
-        canvas = FigureCanvasTkAgg(fig, master=heatmap_win)
+        NavigationToolbar2Tk(canvas, heatmap_win).update()
         canvas.draw()
         canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
 
@@ -1,35 +1,58 @@
-from dask.diagnostics import ProgressBar
-import dask_cudf
+"""
+Group the per-hit run CSV into one row per track and write grouped_data.parquet.
+
+The default CPU backend (lariat.grouping.group_tracks) streams the CSV in chunks and
+spills hash partitions to disk to stay under --memory-limit. The original dask_cudf
+pipeline is kept as --backend gpu for machines with a CUDA GPU.
+
+Usage:
+    python group_particles.py [run.csv] [grouped_data.parquet] [--backend cpu|gpu] [--memory-limit 4GB]
+"""
+
+import argparse
 import gc
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from lariat.grouping import GROUP_KEYS, AGGREGATIONS, group_tracks
+
+
+def group_gpu(dataset_path, output_parquet):
+    from dask.diagnostics import ProgressBar
+    import dask_cudf
+    import rmm
+
+    ProgressBar().register()
+
+    ddf = dask_cudf.read_csv(dataset_path)
+
+    ddf.columns = ddf.columns.str.strip()
+
+    grouped_ddf = ddf.groupby(GROUP_KEYS).agg(AGGREGATIONS).reset_index()
+
+    gc.collect()
+    rmm.reinitialize()
+
+    df_cpu = grouped_ddf.compute().to_pandas()
+
+    df_cpu.to_parquet(output_parquet, engine="pyarrow")
+    return df_cpu
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Group the per-hit run CSV into one row per track")
+    parser.add_argument("dataset", nargs="?", default="run.csv", help="Input CSV (default: run.csv)")
+    parser.add_argument("output", nargs="?", default="grouped_data.parquet", help="Output Parquet (default: grouped_data.parquet)")
+    parser.add_argument("--backend", default="cpu", choices=["cpu", "gpu"], help="cpu (default) or the dask_cudf gpu pipeline")
+    parser.add_argument("--memory-limit", default="4GB", help="Approximate memory budget of the cpu backend (default: 4GB)")
+    parser.add_argument("--chunk-size", type=int, default=500_000, help="CSV rows read at a time by the cpu backend")
+    parser.add_argument("--spill-dir", default=None, help="Directory for spilled partitions (default: system temp)")
+
+    args = parser.parse_args()
 
-ProgressBar().register()
-
-dataset_path = "run.csv"
-ddf = dask_cudf.read_csv(dataset_path)
-
-ddf.columns = ddf.columns.str.strip()
-
-grouped_ddf = ddf.groupby(["beamline_mass", "wctrkmomentum", "tof", "trklength", "trkendx", "trkendy", "trkendz", "ntrkcalopts"]).agg({
-    "run": "first",
-    "subrun": "first",
-    "eventtype": "first",
-    "incint": "list",
-    "negativeke": "first",
-    "positionxtpc": "list",
-    "positionytpc": "list",
-    "positionztpc": "list",
-    "decayatrest": "first",
-    "residualrange": "list",
-    "trkdedx": "list",
-    "nslice": "list",
-    "cke": "list",
-}).reset_index()
-
-import rmm
-gc.collect()
-rmm.reinitialize()
-
-df_cpu = grouped_ddf.compute().to_pandas()
-
-output_parquet = "grouped_data.parquet"
-df_cpu.to_parquet(output_parquet, engine="pyarrow")
\ No newline at end of file
+    if args.backend == "gpu":
+        group_gpu(args.dataset, args.output)
+    else:
+        group_tracks(args.dataset, args.output, memory_limit=args.memory_limit,
+                     chunk_size=args.chunk_size, spill_dir=args.spill_dir)
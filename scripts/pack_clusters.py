@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Convert pickled cluster DataFrames (allclusters.pkl, deuteron_candidates_clean.pkl, ...)
+into lariat.dataset.ClusterDataset directories.
+
+Each input is converted once into <name>.clusters next to it (or into --out-dir);
+image_intensity, column_maxes and any other list / array columns become flat float32
+files with offsets and shapes, the scalar columns a Parquet table.
+
+Usage:
+    python pack_clusters.py <clusters.pkl | clusters.parquet> [...] [--out-dir DIR] [--chunk-size 10000] [--overwrite]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from lariat.dataset import ClusterDataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert cluster DataFrames into memory-mapped cluster datasets")
+    parser.add_argument("inputs", nargs="+", help="Pickled DataFrames or Parquet files")
+    parser.add_argument("--out-dir", default=None, help="Output directory (default: next to each input)")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="Rows converted at once (default: 10000)")
+    parser.add_argument("--overwrite", action="store_true", help="Replace existing datasets")
+
+    args = parser.parse_args()
+
+    for input_path in map(Path, args.inputs):
+        out_dir = input_path.parent if args.out_dir is None else Path(args.out_dir)
+        out_path = out_dir / (input_path.stem + ".clusters")
+        if out_path.exists() and not args.overwrite:
+            print(f"Skipping {input_path}: {out_path} exists (use --overwrite)")
+            continue
+
+        print('Loading clusters:', input_path)
+        df = pd.read_pickle(input_path) if input_path.suffix == ".pkl" else pd.read_parquet(input_path)
+        ds = ClusterDataset.write(df.reset_index(drop=True), out_path, chunk_size=args.chunk_size, overwrite=args.overwrite)
+        print(ds)
+        del df
+
+
+if __name__ == "__main__":
+    main()
@@ -1,52 +1,276 @@
+"""
+Organize ROOT files created by RawDigitExtractor under run_subrun_event.root names.
+
+Files are inspected in parallel (first entry only, plus an xxhash of the content) and
+placed in the destination by reflink, hard link or copy. Files whose content is already
+in the destination are recorded as duplicates instead of getting _1, _2 copies; only
+genuinely different files with the same first event get a numbered name. Every source
+is recorded in a mapping manifest (rename_manifest.csv in the destination), so a rerun
+skips the sources that did not change; a changed source replaces the file it placed
+before (or has it removed if it now maps elsewhere), so no stale files are left behind.
+
+Usage:
+    python rename_raw.py <source_folder> <dest_folder> [--mode auto|reflink|hardlink|copy] [--workers N]
+"""
+
 import uproot
 import shutil
 import os
+import re
+import fcntl
+import xxhash
+import pandas as pd
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from tqdm import tqdm
+
+MANIFEST_NAME = "rename_manifest.csv"
+MANIFEST_COLUMNS = ['source_path', 'source_size', 'source_mtime', 'content_hash',
+                    'run', 'subrun', 'event', 'dest_name', 'status', 'error']
+
+# Linux ioctl that clones a file's extents (btrfs, XFS, ...).
+FICLONE = 0x40049409
+
+# Statuses of a source placed with place_file
+PLACE_METHODS = ('reflink', 'hardlink', 'copy')
+
+
+def content_hash(file_path, chunk_size=8 * 1024**2):
+    """xxh3 128-bit hex digest of a file's content."""
+    digest = xxhash.xxh3_128()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def inspect_file(root_file):
+    """
+    Read the (run, subrun, event) of the first entry and hash the file.
+    This function is designed to be run in a separate process.
+    """
+    stat = os.stat(root_file)
+    row = {
+        'source_path': str(root_file),
+        'source_size': stat.st_size,
+        'source_mtime': stat.st_mtime_ns,
+        'content_hash': '',
+        'run': -1, 'subrun': -1, 'event': -1,
+        'dest_name': '',
+        'status': 'error',
+        'error': '',
+    }
+    try:
+        # Open ROOT file and read only the first entry of the "raw" tree
+        with uproot.open(root_file) as file:
+            ids = file["ana/raw"].arrays(["run", "subrun", "event"], entry_stop=1, library="np")
+        if len(ids["run"]) == 0:
+            raise ValueError("ana/raw tree is empty")
+        row['run'], row['subrun'], row['event'] = (int(ids[name][0]) for name in ("run", "subrun", "event"))
+        row['content_hash'] = content_hash(root_file)
+    except Exception as e:
+        row['error'] = str(e)
+    return row
+
 
-def process_raw_digit_files(source_folder, dest_folder):
+def reflink(source, dest):
+    """Copy-on-write clone of source to dest (raises OSError where unsupported)."""
+    with open(source, "rb") as src, open(dest, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.unlink(dest)
+            raise
+    shutil.copystat(source, dest)
+
+
+def place_file(source, dest, mode="auto"):
+    """
+    Create dest with the content of source.
+
+    Args:
+        mode: 'reflink', 'hardlink', 'copy', or 'auto' (reflink, else hard link, else copy)
+
+    Returns:
+        the method used
+    """
+    methods = {'reflink': reflink, 'hardlink': os.link, 'copy': shutil.copy2}
+    order = list(PLACE_METHODS) if mode == "auto" else [mode]
+
+    for i, method in enumerate(order):
+        try:
+            methods[method](source, dest)
+            return method
+        except OSError:
+            if i == len(order) - 1:
+                raise
+
+
+def is_named_for(dest_name, base):
+    """dest_name is base.root or base_<n>.root."""
+    return re.fullmatch(re.escape(base) + r"(_\d+)?\.root", dest_name) is not None
+
+
+def load_manifest(path):
+    """Rows of a rename manifest (empty DataFrame if there is none yet)."""
+    if not Path(path).exists():
+        return pd.DataFrame(columns=MANIFEST_COLUMNS)
+    return pd.read_csv(path, dtype={'source_path': str, 'content_hash': str, 'dest_name': str,
+                                    'status': str, 'error': str}, keep_default_na=False)
+
+
+def process_raw_digit_files(source_folder, dest_folder, mode="auto", max_workers=None):
     """
     Process ROOT files created by RawDigitExtractor
     Tree name: "ana/raw"
     Variables: "run", "subrun", "event"
+
+    Args:
+        source_folder: folder with the extracted *.root files
+        dest_folder: folder receiving run_subrun_event.root files and the manifest
+        mode: how files are placed, see place_file
+        max_workers: number of processes used to read and hash files
+
+    Returns:
+        DataFrame: the mapping manifest (one row per source file)
     """
     source_path = Path(source_folder)
     dest_path = Path(dest_folder)
-    
+    manifest_path = dest_path / MANIFEST_NAME
+
     # Create destination folder
     dest_path.mkdir(parents=True, exist_ok=True)
-    
-    # Process each ROOT file
-    for root_file in source_path.glob("*.root"):
+
+    manifest = load_manifest(manifest_path)
+    known = {row['source_path']: row for row in manifest.to_dict('records')}
+
+    # Sources already placed (or recorded as duplicates) and unchanged since are skipped
+    rows, to_inspect = [], []
+    for root_file in sorted(source_path.glob("*.root")):
+        stat = root_file.stat()
+        previous = known.get(str(root_file))
+        if (previous is not None and previous['status'] != 'error'
+                and previous['source_size'] == stat.st_size and previous['source_mtime'] == stat.st_mtime_ns):
+            rows.append(previous)
+        else:
+            to_inspect.append(root_file)
+
+    print(f"{len(rows)} files already organized, inspecting {len(to_inspect)} files...")
+    if not to_inspect:
+        return manifest
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        inspected = list(tqdm(executor.map(inspect_file, to_inspect), total=len(to_inspect), desc="Inspecting Files"))
+
+    # Destination names are decided serially: content already present is a duplicate,
+    # different content with the same first event gets the next free counter.
+    by_hash = {row['content_hash']: row['dest_name'] for row in rows if row['content_hash']}
+    taken = {row['dest_name'] for row in rows if row['dest_name']}
+    to_place = []
+
+    # A changed source keeps the file it placed (or failed to place) before, replaced with
+    # the new content, unless unchanged sources are recorded as duplicates of that file.
+    reserved = {}
+    for root_file in to_inspect:
+        previous = known.get(str(root_file))
+        if (previous is not None and previous['dest_name'] and previous['status'] != 'duplicate'
+                and previous['dest_name'] not in taken):
+            reserved[str(root_file)] = previous['dest_name']
+    taken.update(reserved.values())
+
+    def release(name):
+        """Remove a changed source's previous file that it no longer maps to."""
+        (dest_path / name).unlink(missing_ok=True)
+        taken.discard(name)
+        print(f"Removed stale {name}")
+
+    for row in inspected:
+        previous_name = reserved.pop(row['source_path'], None)
+        base = f"{row['run']}_{row['subrun']}_{row['event']}"
+        if previous_name is not None and (row['error'] or row['content_hash'] in by_hash
+                                          or not is_named_for(previous_name, base)):
+            release(previous_name)
+            previous_name = None
+
+        if row['error']:
+            print(f"✗ Error processing {Path(row['source_path']).name}: {row['error']}")
+            rows.append(row)
+            continue
+
+        if row['content_hash'] in by_hash:
+            row['dest_name'], row['status'] = by_hash[row['content_hash']], 'duplicate'
+            rows.append(row)
+            continue
+
+        if previous_name is not None:
+            # Same first event: the new content replaces the source's previous file
+            row['dest_name'], row['status'] = previous_name, 'pending'
+            by_hash[row['content_hash']] = previous_name
+            rows.append(row)
+            to_place.append(row)
+            continue
+
+        # Create new filename: run_subrun_event.root
+        counter = 0
+        while True:
+            new_filename = f"{base}.root" if counter == 0 else f"{base}_{counter}.root"
+            dest_file = dest_path / new_filename
+            if new_filename not in taken:
+                if not dest_file.exists():
+                    row['status'] = 'pending'
+                    break
+                # Left by an earlier run without a manifest: adopt it if the content matches
+                if content_hash(dest_file) == row['content_hash']:
+                    row['status'] = 'existing'
+                    break
+            counter += 1
+
+        row['dest_name'] = new_filename
+        by_hash[row['content_hash']] = new_filename
+        taken.add(new_filename)
+        rows.append(row)
+        if row['status'] == 'pending':
+            to_place.append(row)
+
+    def place(row):
+        dest_file = dest_path / row['dest_name']
+        tmp_file = dest_file.with_name(dest_file.name + ".tmp")
         try:
-            # Open ROOT file and read "raw" tree
-            with uproot.open(root_file) as file:
-                raw_tree = file["ana/raw"]
-                
-                # Get run, subrun, event from first entry
-                run = int(raw_tree["run"].array()[0])
-                subrun = int(raw_tree["subrun"].array()[0])
-                event = int(raw_tree["event"].array()[0])
-                
-                # Create new filename: run_subrun_event.root
-                new_filename = f"{run}_{subrun}_{event}.root"
-                dest_file = dest_path / new_filename
-                
-                # Handle duplicates by adding counter
-                counter = 1
-                while dest_file.exists():
-                    new_filename = f"{run}_{subrun}_{event}_{counter}.root"
-                    dest_file = dest_path / new_filename
-                    counter += 1
-                
-                # Copy file with new name
-                shutil.copy2(root_file, dest_file)
-                print(f"✓ {root_file.name} → {new_filename}")
-                
+            # Through a temporary name, so a previous file of the source is replaced atomically
+            tmp_file.unlink(missing_ok=True)
+            row['status'] = place_file(row['source_path'], tmp_file, mode)
+            tmp_file.replace(dest_file)
+            print(f"✓ {Path(row['source_path']).name} → {row['dest_name']} ({row['status']})")
         except Exception as e:
-            print(f"✗ Error processing {root_file.name}: {e}")
+            tmp_file.unlink(missing_ok=True)
+            row['status'], row['error'] = 'error', str(e)
+            print(f"✗ Error processing {Path(row['source_path']).name}: {e}")
+
+    # Copies are I/O bound, links are instant; threads are enough for both
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(place, to_place))
+
+    manifest = pd.DataFrame(rows, columns=MANIFEST_COLUMNS)
+    tmp_path = manifest_path.with_name(MANIFEST_NAME + ".tmp")
+    manifest.to_csv(tmp_path, index=False)
+    tmp_path.replace(manifest_path)
+
+    counts = manifest['status'].value_counts()
+    placed = sum(row['status'] in PLACE_METHODS for row in to_place)
+    print(f"Done: {placed} placed, {counts.get('duplicate', 0)} duplicates, {counts.get('error', 0)} errors")
+    return manifest
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Organize RawDigitExtractor files as run_subrun_event.root")
+    parser.add_argument("source_folder", help="Folder with the extracted *.root files")
+    parser.add_argument("dest_folder", help="Destination folder (e.g. .../rawprotons/onetrackprotons)")
+    parser.add_argument("--mode", default="auto", choices=["auto", "reflink", "hardlink", "copy"],
+                        help="How files are placed (default: auto, reflink then hard link then copy)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes used to read and hash files")
 
-# Usage
-process_raw_digit_files(
-    "/Users/user/data/research/proton-deuteron/rawprotons/proton_extracted_root",
-    "/Users/user/data/research/proton-deuteron/rawprotons/onetrackprotons"
-)
\ No newline at end of file
+    args = parser.parse_args()
+    process_raw_digit_files(args.source_folder, args.dest_folder, mode=args.mode, max_workers=args.workers)
@@ -6,7 +6,7 @@ This script takes a CSV file containing (run, subrun, event) and searches
 through ROOT files to generate event displays for each matching event.
 
 Usage:
-    python savedisplay.py <csv_file> <root_files_dir> [output_dir]
+    python savedisplay.py <csv_file> <root_files_dir> [output_dir] [--workers N] [--fast] [--index FILE]
 
 Arguments:
     csv_file: Path to CSV file with columns 'run', 'subrun', 'event'
@@ -15,9 +15,7 @@ Arguments:
 """
 
 import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
-import seaborn as sns
 import uproot
 import awkward as ak
 from pathlib import Path
@@ -26,48 +24,107 @@ from tqdm import tqdm
 import argparse
 import sys
 
-def process_single_file(file_path, target_events_set):
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from lariat.planes import build_planes
+from lariat.index import EventIndex
+from lariat.search import search_files
+from lariat.loader import RawLoader
+
+
+def display_filename(event_info):
+    """PNG name of an event display."""
+    return f"run_{event_info['run']}_subrun_{event_info['subrun']}_event_{event_info['event']}.png"
+
+
+def display_title(event_info):
+    return f"Collection Plane - Run {event_info['run']}, Subrun {event_info['subrun']}, Event {event_info['event']}"
+
+
+def draw_collection(ax, image_data, title):
     """
-    Process a single ROOT file to find matching events
+    Draw a (ticks x wires) collection plane with imshow (one image, not a cell per pixel).
+    Returns the AxesImage so later events can reuse it with set_data.
     """
-    matches = []
-    try:
-        with uproot.open(file_path) as root_file:
-            if "ana/raw" not in root_file:
-                return matches
-            
-            tree = root_file["ana/raw"]
-            events_data = tree.arrays(["run", "subrun", "event"], library="np")
-            
-            runs = events_data["run"].astype(int)
-            subruns = events_data["subrun"].astype(int)
-            events = events_data["event"].astype(int)
-            
-            for idx in range(len(runs)):
-                event_tuple = (runs[idx], subruns[idx], events[idx])
-                if event_tuple in target_events_set:
-                    matches.append({
-                        'run': runs[idx],
-                        'subrun': subruns[idx],
-                        'event': events[idx],
-                        'file_path': str(file_path),
-                        'filename': file_path.name,
-                        'event_index_in_file': idx,
-                    })
-    except Exception as e:
-        print(f"Error processing {file_path}: {e}")
-    
-    return matches
+    image = ax.imshow(image_data, cmap="viridis", aspect="auto", origin="lower", interpolation="nearest")
+    ax.set_title(title, fontsize=14)
+    ax.set_xlabel("Collection Plane Wire Number (0-239)", fontsize=12)
+    ax.set_ylabel("Time Tick", fontsize=12)
+    return image
+
+
+def render_file(file_path, events, output_dir, dpi=150, fast=False):
+    """
+    Render the displays of all matched events of one ROOT file.
+    This function is designed to be run in a separate process.
+
+    The file is read once through a RawLoader and a single figure is reused for every
+    event (only the image data, colour limits and title change). With fast=True the
+    colormapped plane is written straight to PNG without axes. Existing PNGs are
+    skipped and new ones are written to a temporary name first, so an interrupted run
+    can simply be restarted.
+
+    Returns:
+        (rendered, skipped, errors)
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    output_dir = Path(output_dir)
+    todo = [e for e in events if not (output_dir / display_filename(e)).exists()]
+    skipped = len(events) - len(todo)
+    if not todo:
+        return 0, skipped, []
+
+    rendered, errors = 0, []
+    fig = ax = image = None
+
+    with RawLoader(file_path) as loader:
+        for event_info in sorted(todo, key=lambda e: e['event_index_in_file']):
+            full_path = output_dir / display_filename(event_info)
+            tmp_path = full_path.with_suffix(".tmp.png")
+            try:
+                data = loader.read(int(event_info['event_index_in_file']))
+                collection_plane, _ = build_planes(data["raw_rawadc"], data["raw_channel"])
+                image_data = collection_plane.T
+
+                if fast:
+                    plt.imsave(tmp_path, image_data, cmap="viridis", origin="lower")
+                else:
+                    if fig is None:
+                        fig, ax = plt.subplots(figsize=(12, 6))
+                        image = draw_collection(ax, image_data, display_title(event_info))
+                        fig.colorbar(image, ax=ax, label='ADC Counts')
+                        fig.tight_layout()
+                    else:
+                        image.set_data(image_data)
+                        ax.set_title(display_title(event_info), fontsize=14)
+                    image.set_clim(image_data.min(), image_data.max())
+                    fig.savefig(tmp_path, dpi=dpi, bbox_inches='tight')
+
+                tmp_path.replace(full_path)
+                rendered += 1
+
+            except Exception as e:
+                errors.append(f"{full_path.name}: {e}")
+
+    if fig is not None:
+        plt.close(fig)
+
+    return rendered, skipped, errors
+
 
 class EventDisplayGenerator():
     """
     An optimized event display generator that uses parallel processing to quickly
     search through ROOT files and generate event displays.
     """
-    def __init__(self, events_csv, root_files_dir, output_dir="event_images"):
+    def __init__(self, events_csv, root_files_dir, output_dir="event_images", index_path=None, fast=False):
         self.events_df = pd.read_csv(events_csv)
         self.root_files_dir = Path(root_files_dir)
         self.output_dir = Path(output_dir)
+        self.index_path = index_path
+        self.fast = fast
         self.matched_events = []
         
         # Validate input
@@ -95,7 +152,7 @@ class EventDisplayGenerator():
             return
         
         # Step 2: Generate all displays
-        self._generate_all_displays()
+        self._generate_all_displays(max_workers)
         
         print("\n" + "="*60)
         print("PIPELINE COMPLETE")
@@ -106,26 +163,29 @@ class EventDisplayGenerator():
         Search all ROOT files in parallel for events that match the CSV.
         """
         print("\nStep 1: Searching for matching events...")
-        target_events_set = set(zip(
-            self.events_df['run'].astype(int),
-            self.events_df['subrun'].astype(int),
-            self.events_df['event'].astype(int)
-        ))
+
+        if self.index_path is not None:
+            # Refresh the persistent event index (only changed files are re-read) and look events up in it
+            index = EventIndex.build(self.root_files_dir, self.index_path, num_processes=max_workers)
+            matched = index.lookup(self.events_df['run'], self.events_df['subrun'], self.events_df['event'])
+            self.matched_events = matched.to_dict('records')
+            print(f"Found {len(self.matched_events)} matching events")
+            return self.matched_events
 
         root_files = list(self.root_files_dir.glob("*.root"))
         print(f"Found {len(root_files)} ROOT files to search")
-        print(f"Looking for {len(target_events_set)} target events")
+        print(f"Looking for {len(self.events_df)} target events")
 
-        matched = []
-        with ProcessPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(process_single_file, path, target_events_set) for path in root_files]
-            
-            for future in tqdm(as_completed(futures), total=len(root_files), desc="Searching Files"):
-                result = future.result()
-                if result:
-                    matched.extend(result)
+        # Vectorised key join per file; the target keys go to each worker once
+        matched = search_files(
+            root_files,
+            self.events_df['run'].astype(int),
+            self.events_df['subrun'].astype(int),
+            self.events_df['event'].astype(int),
+            max_workers=max_workers
+        )
         
-        self.matched_events = sorted(matched, key=lambda x: (x['run'], x['subrun'], x['event']))
+        self.matched_events = matched.to_dict('records')
         print(f"Found {len(self.matched_events)} matching events")
         return self.matched_events
 
@@ -157,25 +217,14 @@ class EventDisplayGenerator():
                 adc_data = ak.to_numpy(event_data["raw_rawadc"][0])
                 channel_map = ak.to_numpy(event_data["raw_channel"][0])
                 
-                # Reshape based on the total number of channels present in the data
-                num_channels_in_event = len(channel_map)
-                if num_channels_in_event == 0:
+                if len(channel_map) == 0:
                     print(f"Warning: Event at index {match_index} has no channel data.")
                     return None, None
-                
-                num_ticks = len(adc_data) // num_channels_in_event
-                adc_data_2d = adc_data.reshape((num_channels_in_event, num_ticks))
 
-                # Create a fixed-size canvas for the collection plane (240 wires)
-                collection_plane = np.zeros((240, num_ticks))
-
-                # Populate the canvas at the correct physical wire location
-                for i, channel_num in enumerate(channel_map):
-                    if 240 <= channel_num < 480:
-                        wire_index = channel_num - 240 # Map channel 240 to index 0
-                        collection_plane[wire_index, :] = adc_data_2d[i, :]
+                # Place each wire at its physical position on a fixed 240-wire canvas
+                collection_plane, _ = build_planes(adc_data, channel_map)
                 
-                title = f"Collection Plane - Run {event_info['run']}, Subrun {event_info['subrun']}, Event {event_info['event']}"
+                title = display_title(event_info)
                 
                 # Transpose for plotting (Time vs. Wire)
                 return collection_plane.T, title
@@ -197,56 +246,52 @@ class EventDisplayGenerator():
             return
         
         print(f"Displaying: {title}")
-        plt.figure(figsize=(12, 6))
-        sns.heatmap(image_data, cmap="viridis", cbar_kws={'label': 'ADC Counts'})
-        plt.title(title)
-        plt.xlabel("Collection Plane Wire Number (0-239)")
-        plt.ylabel("Time Tick")
-        plt.gca().invert_yaxis()
+        fig, ax = plt.subplots(figsize=(12, 6))
+        image = draw_collection(ax, image_data, title)
+        fig.colorbar(image, ax=ax, label='ADC Counts')
         plt.tight_layout()
         plt.show()
 
-    def _generate_all_displays(self):
+    def _generate_all_displays(self, max_workers=None):
         """
         Generate and save event displays for all matched events.
+
+        Matches are grouped by ROOT file and each file is rendered by one worker process
+        (see render_file), so every file is read once. Files whose displays all exist
+        already are skipped without being opened.
         """
         print(f"\nStep 2: Generating {len(self.matched_events)} event displays...")
         
         self.output_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Use matplotlib non-interactive backend for batch processing
-        plt.ioff()
-        
-        successful = 0
-        for i, event_info in enumerate(tqdm(self.matched_events, desc="Generating Images")):
-            filename = f"run_{event_info['run']}_subrun_{event_info['subrun']}_event_{event_info['event']}.png"
-            full_path = self.output_dir / filename
 
-            if full_path.exists():
-                successful += 1
-                continue  # Skip if already exists
+        by_file = {}
+        for event_info in self.matched_events:
+            by_file.setdefault(event_info['file_path'], []).append(event_info)
 
-            image_data, title = self._get_event_image_data(i)
-            
-            if image_data is None:
-                continue
+        # Skip whole files that are already done
+        done = 0
+        tasks = {}
+        for file_path, events in by_file.items():
+            if all((self.output_dir / display_filename(e)).exists() for e in events):
+                done += len(events)
+            else:
+                tasks[file_path] = events
 
-            try:
-                fig, ax = plt.subplots(figsize=(12, 6))
-                sns.heatmap(image_data, cmap="viridis", cbar_kws={'label': 'ADC Counts'}, ax=ax)
-                ax.set_title(title, fontsize=14)
-                ax.set_xlabel("Collection Plane Wire Number (0-239)", fontsize=12)
-                ax.set_ylabel("Time Tick", fontsize=12)
-                ax.invert_yaxis()
-                
-                plt.tight_layout()
-                plt.savefig(full_path, dpi=150, bbox_inches='tight')
-                plt.close(fig)
-                successful += 1
-                
-            except Exception as e:
-                print(f"\nError saving {filename}: {e}")
-                plt.close('all')  # Clean up in case of error
+        print(f"{done} displays already exist, rendering {len(tasks)} files")
+
+        successful = done
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(render_file, file_path, events, self.output_dir, 150, self.fast): file_path
+                       for file_path, events in tasks.items()}
+
+            with tqdm(total=sum(len(events) for events in tasks.values()), desc="Generating Images") as progress:
+                for future in as_completed(futures):
+                    rendered, skipped, errors = future.result()
+                    successful += rendered + skipped
+                    progress.update(rendered + skipped + len(errors))
+                    progress.set_postfix(file=Path(futures[future]).name)
+                    for error in errors:
+                        print(f"\nError saving {error}")
 
         print(f"\nSuccessfully generated {successful}/{len(self.matched_events)} event displays")
         print(f"Images saved to: {self.output_dir.resolve()}")
@@ -273,6 +318,8 @@ Examples:
     python savedisplay.py events.csv /path/to/root/files
     python savedisplay.py events.csv /path/to/root/files my_output_dir
     python savedisplay.py events.csv /path/to/root/files --workers 8
+    python savedisplay.py events.csv /path/to/root/files --index root_index.npz
+    python savedisplay.py events.csv /path/to/root/files --workers 8 --fast
         """
     )
     
@@ -281,6 +328,8 @@ Examples:
     parser.add_argument('output_dir', nargs='?', default='event_images', 
                        help='Output directory for images (default: event_images)')
     parser.add_argument('--workers', type=int, help='Number of parallel workers')
+    parser.add_argument('--fast', action='store_true', help='Write colormapped planes straight to PNG (no axes or colorbar)')
+    parser.add_argument('--index', help='Event index file (.npz) to use and refresh instead of scanning every ROOT file')
     
     args = parser.parse_args()
     
@@ -301,7 +350,9 @@ Examples:
         generator = EventDisplayGenerator(
             events_csv=args.csv_file,
             root_files_dir=args.root_files_dir,
-            output_dir=args.output_dir
+            output_dir=args.output_dir,
+            index_path=args.index,
+            fast=args.fast
         )
         
         generator.search_and_generate_all(max_workers=args.workers)
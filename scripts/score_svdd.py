@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Score clusters with the trained Deep-SVDD model (batched CPU inference).
+
+Clusters are cropped / z-scored once into a memory-mapped (N, 1, 64, 96) float32
+tensor file in the cache directory, named by a content hash of the images; the
+distances are cached next to it for the model that produced them. Re-running with a
+different threshold therefore only rewrites the score CSV, and re-running with new
+weights only repeats the inference.
+
+Scores are appended to the output CSV batch by batch as they are produced.
+
+Usage:
+    python score_svdd.py <clusters.pkl | clusters.parquet | clusters.clusters> [--artifacts ssvd/artifacts] [--out deuteron_scores.csv]
+                         [--cache-dir ssvd/cache] [--batch-size 1024] [--workers 4] [--threshold T]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import torch
+from tqdm import tqdm
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from lariat.dataset import ClusterDataset
+from lariat.tensors import TensorCache, cluster_images, content_hash
+from lariat.svdd import load_artifacts, artifacts_hash, iterate_distances
+
+ID_COLUMNS = ["event_idx", "run", "subrun", "event", "cluster_idx"]
+
+
+def read_clusters_table(path):
+    """
+    Clusters from a pickled DataFrame (ssvd notebooks), a Parquet file / dataset
+    (lariat.clustering) or a ClusterDataset directory (scripts/pack_clusters.py).
+    """
+    if (Path(path) / "dataset.json").exists():
+        return ClusterDataset(path)
+    if str(path).endswith(".pkl"):
+        return pd.read_pickle(path)
+    return pd.read_parquet(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score clusters with the trained Deep-SVDD model")
+    parser.add_argument("clusters", help="Pickled DataFrame, Parquet or cluster dataset with an image_intensity column")
+    parser.add_argument("--artifacts", default="ssvd/artifacts", help="Directory with svdd.pt, centre.npy, threshold.json")
+    parser.add_argument("--out", default="deuteron_scores.csv", help="Output CSV (default: deuteron_scores.csv)")
+    parser.add_argument("--cache-dir", default="ssvd/cache", help="Directory for preprocessed tensors and distances")
+    parser.add_argument("--batch-size", type=int, default=1024, help="Inference batch size (default: 1024)")
+    parser.add_argument("--workers", type=int, default=4, help="DataLoader worker processes (default: 4)")
+    parser.add_argument("--threads", type=int, default=None, help="Torch intra-op threads (default: torch's choice)")
+    parser.add_argument("--threshold", type=float, default=None, help="Override the threshold of threshold.json")
+
+    args = parser.parse_args()
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+
+    model, centre, meta = load_artifacts(args.artifacts)
+    thr = float(meta['threshold']) if args.threshold is None else args.threshold
+
+    print('Loading clusters:', args.clusters)
+    df = read_clusters_table(args.clusters)
+    if isinstance(df, pd.DataFrame):
+        df = df.reset_index(drop=True)
+    print('Rows:', len(df))
+
+    images = cluster_images(df)
+    key = content_hash(images, meta.get('img_h', 64), meta.get('img_w', 96))
+    cache = TensorCache.build(images, args.cache_dir, meta.get('img_h', 64), meta.get('img_w', 96), key=key)
+    del images
+
+    cols = [c for c in ID_COLUMNS if c in df.columns]
+    if isinstance(df, ClusterDataset):
+        ids = df.table(cols) if cols else pd.DataFrame(index=pd.RangeIndex(len(df)))
+    else:
+        ids = df[cols].copy() if cols else pd.DataFrame(index=df.index)
+    del df
+
+    out_path = Path(args.out)
+    distances_path = Path(args.cache_dir) / f"{key}-{artifacts_hash(args.artifacts)}.distances.npy"
+
+    if distances_path.exists():
+        print(f"Using cached distances {distances_path}")
+        scores = np.load(distances_path)
+        out = ids.assign(svdd_distance=scores, is_deuteron_pred=scores <= thr)
+        out.to_csv(out_path, index=False)
+    else:
+        scores = np.zeros(len(cache), dtype=np.float32)
+        with open(out_path, "w") as f:
+            header = True
+            for start, d in tqdm(iterate_distances(cache, model, centre, args.batch_size, args.workers),
+                                 total=-(-len(cache) // args.batch_size), desc="Scoring"):
+                scores[start:start + len(d)] = d
+                rows = ids.iloc[start:start + len(d)].assign(svdd_distance=d, is_deuteron_pred=d <= thr)
+                rows.to_csv(f, index=False, header=header)
+                f.flush()
+                header = False
+
+        tmp_path = distances_path.with_name(distances_path.name + ".tmp.npy")
+        np.save(tmp_path, scores)
+        tmp_path.replace(distances_path)
+
+    print(f"Wrote: {out_path} ({int(np.sum(scores <= thr))} of {len(scores)} below threshold {thr:.6f})")
+
+
+if __name__ == "__main__":
+    main()
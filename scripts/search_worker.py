@@ -1,132 +1,77 @@
 # search_worker.py
 
-import uproot
-import os
+import sys
+import numpy as np
 from pathlib import Path
-from multiprocessing import Pool
-import glob
 
-def count_events_in_file(file_path):
-    """
-    Counts the number of events in a single ROOT file.
-    This function is designed to be run in a separate process.
-    """
-    try:
-        with uproot.open(file_path) as file:
-            if "ana/raw" not in file:
-                return {
-                    'file_path': str(file_path),
-                    'filename': Path(file_path).name,
-                    'event_count': 0,
-                    'error': 'No ana/raw tree found'
-                }
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from lariat.search import match_file, target_keys
+from lariat.manifest import FileManifest
 
-            tree = file["ana/raw"]
-            event_count = tree.num_entries
-            
-            return {
-                'file_path': str(file_path),
-                'filename': Path(file_path).name,
-                'event_count': event_count,
-                'error': None
-            }
-        
-    except Exception as e:
-        return {
-            'file_path': str(file_path),
-            'filename': Path(file_path).name,
-            'event_count': 0,
-            'error': str(e)
-        }
-
-def count_total_events_in_directory(directory_path, pattern="*.root", num_processes=None):
+def count_total_events_in_directory(directory_path, pattern="*.root", num_processes=None, manifest_path=None, use_threads=True):
     """
     Counts the total number of events in all ROOT files in a directory.
+
+    The per-file metadata comes from a manifest (lariat.manifest.FileManifest, built from
+    an EventIndex cached in the user cache by default), so only new or modified files
+    are opened again.
     
     Args:
         directory_path (str): Path to the directory containing ROOT files
         pattern (str): File pattern to match (default: "*.root")
-        num_processes (int): Number of processes to use (default: None for auto)
+        num_processes (int): Number of processes (or threads) to use (default: None for auto)
+        manifest_path (str): Cached index file (default: under ~/.cache/lariat/manifests, False to disable)
+        use_threads (bool): Scan with threads (default, header reads are I/O bound); False uses processes
     
     Returns:
-        dict: Summary of event counts with detailed results
+        dict: Summary of event counts with detailed results and the FileManifest
     """
-    directory_path = Path(directory_path)
-    
-    if not directory_path.exists():
-        raise ValueError(f"Directory does not exist: {directory_path}")
+    manifest = FileManifest.build(directory_path, manifest_path, pattern=pattern,
+                                  max_workers=num_processes, use_threads=use_threads)
     
-    # Find all ROOT files matching the pattern
-    root_files = list(directory_path.glob(pattern))
-    
-    if not root_files:
+    if len(manifest) == 0:
         print(f"No files matching pattern '{pattern}' found in {directory_path}")
-        return {
-            'total_events': 0,
-            'total_files': 0,
-            'successful_files': 0,
-            'failed_files': 0,
-            'file_details': []
-        }
-    
-    print(f"Found {len(root_files)} ROOT files to process...")
     
-    # Process files in parallel
-    with Pool(processes=num_processes) as pool:
-        results = pool.map(count_events_in_file, root_files)
-    
-    # Analyze results
-    total_events = 0
-    successful_files = 0
-    failed_files = 0
+    results = [{
+        'file_path': row['file_path'],
+        'filename': Path(row['file_path']).name,
+        'event_count': row['num_entries'],
+        'error': row['error'] or None,
+    } for row in manifest.files.to_dict('records')]
     
     for result in results:
-        if result['error'] is None:
-            total_events += result['event_count']
-            successful_files += 1
-        else:
-            failed_files += 1
+        if result['error'] is not None:
             print(f"Warning: {result['filename']}: {result['error']}")
     
+    failed_files = len(manifest.failed)
     summary = {
-        'total_events': total_events,
-        'total_files': len(root_files),
-        'successful_files': successful_files,
+        'total_events': manifest.total_events,
+        'total_files': len(manifest),
+        'successful_files': len(manifest) - failed_files,
         'failed_files': failed_files,
-        'file_details': results
+        'file_details': results,
+        'manifest': manifest,
     }
     
     return summary
 
-def process_single_file(file_path, target_events_set):
+def process_single_file(file_path, target_events=None):
     """
-    Original function: Processes a single ROOT file to find matching events.
+    Processes a single ROOT file to find matching events.
     This function is designed to be run in a separate process.
+
+    target_events can be a set of (run, subrun, event) tuples, an array of packed keys
+    from lariat.search.target_keys, or None if the pool was started with
+    initializer=init_worker, initargs=(keys,) so the targets are sent to each worker once.
+
+    Matching is vectorised (see lariat.search.match_file, which returns the matches as
+    a DataFrame); this wrapper returns them as a list of dicts.
     """
-    try:
-        with uproot.open(file_path) as file:
-            if "ana/raw" not in file:
-                return []
+    if isinstance(target_events, (set, frozenset, list, tuple)):
+        ids = np.array(list(target_events), dtype=np.int64).reshape(-1, 3)
+        target_events = target_keys(ids[:, 0], ids[:, 1], ids[:, 2])
 
-            tree = file["ana/raw"]
-            events_in_file = tree.arrays(["run", "subrun", "event"], library="ak")
-            
-            found_matches = []
-            for idx, event_id in enumerate(zip(events_in_file.run, events_in_file.subrun, events_in_file.event)):
-                if event_id in target_events_set:
-                    found_matches.append({
-                        'run': event_id[0],
-                        'subrun': event_id[1],
-                        'event': event_id[2],
-                        'file_path': str(file_path),
-                        'filename': file_path.name,
-                        'event_index_in_file': idx,
-                    })
-            return found_matches
-        
-    except Exception as e:
-        print(f"Warning: Could not process file {file_path.name}: {e}")
-        return []
+    return match_file(file_path, target_events).to_dict('records')
 
 if __name__ == "__main__":
     import argparse
@@ -134,7 +79,10 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Count total events in ROOT files")
     parser.add_argument("directory", help="Directory containing ROOT files")
     parser.add_argument("--pattern", default="*.root", help="File pattern to match (default: *.root)")
-    parser.add_argument("--processes", type=int, default=None, help="Number of processes to use")
+    parser.add_argument("--processes", type=int, default=None, help="Number of processes (or threads) to use")
+    parser.add_argument("--use-processes", action="store_true", help="Scan files with processes instead of threads")
+    parser.add_argument("--manifest", default=None, help="Cached index file (default: under ~/.cache/lariat/manifests)")
+    parser.add_argument("--no-manifest", action="store_true", help="Do not read or write a cached index")
     parser.add_argument("--verbose", "-v", action="store_true", help="Show detailed file information")
     
     args = parser.parse_args()
@@ -147,7 +95,9 @@ if __name__ == "__main__":
         results = count_total_events_in_directory(
             args.directory, 
             pattern=args.pattern, 
-            num_processes=args.processes
+            num_processes=args.processes,
+            manifest_path=False if args.no_manifest else args.manifest,
+            use_threads=not args.use_processes
         )
         
         print("\nSUMMARY:")
@@ -1,11 +1,147 @@
+"""
+Convert an event CSV (e.g. all_events.csv) to a typed, sorted Parquet table.
+
+Known columns are read with explicit types (integers for identifiers and flags,
+doubles for beamline / track quantities), per-hit quantities are read as text and always
+split into list columns (a single value becomes a one-element list), and the remaining
+columns keep DuckDB's detected type instead of VARCHAR. Rows are sorted by (run, subrun, event) and written in fixed-size row groups,
+so readers (lariat.tables.read_events) can push selections such as beamline_mass > 0
+or the 600-1600 / 1600-2750 MeV windows down into the scan.
+
+The conversion streams through DuckDB with a memory limit; the sort spills to the
+temporary directory when it does not fit.
+
+Usage:
+    python to_parquet.py <all_events.csv> <all_events.parquet> [--memory-limit 1GB] [--row-group-size 122880]
+"""
+
+import argparse
 import duckdb
 
-# Set memory limit in DuckDB
-duckdb.sql("SET memory_limit='1GB';")  # Adjust to available RAM
+COLUMN_TYPES = {
+    'run': 'INTEGER',
+    'subrun': 'INTEGER',
+    'event': 'INTEGER',
+    'p': 'TINYINT',
+    'm': 'TINYINT',
+    'eventtype': 'INTEGER',
+    'ntrkcalopts': 'INTEGER',
+    'negativeke': 'INTEGER',
+    'decayatrest': 'INTEGER',
+    'beamline_mass': 'DOUBLE',
+    'wctrkmomentum': 'DOUBLE',
+    'tof': 'DOUBLE',
+    'trklength': 'DOUBLE',
+    'trkendx': 'DOUBLE',
+    'trkendy': 'DOUBLE',
+    'trkendz': 'DOUBLE',
+}
+
+# Per-hit quantities, stored as one delimited cell per track; always written as lists.
+LIST_COLUMNS = {
+    'incint': 'INTEGER',
+    'positionxtpc': 'DOUBLE',
+    'positionytpc': 'DOUBLE',
+    'positionztpc': 'DOUBLE',
+    'residualrange': 'DOUBLE',
+    'trkdedx': 'DOUBLE',
+    'nslice': 'INTEGER',
+    'cke': 'DOUBLE',
+}
+
+SORT_COLUMNS = ['run', 'subrun', 'event']
+
+
+def quote(name):
+    """SQL identifier."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def literal(value):
+    """SQL string literal (paths and settings may contain quotes)."""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def read_types(raw_names):
+    """read_csv types for the known and list columns of a header; the others are left to the sniffer."""
+    types = {}
+    for raw_name in raw_names:
+        name = raw_name.strip()
+        if name in LIST_COLUMNS:
+            types[raw_name] = 'VARCHAR'
+        elif name in COLUMN_TYPES:
+            types[raw_name] = COLUMN_TYPES[name]
+    return types
 
-# Convert CSV to Parquet using streaming (limits RAM usage)
-duckdb.sql("""
+
+def select_list(raw_names):
+    """SELECT expressions giving each column (read with read_types) its target type and stripped name."""
+    expressions = []
+    for raw_name in raw_names:
+        name = raw_name.strip()
+        column = quote(raw_name)
+        if name in LIST_COLUMNS:
+            # "[1.0, 2.0]", "1.0 2.0", "1.0;2.0" or "1.0" -> DOUBLE[] / INTEGER[]
+            items = f"regexp_split_to_array(trim(regexp_replace({column}, '[\\[\\]]', '', 'g')), '[,; ]+')"
+            expression = f"list_transform(list_filter({items}, x -> x <> ''), x -> CAST(x AS {LIST_COLUMNS[name]}))"
+        else:
+            expression = column
+        expressions.append(f"{expression} AS {quote(name)}")
+    return ",\n        ".join(expressions)
+
+
+def convert(csv_path, parquet_path, memory_limit="1GB", row_group_size=122880, temp_directory=None, threads=None):
+    """
+    Convert csv_path to a typed Parquet file sorted by (run, subrun, event).
+
+    Args:
+        memory_limit: DuckDB memory limit (larger intermediates spill to disk)
+        row_group_size: rows per Parquet row group
+        temp_directory: where DuckDB spills (default: DuckDB's own .tmp directory)
+        threads: DuckDB worker threads (default: all cores)
+    """
+    con = duckdb.connect()
+    con.execute(f"SET memory_limit={literal(memory_limit)}")
+    if temp_directory is not None:
+        con.execute(f"SET temp_directory={literal(temp_directory)}")
+    if threads is not None:
+        con.execute(f"SET threads={int(threads)}")
+
+    # Header names only, so the known columns can be typed before anything is sniffed
+    raw_names = [row[0] for row in con.execute(
+        f"DESCRIBE SELECT * FROM read_csv({literal(csv_path)}, header=true, all_varchar=true)").fetchall()]
+    types = ", ".join(f"{literal(name)}: {literal(dtype)}" for name, dtype in read_types(raw_names).items())
+    source = f"read_csv({literal(csv_path)}, header=true, types={{{types}}})"
+
+    names = {raw_name.strip() for raw_name in raw_names}
+    order = ", ".join(quote(name) for name in SORT_COLUMNS if name in names)
+
+    query = f"""
     COPY (
-        SELECT * FROM read_csv_auto('/Users/mohammed/code/proton-deuterium-data/data/csv/all_events.csv', all_varchar=True)
-    ) TO '/Users/mohammed/code/proton-deuterium-data/data/all_events.parquet' (FORMAT PARQUET);
-""")
+        SELECT
+        {select_list(raw_names)}
+        FROM {source}
+        {f"ORDER BY {order}" if order else ""}
+    ) TO {literal(parquet_path)} (FORMAT PARQUET, COMPRESSION ZSTD, ROW_GROUP_SIZE {int(row_group_size)});
+    """
+    con.execute(query)
+
+    num_rows = con.execute("SELECT count(*) FROM read_parquet(?)", [str(parquet_path)]).fetchone()[0]
+    print(f"Wrote {num_rows:,} rows to {parquet_path}")
+    for name, dtype, *_ in con.execute("DESCRIBE SELECT * FROM read_parquet(?)", [str(parquet_path)]).fetchall():
+        print(f"  {name}: {dtype}")
+    con.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert an event CSV to typed, sorted Parquet")
+    parser.add_argument("csv", help="Input CSV (e.g. all_events.csv)")
+    parser.add_argument("parquet", help="Output Parquet file")
+    parser.add_argument("--memory-limit", default="1GB", help="DuckDB memory limit (default: 1GB, adjust to available RAM)")
+    parser.add_argument("--row-group-size", type=int, default=122880, help="Rows per row group (default: 122880)")
+    parser.add_argument("--temp-directory", default=None, help="Spill directory for the sort")
+    parser.add_argument("--threads", type=int, default=None, help="DuckDB threads (default: all cores)")
+
+    args = parser.parse_args()
+    convert(args.csv, args.parquet, memory_limit=args.memory_limit, row_group_size=args.row_group_size,
+            temp_directory=args.temp_directory, threads=args.threads)
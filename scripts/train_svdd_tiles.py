@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Train the tile-sparse Deep-SVDD model of ssvd/sparse.ipynb from packed tiles.
+
+The notebook rebuilds a dense (2, 240, 3072) canvas per cluster on every step and
+then throws most of it away as empty tiles. Here the clusters are packed once into
+their non-empty 15 x 192 tiles (lariat.tiles.PackedTiles, cached as an .npz in the
+cache directory) and batches are assembled straight from the packed arrays, so an epoch
+costs in proportion to the signal, not the canvas.
+
+Usage:
+    python train_svdd_tiles.py <handpicked_d.pkl | handpicked_d.clusters> [--out ssvd/artifacts_sparse] [--epochs 100]
+                               [--batch-size 128] [--lr 3e-4] [--weight-decay 1e-4] [--percentile 90]
+"""
+
+import argparse
+import json
+import random
+import sys
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import torch
+import xxhash
+from torch.utils.data import DataLoader
+from tqdm import tqdm
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from lariat.dataset import ClusterDataset
+from lariat.tiles import PackedTiles, TILE_H, TILE_W, OCC_THRESH, NUM_TICKS
+from lariat.tensors import cluster_images, content_hash
+from lariat.planes import NUM_WIRES
+from lariat.svdd import FEAT_DIM, GLOBAL_MAX_ADC, TileSparseCNN, PackedTileDataset, collate_tiles
+
+
+def load_packed(clusters_path, cache_dir, global_max_adc):
+    """PackedTiles of a cluster pickle or ClusterDataset, built on the first run and loaded afterwards."""
+    if (Path(clusters_path) / "dataset.json").exists():
+        df = ClusterDataset(clusters_path)
+    else:
+        df = pd.read_pickle(clusters_path).reset_index(drop=True)
+    key = content_hash(cluster_images(df), NUM_WIRES, NUM_TICKS)
+    bbox = np.stack([np.asarray(df[c], dtype=np.int64) for c in ('bbox_min_row', 'bbox_min_col')], axis=1)
+    digest = xxhash.xxh3_64(f"{key}:{TILE_H}x{TILE_W}:{OCC_THRESH}:{global_max_adc}".encode())
+    digest.update(bbox.tobytes())
+    key = digest.hexdigest()
+
+    path = Path(cache_dir) / f"tiles-{key}.npz"
+    if path.exists():
+        print(f"Using packed tiles {path}")
+        return PackedTiles.load(path)
+
+    packed = PackedTiles.from_clusters(df, global_max_adc=global_max_adc)
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    packed.save(path)
+    print(f"Packed {packed} into {path}")
+    return packed
+
+
+def embed(model, loader, device):
+    feats = []
+    with torch.no_grad():
+        for tiles, batch_ids, num, background, num_background in loader:
+            feats.append(model.forward_packed(tiles.to(device), batch_ids.to(device), num,
+                                              background.to(device), num_background.to(device)))
+    return torch.cat(feats, dim=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the tile-sparse Deep-SVDD model from packed tiles")
+    parser.add_argument("clusters", help="Pickled DataFrame or cluster dataset of training clusters (image_intensity and bboxes)")
+    parser.add_argument("--out", default="ssvd/artifacts_sparse", help="Output directory for svdd.pt, centre.npy, threshold.json")
+    parser.add_argument("--cache-dir", default="ssvd/cache", help="Directory for the packed tiles")
+    parser.add_argument("--global-max-adc", type=float, default=GLOBAL_MAX_ADC, help=f"ADC scale of channel 0 (default: {GLOBAL_MAX_ADC})")
+    parser.add_argument("--epochs", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--lr", type=float, default=3e-4)
+    parser.add_argument("--weight-decay", type=float, default=1e-4)
+    parser.add_argument("--percentile", type=float, default=90, help="Training-distance percentile used as the threshold")
+    parser.add_argument("--workers", type=int, default=0, help="DataLoader worker processes (default: 0)")
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    torch.manual_seed(args.seed)
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "mps" if torch.backends.mps.is_available() else "cpu")
+    print('Device:', device)
+
+    packed = load_packed(args.clusters, args.cache_dir, args.global_max_adc)
+    print(f"Mean non-empty tiles per cluster: {packed.num_tiles().mean():.1f} of {packed.num_grid_tiles}")
+
+    ds = PackedTileDataset(packed)
+    collate = partial(collate_tiles, global_max_adc=args.global_max_adc)
+    dl = DataLoader(ds, batch_size=args.batch_size, shuffle=True, num_workers=args.workers, collate_fn=collate)
+    ordered = DataLoader(ds, batch_size=args.batch_size, shuffle=False, num_workers=args.workers, collate_fn=collate)
+
+    model = TileSparseCNN(in_ch=2, tile_feat=64, feat_dim=FEAT_DIM).to(device)
+    opt = torch.optim.Adam(model.parameters(), lr=args.lr, weight_decay=args.weight_decay)
+
+    model.eval()
+    centre = embed(model, tqdm(ordered, desc='Init centre'), device).mean(dim=0).detach()
+
+    for epoch in range(1, args.epochs + 1):
+        model.train()
+        running, n = 0.0, 0
+        for tiles, batch_ids, num, background, num_background in dl:
+            f = model.forward_packed(tiles.to(device), batch_ids.to(device), num,
+                                     background.to(device), num_background.to(device))
+            loss = ((f - centre)**2).mean()
+            opt.zero_grad()
+            loss.backward()
+            opt.step()
+            running += loss.item() * num
+            n += num
+        print(f'Epoch {epoch:03d}/{args.epochs} loss={running / n:.8f}')
+
+    model.eval()
+    train_dists = torch.norm(embed(model, ordered, device) - centre, dim=1).cpu().numpy().astype(np.float32)
+    thr = float(np.percentile(train_dists, args.percentile))
+    print(f'Chosen threshold @ P{args.percentile:.1f} = {thr:.6f}')
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    torch.save(model.state_dict(), out_dir / 'svdd.pt')
+    np.save(out_dir / 'centre.npy', centre.cpu().numpy())
+    meta = {
+        'img_h': NUM_WIRES, 'img_w': NUM_TICKS,
+        'tile_h': TILE_H, 'tile_w': TILE_W,
+        'feat_dim': FEAT_DIM,
+        'global_max_adc': float(args.global_max_adc),
+        'threshold': thr,
+        'percentile': args.percentile,
+        'seed': args.seed
+    }
+    with open(out_dir / 'threshold.json', 'w') as f:
+        json.dump(meta, f, indent=2)
+    print('Saved to', out_dir)
+
+
+if __name__ == "__main__":
+    main()
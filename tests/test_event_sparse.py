@@ -0,0 +1,58 @@
+import matplotlib
+matplotlib.use("Agg")
+
+import numpy as np
+import pytest
+
+from lariat.event import Event
+from lariat.sparse import SparsePlane
+
+
+NUM_TICKS = 64
+
+
+class FakeLoader():
+    """Serves one synthetic event in the layout of lariat.loader.read_entry."""
+
+    def __init__(self, adc):
+        self.adc = adc
+
+    def read(self, index, filepath):
+        return {'run': 1, 'subrun': 1, 'event': index,
+                'raw_rawadc': self.adc.ravel(), 'raw_channel': np.arange(self.adc.shape[0])}
+
+
+def synthetic_adc():
+    adc = np.zeros((480, NUM_TICKS), dtype=np.float32)
+    for offset in (0, 240):   # induction, collection
+        adc[offset + 10:offset + 20, 5:9] = 60
+        adc[offset + 14, 7] = 200
+        adc[offset + 100:offset + 103, 30:45] = 40
+        adc[offset + 101, 40] = 90
+    return adc
+
+
+@pytest.fixture
+def events():
+    loader = FakeLoader(synthetic_adc())
+    dense = Event("fake.root", plot=False, loader=loader)
+    sparse = Event("fake.root", plot=False, loader=loader, sparse_threshold=5)
+    return dense, sparse
+
+
+@pytest.mark.parametrize("algo", ['connected', 'adc', 'longest', 'max', 'maxima'])
+@pytest.mark.parametrize("plot_mode", ['basic', 'highlight'])
+def test_clustering_sparse(events, algo, plot_mode, monkeypatch):
+    monkeypatch.setattr("matplotlib.pyplot.show", lambda: None)
+    dense, sparse = events
+    assert isinstance(sparse.collection, SparsePlane)
+
+    dense_labels, dense_regions = dense.clustering(algo, plot_mode=plot_mode)
+    sparse_labels, sparse_regions = sparse.clustering(algo, plot_mode=plot_mode)
+
+    assert len(sparse_regions) == len(dense_regions) > 0
+    assert np.array_equal(np.asarray(sparse_labels) > 0, np.asarray(dense_labels) > 0)
+    for s, d in zip(sparse_regions, dense_regions):
+        assert s.bbox == d.bbox
+        assert s.area == d.area
+        assert s.intensity_max == d.intensity_max